@@ -7,6 +7,7 @@ import os.path
 import tempfile
 
 import grizzly.adapters
+from .common import Profiler, SCHEDULERS
 from .target import available as available_targets
 
 # ref: https://stackoverflow.com/questions/12268602/sort-argparse-help-alphabetically
@@ -67,6 +68,9 @@ class CommonArgs(object):
         self.parser.add_argument(
             "--relaunch", type=int, default=1000,
             help="Number of iterations performed before relaunching the browser (default: %(default)s)")
+        self.parser.add_argument(
+            "--serve-packed", action="store_true",
+            help="Serve test cases from a single packed file instead of unpacking them to a directory")
         self.parser.add_argument(
             "--soft-asserts", action="store_true",
             help="Detect soft assertions")
@@ -140,18 +144,68 @@ class GrizzlyArgs(CommonArgs):
         self.parser.add_argument(
             "--accepted-extensions", nargs="+",
             help="Space separated list of supported file extensions. ie: html svg (default: all)")
+        self.parser.add_argument(
+            "--adaptive-relaunch", action="store_true",
+            help="Adjust the number of iterations performed before relaunching the browser"
+                 " to maximize throughput. Bounded by --relaunch-min and --relaunch")
+        self.parser.add_argument(
+            "--adaptive-timeout", action="store_true",
+            help="Lower the iteration timeout based on observed test case durations."
+                 " Bounded by the adapter test duration and --timeout")
         self.parser.add_argument(
             "-c", "--cache", type=int, default=0,
             help="Maximum number of additional test cases to include in report (default: %(default)s)")
+        self.parser.add_argument(
+            "--cache-limit", type=int, default=0,
+            help="Maximum total size (in MBs) of test cases included in report. The oldest test cases"
+                 " are dropped when the limit is exceeded (default: 'no limit')")
+        self.parser.add_argument(
+            "--corpus-index", action="store_true",
+            help="Save an index of --input and only rescan modified directories on subsequent runs."
+                 " The index is shared by all instances on the host")
         self.parser.add_argument(
             "--coverage", action="store_true",
             help="Enable coverage collection")
+        self.parser.add_argument(
+            "--coverage-interval", type=int, default=0,
+            help="Maximum number of seconds between coverage dumps (default: 'no limit')")
+        self.parser.add_argument(
+            "--coverage-iterations", type=int, default=1,
+            help="Number of iterations performed between coverage dumps (default: %(default)s)")
         self.parser.add_argument(
             "-i", "--input",
             help="Test case or directory containing test cases")
+        self.parser.add_argument(
+            "--input-cache", type=int, default=0,
+            help="Maximum size (in MBs) of recently used input files to keep in memory"
+                 " between rotations, not used with --input-mmap (default: 'disabled')")
+        self.parser.add_argument(
+            "--input-mmap", action="store_true",
+            help="Memory map input files instead of copying them."
+                 " Input files must not be modified while in use")
+        self.parser.add_argument(
+            "--input-scheduler", choices=sorted(SCHEDULERS), default="uniform",
+            help="Method used to select the next input file. 'weighted' prefers input files that"
+                 " produce results and avoids those that time out (default: %(default)s)")
+        self.parser.add_argument(
+            "--merge-similar", type=float, metavar="THRESHOLD",
+            help="Store results with an estimated stack similarity >= THRESHOLD (0.0-1.0) to a"
+                 " previously reported result in the same bucket (default: disabled)")
         self.parser.add_argument(
             "--mime",
             help="Specify a mime type")
+        self.parser.add_argument(
+            "--profile", choices=Profiler.MODES, default=os.getenv("GRZ_PROFILE"),
+            help="Periodically profile Grizzly. 'cpu' captures cProfile stats and 'alloc' captures"
+                 " tracemalloc snapshots. Can also be set with GRZ_PROFILE (default: disabled)")
+        self.parser.add_argument(
+            "--profile-period", type=int, default=os.getenv("GRZ_PROFILE_PERIOD", "3600"),
+            help="Number of seconds between profile captures."
+                 " Can also be set with GRZ_PROFILE_PERIOD (default: %(default)s)")
+        self.parser.add_argument(
+            "--relaunch-min", type=int, default=10,
+            help="Minimum number of iterations performed before relaunching the browser"
+                 " when using --adaptive-relaunch (default: %(default)s)")
         self.parser.add_argument(
             "--rr", action="store_true",
             help="Use RR (Linux only)")
@@ -170,6 +224,33 @@ class GrizzlyArgs(CommonArgs):
                 msg.append("No adapters available.")
             self.parser.error(" ".join(msg))
 
+        if args.coverage_interval < 0:
+            self.parser.error("--coverage-interval must be positive")
+
+        if args.coverage_iterations < 1:
+            self.parser.error("--coverage-iterations must be greater than 0")
+
+        if args.cache_limit < 0:
+            self.parser.error("--cache-limit must be positive")
+
+        if args.input_cache < 0:
+            self.parser.error("--input-cache must be positive")
+
+        if args.profile is not None and args.profile not in Profiler.MODES:
+            self.parser.error("Unsupported profile mode %r" % (args.profile,))
+
+        if args.profile_period < 1:
+            self.parser.error("--profile-period must be greater than 0")
+
+        if args.merge_similar is not None:
+            if not 0 < args.merge_similar <= 1:
+                self.parser.error("--merge-similar must be greater than 0 and at most 1")
+            if args.fuzzmanager or args.s3_fuzzmanager:
+                self.parser.error("--merge-similar cannot be used with --fuzzmanager/--s3-fuzzmanager")
+
+        if args.relaunch_min < 1:
+            self.parser.error("--relaunch-min must be greater than 0")
+
         if args.fuzzmanager and args.s3_fuzzmanager:
             self.parser.error("--fuzzmanager and --s3-fuzzmanager are mutually exclusive")
 
@@ -4,15 +4,21 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from .adapter import Adapter, AdapterError
-from .iomanager import IOManager, ServerMap
+from .corpus import CorpusIndex, InputPaths
+from .iomanager import InputCache, IOManager, ServerMap
+from .log_queue import LogQueue, init_logging
+from .profiler import Profiler
 from .reporter import FilesystemReporter, FuzzManagerReporter, Report, Reporter, S3FuzzManagerReporter
+from .scheduler import InputScheduler, SCHEDULERS, WeightedScheduler
+from .signature_db import SignatureDB
 from .status import ReducerStats, Status
-from .storage import InputFile, TestCase, TestFile
+from .storage import BlobStore, InputFile, TestCase, TestFile
 
 
 __all__ = (
-    "Adapter", "AdapterError", "FilesystemReporter", "FuzzManagerReporter", "IOManager", "InputFile",
-    "ReducerStats", "Report", "Reporter", "S3FuzzManagerReporter", "ServerMap", "Status", "TestCase",
-    "TestFile")
+    "Adapter", "AdapterError", "BlobStore", "CorpusIndex", "FilesystemReporter", "FuzzManagerReporter",
+    "IOManager", "InputCache", "InputFile", "InputPaths", "InputScheduler", "LogQueue", "Profiler",
+    "ReducerStats", "Report", "Reporter", "S3FuzzManagerReporter", "SCHEDULERS", "ServerMap", "SignatureDB",
+    "Status", "TestCase", "TestFile", "WeightedScheduler", "init_logging")
 __author__ = "Jesse Schwartzentruber"
 __credits__ = ["Jesse Schwartzentruber", "Tyson Smith"]
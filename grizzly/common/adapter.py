@@ -38,6 +38,7 @@ class Adapter(object):
         self._harness = None
         self.fuzz = dict()
         self.monitor = None
+        self.scheduler = None
 
     def cleanup(self):
         """Automatically called once at shutdown.
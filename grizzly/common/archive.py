@@ -0,0 +1,192 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Create compressed archives of results."""
+import bz2
+from collections import deque
+import logging
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import tarfile
+import time
+import zipfile
+
+__all__ = ("ArchiveStats", "ParallelBZ2Writer", "tar_bz2", "zip_path")
+
+LOG = logging.getLogger("archive")
+
+# file extensions of content that is already compressed (compressing again is a waste of time)
+COMPRESSED_EXTS = frozenset((
+    ".7z", ".bz2", ".gif", ".gz", ".jpeg", ".jpg", ".mkv", ".mp3", ".mp4", ".ogg", ".ogv",
+    ".opus", ".png", ".tgz", ".webm", ".webp", ".woff", ".woff2", ".xz", ".zip", ".zst"))
+
+
+class ArchiveStats(object):
+    """Size of the content and resulting archive and the time taken to create it."""
+    __slots__ = ("archive", "compressed", "elapsed", "original")
+
+    def __init__(self, archive, original, compressed, elapsed):
+        self.archive = archive
+        self.compressed = compressed
+        self.elapsed = elapsed
+        self.original = original
+
+    def __str__(self):
+        return "%s: %d -> %d bytes (saved %d) in %0.2fs" % (
+            os.path.basename(self.archive), self.original, self.compressed, self.saved, self.elapsed)
+
+    @property
+    def saved(self):
+        """Number of bytes saved by compression.
+
+        Args:
+            None
+
+        Returns:
+            int: Bytes saved (negative if the archive is larger).
+        """
+        return self.original - self.compressed
+
+
+class ParallelBZ2Writer(object):
+    """ParallelBZ2Writer is a write-only file object that compresses data in chunks
+    using multiple threads (the bz2 module releases the GIL while compressing).
+    Each chunk is written as a separate bz2 stream, multi-stream files can be
+    read by bzip2 and the bz2 module (Python 3.3+). When multi-stream files are not
+    supported (Python 2) a single stream is written using the calling thread.
+    """
+    CHUNK_SIZE = 0x400000  # 4MB
+    # multi-stream files cannot be read by the bz2 module before Python 3.3
+    MULTI_STREAM = sys.version_info >= (3, 3)
+    # default number of threads, keep this low to avoid competing with the target
+    WORKERS = 2
+
+    def __init__(self, out_fp, level=9, workers=None, chunk_size=CHUNK_SIZE):
+        assert 0 < level < 10
+        assert chunk_size > 0
+        self.level = level
+        self.written = 0  # uncompressed bytes
+        self._buf = list()
+        self._buf_size = 0
+        self._chunk_size = chunk_size
+        self._out = out_fp
+        self._pending = deque()
+        if self.MULTI_STREAM:
+            self._compressor = None
+            self._workers = self.WORKERS if workers is None else workers
+        else:
+            self._compressor = bz2.BZ2Compressor(level)
+            self._workers = 1
+        self._pool = ThreadPool(self._workers) if self._workers > 1 else None
+
+    def _flush_chunk(self):
+        if not self._buf_size:
+            return
+        chunk = b"".join(self._buf)
+        self._buf = list()
+        self._buf_size = 0
+        if self._compressor is not None:
+            self._out.write(self._compressor.compress(chunk))
+            return
+        if self._pool is None:
+            self._out.write(bz2.compress(chunk, self.level))
+            return
+        self._pending.append(self._pool.apply_async(bz2.compress, (chunk, self.level)))
+        # limit memory usage by waiting for the oldest chunk
+        while len(self._pending) > self._workers * 2:
+            self._out.write(self._pending.popleft().get())
+
+    def close(self):
+        """Compress and write remaining data. The output file object is not closed.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._flush_chunk()
+        if self._compressor is not None:
+            self._out.write(self._compressor.flush())
+            self._compressor = None
+        try:
+            while self._pending:
+                self._out.write(self._pending.popleft().get())
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+    def write(self, data):
+        self._buf.append(data)
+        self._buf_size += len(data)
+        self.written += len(data)
+        if self._buf_size >= self._chunk_size:
+            self._flush_chunk()
+
+
+def tar_bz2(src, dst, arcname=None, level=9, workers=None):
+    """Create a bz2 compressed tar archive. Compression is performed in parallel
+    (see ParallelBZ2Writer).
+
+    Args:
+        src (str): File or directory to add to the archive.
+        dst (str): Archive to create.
+        arcname (str): Name of src in the archive. Defaults to the basename of src.
+        level (int): Compression level (1-9).
+        workers (int): Number of compression threads (see ParallelBZ2Writer.WORKERS).
+
+    Returns:
+        ArchiveStats: Details of the archive.
+    """
+    start = time.time()
+    with open(dst, "wb") as out_fp:
+        writer = ParallelBZ2Writer(out_fp, level=level, workers=workers)
+        try:
+            with tarfile.open(fileobj=writer, mode="w|") as tar_fp:
+                tar_fp.add(src, arcname=os.path.basename(src) if arcname is None else arcname)
+        finally:
+            writer.close()
+    stats = ArchiveStats(dst, writer.written, os.stat(dst).st_size, time.time() - start)
+    LOG.info("Created %s", stats)
+    return stats
+
+
+def zip_path(src, dst, level=6):
+    """Create a zip archive containing the content of a directory. Files that
+    are already compressed (see COMPRESSED_EXTS) are stored, other files are deflated.
+
+    Args:
+        src (str): Directory to add to the archive.
+        dst (str): Archive to create.
+        level (int): Deflate compression level (0-9), ignored before Python 3.7.
+
+    Returns:
+        ArchiveStats: Details of the archive.
+    """
+    start = time.time()
+    original = 0
+    if sys.version_info >= (3, 7):
+        kwargs = {"compresslevel": level}
+    else:  # pragma: no cover
+        kwargs = dict()
+    with zipfile.ZipFile(dst, mode="w", compression=zipfile.ZIP_DEFLATED, **kwargs) as zip_fp:
+        for dir_name, _, dir_files in os.walk(src):
+            arc_path = os.path.relpath(dir_name, src)
+            for file_name in dir_files:
+                file_path = os.path.join(dir_name, file_name)
+                original += os.stat(file_path).st_size
+                if os.path.splitext(file_name)[1].lower() in COMPRESSED_EXTS:
+                    compress_type = zipfile.ZIP_STORED
+                else:
+                    compress_type = zipfile.ZIP_DEFLATED
+                zip_fp.write(
+                    file_path,
+                    arcname=os.path.join(arc_path, file_name),
+                    compress_type=compress_type)
+    stats = ArchiveStats(dst, original, os.stat(dst).st_size, time.time() - start)
+    LOG.info("Created %s", stats)
+    return stats
@@ -0,0 +1,294 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Scan and track large collections of input files."""
+from array import array
+from hashlib import sha1
+import json
+import logging
+import os
+import stat
+import tempfile
+import time
+
+import fasteners
+
+__all__ = ("CorpusIndex", "InputPaths")
+
+LOG = logging.getLogger("corpus")
+
+if hasattr(os, "fsencode"):
+    _encode = os.fsencode  # pylint: disable=invalid-name
+    _decode = os.fsdecode  # pylint: disable=invalid-name
+else:  # pragma: no cover
+    # python 2 paths are already bytes
+    _encode = _decode = str  # pylint: disable=invalid-name
+
+
+class InputPaths(object):
+    """InputPaths is a compact list of file paths. Each directory is stored once in
+    a prefix table and file names are stored back to back in a single buffer.
+    Entries are made up of a prefix table index and a buffer offset stored in arrays.
+    """
+    __slots__ = ("_dir_idx", "_dir_lookup", "_dirs", "_names", "_offsets")
+
+    def __init__(self, paths=None):
+        self._dir_idx = array("L")  # index into self._dirs per entry
+        self._dir_lookup = dict()  # directory -> index into self._dirs
+        self._dirs = list()  # prefix table
+        self._names = bytearray()  # encoded file names
+        self._offsets = array("L")  # start of file name in self._names per entry
+        if paths is not None:
+            for path in paths:
+                self.append(path)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._offsets)
+        if not 0 <= index < len(self._offsets):
+            raise IndexError("InputPaths index out of range")
+        return os.path.join(self._dirs[self._dir_idx[index]], self._name(index))
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self[index]
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _name(self, index):
+        start = self._offsets[index]
+        if index + 1 < len(self._offsets):
+            end = self._offsets[index + 1]
+        else:
+            end = len(self._names)
+        return _decode(bytes(self._names[start:end]))
+
+    def add(self, directory, file_name):
+        """Add an entry.
+
+        Args:
+            directory (str): Directory containing the file.
+            file_name (str): Name of the file.
+
+        Returns:
+            None
+        """
+        dir_idx = self._dir_lookup.get(directory)
+        if dir_idx is None:
+            dir_idx = len(self._dirs)
+            self._dirs.append(directory)
+            self._dir_lookup[directory] = dir_idx
+        self._dir_idx.append(dir_idx)
+        self._offsets.append(len(self._names))
+        self._names.extend(_encode(file_name))
+
+    def append(self, path):
+        """Add a path.
+
+        Args:
+            path (str): Path to add.
+
+        Returns:
+            None
+        """
+        self.add(*os.path.split(path))
+
+    def pop(self):
+        """Remove and return the last path.
+
+        Args:
+            None
+
+        Returns:
+            str: Path that was removed.
+        """
+        if not self._offsets:
+            raise IndexError("pop from empty InputPaths")
+        path = self[-1]
+        del self._names[self._offsets.pop():]
+        self._dir_idx.pop()
+        return path
+
+    def sort(self, reverse=False):
+        """Sort entries in place by path.
+
+        Args:
+            reverse (bool): Sort in descending order.
+
+        Returns:
+            None
+        """
+        order = sorted(range(len(self._offsets)), key=self.__getitem__, reverse=reverse)
+        names = [self._name(idx) for idx in order]
+        dir_idx = array("L", (self._dir_idx[idx] for idx in order))
+        self._names = bytearray()
+        self._offsets = array("L")
+        for name in names:
+            self._offsets.append(len(self._names))
+            self._names.extend(_encode(name))
+        self._dir_idx = dir_idx
+
+
+class CorpusIndex(object):
+    """CorpusIndex tracks the files (name, size and modification time) found under
+    a directory. The index can be saved to disk and shared by multiple instances on
+    the same host. When refreshing, directories with an unchanged modification time
+    are not rescanned. Note: modifying an existing file in place does not update the
+    modification time of its directory so the change will not be detected.
+    """
+    MTIME_SLACK = 2  # directories modified this recently (seconds) are always rescanned
+    PATH = os.path.join(tempfile.gettempdir(), "grzcorpus")
+    VERSION = 1
+
+    def __init__(self, root, persist=True):
+        self.persist = persist
+        self.rescanned = 0  # directories scanned by the last refresh
+        self.root = os.path.abspath(root)
+        self._dirs = dict()  # relative path -> {"files": [[name, size, mtime], ...], "mtime", "subdirs"}
+        digest = sha1(_encode(self.root)).hexdigest()
+        self.index_file = os.path.join(self.PATH, "corpus_%s.json" % (digest,))
+
+    def _load(self):
+        """Load saved index.
+
+        Args:
+            None
+
+        Returns:
+            dict: Saved directory entries.
+        """
+        try:
+            with open(self.index_file, "r") as in_fp:
+                data = json.load(in_fp)
+        except (IOError, OSError):
+            return dict()
+        except ValueError:
+            LOG.debug("failed to load %r", self.index_file)
+            return dict()
+        if data.get("version") != self.VERSION or data.get("root") != self.root:
+            return dict()
+        return data.get("dirs", dict())
+
+    def _save(self):
+        """Write index to disk.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with open(self.index_file, "w") as out_fp:
+            json.dump({"dirs": self._dirs, "root": self.root, "version": self.VERSION}, out_fp)
+
+    @staticmethod
+    def _scan_dir(path):
+        """Scan a single directory.
+
+        Args:
+            path (str): Directory to scan.
+
+        Returns:
+            tuple: Files ([name, size, mtime]) and subdirectory names.
+        """
+        files = list()
+        subdirs = list()
+        if hasattr(os, "scandir"):
+            for entry in os.scandir(path):
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        f_stat = entry.stat()
+                        files.append([entry.name, f_stat.st_size, f_stat.st_mtime])
+                except OSError:
+                    continue
+        else:  # pragma: no cover
+            for name in os.listdir(path):
+                full_path = os.path.join(path, name)
+                try:
+                    if os.path.isdir(full_path) and not os.path.islink(full_path):
+                        subdirs.append(name)
+                        continue
+                    f_stat = os.stat(full_path)
+                except OSError:
+                    continue
+                if stat.S_ISREG(f_stat.st_mode):
+                    files.append([name, f_stat.st_size, f_stat.st_mtime])
+        return files, subdirs
+
+    def files(self):
+        """Files in the index.
+
+        Args:
+            None
+
+        Yields:
+            tuple: Directory path, file name and file size.
+        """
+        for rel_path, entry in self._dirs.items():
+            directory = os.path.normpath(os.path.join(self.root, rel_path))
+            for name, size, _ in entry["files"]:
+                yield directory, name, size
+
+    def refresh(self):
+        """Update the index. Only directories that have been modified since
+        the previous refresh are rescanned.
+
+        Args:
+            None
+
+        Returns:
+            CorpusIndex: self
+        """
+        if not self.persist:
+            self._refresh(self._dirs)
+            return self
+        if not os.path.isdir(self.PATH):
+            try:
+                os.mkdir(self.PATH)
+            except OSError:
+                if not os.path.isdir(self.PATH):
+                    raise
+        with fasteners.process_lock.InterProcessLock("%s.lock" % (self.index_file,)):
+            self._refresh(self._load())
+            self._save()
+        LOG.debug("refreshed index of %r, rescanned %d directories", self.root, self.rescanned)
+        return self
+
+    def _refresh(self, previous):
+        """Walk the directory tree reusing entries for unmodified directories.
+
+        Args:
+            previous (dict): Directory entries from previous refresh.
+
+        Returns:
+            None
+        """
+        self._dirs = dict()
+        self.rescanned = 0
+        # modifications made within the timestamp resolution of the filesystem
+        # may not update the modification time
+        recent = time.time() - self.MTIME_SLACK
+        pending = ["."]
+        while pending:
+            rel_path = pending.pop()
+            path = os.path.normpath(os.path.join(self.root, rel_path))
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            entry = previous.get(rel_path)
+            if entry is None or entry["mtime"] != mtime:
+                try:
+                    files, subdirs = self._scan_dir(path)
+                except OSError:
+                    LOG.debug("failed to scan %r", path)
+                    continue
+                entry = {"files": files, "mtime": mtime if mtime < recent else None, "subdirs": subdirs}
+                self.rescanned += 1
+            self._dirs[rel_path] = entry
+            for subdir in entry["subdirs"]:
+                pending.append(os.path.join(rel_path, subdir))
@@ -3,14 +3,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from collections import deque
+from collections import deque, OrderedDict
 import os
-import random
 import re
 
-from .storage import InputFile, TestCase, TestFile
+from .corpus import CorpusIndex, InputPaths
+from .scheduler import InputScheduler
+from .storage import BlobStore, InputFile, TestCase, TestFile
 
-__all__ = ("IOManager", "ServerMap")
+__all__ = ("InputCache", "IOManager", "ServerMap")
 __author__ = "Tyson Smith"
 __credits__ = ["Tyson Smith"]
 
@@ -80,7 +81,109 @@ class ServerMap(object):
         self._redirect[url] = (file_name, required)
 
 
+class InputCache(object):
+    """InputCache keeps recently used InputFiles (and their cached data) open so
+    inputs that are selected repeatedly are not read from disk each time. The least
+    recently used entries are closed once the total size of the entries exceeds `limit`.
+    Only data held in memory is cached. InputFiles that use mmap, have been spooled to
+    disk or have not been read are closed instead. Entries are discarded if the file
+    has been modified since the data was cached.
+    """
+    def __init__(self, limit):
+        assert limit > 0
+        self.hits = 0
+        self.limit = limit  # maximum total size in bytes
+        self.misses = 0
+        self.size = 0  # total size of cached entries in bytes
+        self._entries = OrderedDict()  # file name -> (InputFile, size)
+
+    def __contains__(self, file_name):
+        return file_name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Close and remove all entries.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        for in_file, _ in self._entries.values():
+            in_file.close()
+        self._entries.clear()
+        self.size = 0
+
+    @property
+    def hit_rate(self):
+        """Ratio of calls to get() that were served from the cache.
+
+        Args:
+            None
+
+        Returns:
+            float: Hit rate (0.0 to 1.0).
+        """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def get(self, file_name, use_mmap=False):
+        """Get an InputFile. A new InputFile is created if file_name is not cached.
+        Entries are removed from the cache while in use, call put() when done.
+
+        Args:
+            file_name (str): Path to input file.
+            use_mmap (bool): Passed to InputFile when creating a new entry.
+
+        Returns:
+            InputFile: Input file object.
+        """
+        entry = self._entries.pop(file_name, None)
+        if entry is not None:
+            self.size -= entry[1]
+            try:
+                mtime = os.stat(file_name).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != entry[0].mtime:
+                # file has been modified or removed
+                entry[0].close()
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return InputFile(file_name, use_mmap=use_mmap)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, in_file):
+        """Add InputFile to the cache. The least recently used entries are
+        closed and removed if the limit is exceeded. InputFiles without data
+        in memory or larger than the limit are closed immediately.
+
+        Args:
+            in_file (InputFile): Input file no longer in use.
+
+        Returns:
+            None
+        """
+        size = in_file.cached_size
+        if not size or size > self.limit:
+            in_file.close()
+            return
+        self._entries[in_file.file_name] = (in_file, size)
+        self.size += size
+        while self.size > self.limit:
+            _, (evicted, evicted_size) = self._entries.popitem(last=False)
+            evicted.close()
+            self.size -= evicted_size
+
+
 class IOManager(object):
+    INPUT_BOOST = 2.0  # scale weight of inputs that produce results
+    INPUT_DEMOTE = 0.5  # scale weight of inputs that time out or are not served
     TRACKED_ENVVARS = (
         "ASAN_OPTIONS",
         "LSAN_OPTIONS",
@@ -88,17 +191,28 @@ class IOManager(object):
         "GRZ_FORCED_CLOSE",
         "MOZ_CHAOSMODE")
 
-    def __init__(self, report_size=1, mime_type=None, working_path=None):
+    def __init__(self, report_size=1, mime_type=None, working_path=None, scheduler=None, input_mmap=False,
+                 input_cache=0, report_limit=0):
         assert report_size > 0
+        assert input_cache >= 0
+        assert report_limit >= 0
         self.active_input = None  # current active input file
+        self.blob_store = BlobStore()  # shared data of test files in self.tests
         self.harness = None
-        self.input_files = list()  # paths to files to use as a corpus
+        # recently used input files (disabled if input_cache is 0)
+        self.input_cache = InputCache(input_cache) if input_cache else None
+        self.input_mmap = input_mmap  # map input files into memory instead of copying them
+        self.input_files = InputPaths()  # paths to files to use as a corpus
+        # used to select the next input file
+        self.scheduler = InputScheduler() if scheduler is None else scheduler
         self.server_map = ServerMap()  # manage redirects, include directories and dynamic responses
         self.tests = deque()
+        self.tests_evicted = 0  # test cases removed from self.tests because of report_limit
         self.working_path = working_path
         self._environ_files = list()  # collection of files that should be added to the testcase
         self._generated = 0  # number of test cases generated
         self._mime = mime_type
+        self._report_limit = report_limit  # maximum size (bytes) of test cases in self.tests
         self._report_size = report_size
         # used to record environment variable that directly impact the browser
         self._tracked_env = self.tracked_environ()
@@ -119,9 +233,16 @@ class IOManager(object):
                     self._environ_files.append(TestFile.from_file(supp_file, fname))
                     break
 
+    def adjust_input_weight(self, factor):
+        # scale the weight used by the scheduler for the active input
+        if self.active_input is not None and self.scheduler.current is not None:
+            self.scheduler.scale(factor)
+
     def cleanup(self):
         if self.active_input is not None:
             self.active_input.close()
+        if self.input_cache is not None:
+            self.input_cache.clear()
         if self.harness is not None:
             self.harness.close()
         for e_file in self._environ_files:
@@ -134,12 +255,19 @@ class IOManager(object):
             assert self.input_files
             # close previous input if needed
             if self.active_input is not None:
-                self.active_input.close()
+                if self.input_cache is not None and rotation_period > 0:
+                    self.input_cache.put(self.active_input)
+                else:
+                    self.active_input.close()
             if rotation_period > 0:
-                self.active_input = InputFile(random.choice(self.input_files))
+                selected = self.input_files[self.scheduler.select(len(self.input_files))]
+                if self.input_cache is not None:
+                    self.active_input = self.input_cache.get(selected, use_mmap=self.input_mmap)
+                else:
+                    self.active_input = InputFile(selected, use_mmap=self.input_mmap)
             else:
                 # single pass mode
-                self.active_input = InputFile(self.input_files.pop())
+                self.active_input = InputFile(self.input_files.pop(), use_mmap=self.input_mmap)
         # create testcase object and landing page names
         test = TestCase(
             self.page_name(),
@@ -161,6 +289,19 @@ class IOManager(object):
             # add harness to testcase
             test.add_file(self.harness.clone(), required=False)
         self._generated += 1
+        if self.tests and self._report_size > 1:
+            # the previous test case is complete, share data with identical
+            # files in other test cases
+            self.tests[-1].deduplicate(self.blob_store)
+        if self._report_limit and len(self.tests) > 1:
+            # remove the oldest test cases if the total size exceeds the limit,
+            # the most recent complete test case is always kept
+            history = sum(x.data_size for x in self.tests)
+            while len(self.tests) > 1 and history > self._report_limit:
+                evicted = self.tests.popleft()
+                history -= evicted.data_size
+                evicted.cleanup()
+                self.tests_evicted += 1
         self.tests.append(test)
         # manage testcase cache size
         if len(self.tests) > self._report_size:
@@ -200,7 +341,7 @@ class IOManager(object):
             return True
         return False
 
-    def scan_input(self, scan_path, accepted_extensions=None, sort=False):
+    def scan_input(self, scan_path, accepted_extensions=None, sort=False, use_index=False):
         assert scan_path is not None, "scan_path should be a valid path"
         if os.path.isdir(scan_path):
             # create a set of normalized file extensions to look in
@@ -211,19 +352,19 @@ class IOManager(object):
 
             # ignored_list is a list of ignored files (usually auto generated OS files)
             ignored_list = ("desktop.ini", "thumbs.db")
-            for d_name, _, filenames in os.walk(scan_path):
-                for f_name in filenames:
-                    # check for unwanted files
-                    if f_name.startswith(".") or f_name.lower() in ignored_list:
+            # a saved index is only rescanned where directories have been modified
+            corpus = CorpusIndex(scan_path, persist=use_index).refresh()
+            for d_name, f_name, f_size in corpus.files():
+                # check for unwanted files
+                if f_name.startswith(".") or f_name.lower() in ignored_list:
+                    continue
+                if normalized_exts:
+                    ext = os.path.splitext(f_name)[1].lstrip(".").lower()
+                    if ext not in normalized_exts:
                         continue
-                    if normalized_exts:
-                        ext = os.path.splitext(f_name)[1].lstrip(".").lower()
-                        if ext not in normalized_exts:
-                            continue
-                    input_file = os.path.abspath(os.path.join(d_name, f_name))
-                    # skip empty files
-                    if os.path.getsize(input_file) > 0:
-                        self.input_files.append(input_file)
+                # skip empty files
+                if f_size > 0:
+                    self.input_files.append(os.path.join(d_name, f_name))
         elif os.path.isfile(scan_path) and os.path.getsize(scan_path) > 0:
             self.input_files.append(os.path.abspath(scan_path))
 
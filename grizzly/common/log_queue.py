@@ -0,0 +1,123 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Perform log record formatting and output on a background thread."""
+import atexit
+from copy import copy
+import logging
+try:  # py 2-3 compatibility
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+    _queue_import_error = None  # pylint: disable=invalid-name
+except ImportError as err:  # pragma: no cover
+    _queue_import_error = err  # pylint: disable=invalid-name
+
+__all__ = ("LogQueue", "init_logging")
+
+
+if _queue_import_error is None:
+    class _QueueHandler(QueueHandler):
+        """QueueHandler that merges the message and arguments (and traceback)
+        of a copy of the record before queuing it. This captures the current state
+        of mutable arguments and avoids passing traceback objects (and the frames
+        they reference) to the listener thread. The remaining formatting is
+        performed by the handler on the listener thread.
+        """
+        def prepare(self, record):
+            msg = self.format(record)
+            record = copy(record)
+            record.message = msg
+            record.msg = msg
+            record.args = None
+            record.exc_info = None
+            record.exc_text = None
+            record.stack_info = None
+            return record
+
+
+class LogQueue(object):
+    """LogQueue wraps a logging.Handler. Records logged to `LogQueue.handler` are
+    queued and emitted by `target` on a background thread. Records below the level
+    of `target` are discarded before being queued so they are never formatted.
+    If QueueHandler is not available `target` is used directly.
+    """
+    def __init__(self, target):
+        self.target = target
+        if _queue_import_error is None:
+            self._listener = QueueListener(Queue(), target, respect_handler_level=True)
+            self.handler = _QueueHandler(self._listener.queue)
+            self.handler.setLevel(target.level)
+        else:  # pragma: no cover
+            self._listener = None
+            self.handler = target
+
+    def close(self):
+        """Stop background thread and close target handler. All queued records
+        are emitted before returning.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.stop()
+        self.target.close()
+
+    def start(self):
+        """Start background thread.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        # pylint: disable=protected-access
+        if self._listener is not None and self._listener._thread is None:
+            self._listener.start()
+
+    def stop(self):
+        """Stop background thread. All queued records are emitted before returning.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        # pylint: disable=protected-access
+        if self._listener is not None and self._listener._thread is not None:
+            self._listener.stop()
+        self.target.flush()
+
+
+def init_logging(level, fmt, datefmt="%Y-%m-%d %H:%M:%S"):
+    """Configure the root logger to output to stderr via a LogQueue. This is a
+    no-op if the root logger already has handlers (matching logging.basicConfig()).
+
+    Args:
+        level (int): Logging level.
+        fmt (str): Log record format.
+        datefmt (str): Date format.
+
+    Returns:
+        LogQueue: Started LogQueue or None if logging was already configured.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(fmt, datefmt=datefmt))
+    log_queue = LogQueue(stream)
+    log_queue.start()
+    # make sure queued records are output before exiting
+    atexit.register(log_queue.stop)
+    root.addHandler(log_queue.handler)
+    root.setLevel(level)
+    return log_queue
@@ -0,0 +1,141 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Selection and reading of result logs shared by Report and stack_hasher."""
+import logging
+import mmap
+import os
+import re
+
+__all__ = ("read_log", "select_logs")
+
+log = logging.getLogger("grizzly")  # pylint: disable=invalid-name
+
+
+def read_log(log_path, log_file, log_cache):
+    """Map a log file into memory and add it to log_cache. If log_file is
+    already in log_cache the existing content is returned.
+
+    Args:
+        log_path (str): Directory containing log_file.
+        log_file (str): Name of log file.
+        log_cache (dict): Content of logs keyed by file name.
+
+    Returns:
+        mmap: Content of log (can be bytes).
+    """
+    data = log_cache.get(log_file)
+    if data is None:
+        with open(os.path.join(log_path, log_file), "rb") as log_fp:
+            try:
+                data = mmap.mmap(log_fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                data = b""
+        log_cache[log_file] = data
+    return data
+
+
+def select_logs(log_path, log_cache=None):
+    """Select the logs that are most likely to contain the details of a result.
+
+    Args:
+        log_path (str): Directory containing logs.
+        log_cache (dict): Logs read while selecting are added (see read_log())
+                          so they can be reused. If None only the start of each log is read.
+
+    Returns:
+        dict: Selected log file names ("aux", "stderr" and "stdout").
+    """
+    def _log_head(fname):
+        # grab first chunk of log to help triage
+        if log_cache is not None:
+            data = read_log(log_path, fname, log_cache)[:4096]
+        else:
+            with open(os.path.join(log_path, fname), "rb") as log_fp:
+                data = log_fp.read(4096)
+        return data.decode("utf-8", errors="ignore")
+
+    if not os.path.isdir(log_path):
+        raise IOError("log_path does not exist %r" % log_path)
+    log_files = os.listdir(log_path)
+    if not log_files:
+        raise IOError("No logs found in %r" % log_path)
+    logs = {"aux": None, "stderr": None, "stdout": None}
+
+    # order by creation date because the oldest log is likely the cause of the issue
+    log_files.sort(key=lambda x: os.stat(os.path.join(log_path, x)).st_mtime)
+
+    # pattern to identify the ASan crash triggered when the parent process goes away
+    re_e10s_forced = re.compile(r"""
+        ==\d+==ERROR:.+?SEGV\son.+?0x[0]+\s\(.+?T2\).+?
+        #0\s+0x[0-9a-f]+\sin\s+mozilla::ipc::MessageChannel::OnChannelErrorFromLink
+        """, re.DOTALL | re.VERBOSE)
+
+    # this is a list of *San error reports to prioritize
+    # ASan reports not included below (deprioritized):
+    # stack-overflow, BUS, failed to allocate, detected memory leaks
+    interesting_sanitizer_tokens = (
+        "use-after-", "-buffer-overflow on", ": SEGV on ", "access-violation on ",
+        "negative-size-param", "attempting free on ", "-param-overlap")
+
+    # look for sanitizer (ASan, UBSan, etc...) logs
+    for fname in (log_file for log_file in log_files if "asan" in log_file):
+        log_data = _log_head(fname)
+
+        # look for interesting crash info in the log
+        if "==ERROR:" in log_data:
+            # check for e10s forced crash
+            if re_e10s_forced.search(log_data) is not None:
+                continue
+            # make sure there is something that looks like a stack frame in the log
+            if "#0 " in log_data:
+                logs["aux"] = fname
+                if any(x in log_data for x in interesting_sanitizer_tokens):
+                    break  # this is the likely cause of the crash
+                continue  # probably the most interesting but lets keep looking
+
+        # UBSan error (non-ASan builds)
+        if ": runtime error: " in log_data:
+            logs["aux"] = fname
+
+        # catch all (choose the one with info for now)
+        if logs["aux"] is None and os.stat(os.path.join(log_path, fname)).st_size:
+            logs["aux"] = fname
+
+    # look for Valgrind logs
+    if logs["aux"] is None:
+        for fname in (log_file for log_file in log_files if "valgrind" in log_file):
+            if os.stat(os.path.join(log_path, fname)).st_size:
+                logs["aux"] = fname
+                break
+
+    # prefer ASan logs over minidump logs
+    if logs["aux"] is None:
+        re_dump_req = re.compile(r"\d+\|0\|.+?\|google_breakpad::ExceptionHandler::WriteMinidump")
+        for fname in (log_file for log_file in log_files if "minidump" in log_file):
+            log_data = _log_head(fname)
+            # this will select log that contains "Crash|SIGSEGV|" or
+            # the desired "DUMP_REQUESTED" log
+            # TODO: review this it may be too strict
+            # see https://searchfox.org/mozilla-central/source/accessible/ipc/DocAccessibleParent.cpp#452
+            if "Crash|DUMP_REQUESTED|" not in log_data or re_dump_req.search(log_data):
+                logs["aux"] = fname
+                break
+
+    # look for ffpuppet worker logs, worker logs should be used if nothing else is available
+    if logs["aux"] is None:
+        for fname in (log_file for log_file in log_files if "ffp_worker" in log_file):
+            if logs["aux"] is not None:
+                # we only expect one log here...
+                log.warning("aux log previously selected: %s, overwriting!", logs["aux"])
+            logs["aux"] = fname
+
+    for fname in log_files:
+        if "stderr" in fname:
+            logs["stderr"] = fname
+        elif "stdout" in fname:
+            logs["stdout"] = fname
+
+    return logs
@@ -0,0 +1,141 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Periodically profile the running Grizzly process."""
+import cProfile
+import logging
+import os
+import pstats
+import time
+
+import six
+
+try:
+    import tracemalloc
+    _tracemalloc_import_error = None  # pylint: disable=invalid-name
+except ImportError as err:
+    _tracemalloc_import_error = err  # pylint: disable=invalid-name
+
+__all__ = ("Profiler",)
+
+LOG = logging.getLogger("profiler")
+
+
+class Profiler(object):
+    """Profiler periodically captures cProfile stats (mode "cpu") or tracemalloc
+    snapshots (mode "alloc") of the current process. Captures are written to
+    `working_path` and only the most recent `keep` are retained. A summary of the
+    top hot functions or allocation growth between snapshots is logged.
+    """
+    MODES = ("alloc", "cpu")
+    PREFIX = "grz_profile_"
+    TRACE_DEPTH = 10  # number of frames recorded by tracemalloc
+
+    def __init__(self, mode, period, working_path=None, keep=5, top=10):
+        assert mode in self.MODES
+        assert period > 0
+        assert keep > 0
+        if mode == "alloc" and _tracemalloc_import_error is not None:
+            raise _tracemalloc_import_error
+        self.captures = list()  # files containing recent captures
+        self.keep = keep
+        self.mode = mode
+        self.period = period
+        self.top = top
+        self.working_path = working_path or os.getcwd()
+        self._count = 0
+        self._profile = None
+        self._snapshot = None
+        self._time = None
+
+    def capture(self):
+        """Capture and save profile data. Profiling is restarted so each capture
+        only contains data for the most recent period.
+
+        Args:
+            None
+
+        Returns:
+            str: Path to file containing the capture.
+        """
+        assert self._time is not None, "start() must be called first"
+        self._count += 1
+        if self.mode == "cpu":
+            self._profile.disable()
+            dst = os.path.join(self.working_path, "%s%04d.prof" % (self.PREFIX, self._count))
+            self._profile.dump_stats(dst)
+            out = six.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            LOG.info("CPU profile (top %d):\n%s", self.top, out.getvalue().strip())
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            dst = os.path.join(self.working_path, "%s%04d.snapshot" % (self.PREFIX, self._count))
+            snapshot.dump(dst)
+            growth = snapshot.compare_to(self._snapshot, "lineno")[:self.top]
+            LOG.info("Allocation growth (top %d):\n%s", self.top, "\n".join(str(x) for x in growth))
+            self._snapshot = snapshot
+        self.captures.append(dst)
+        # rotate captures
+        while len(self.captures) > self.keep:
+            try:
+                os.remove(self.captures.pop(0))
+            except OSError:  # pragma: no cover
+                LOG.warning("Failed to remove profile capture")
+        self._time = time.time()
+        return dst
+
+    def check(self):
+        """Capture profile data if the period has elapsed.
+
+        Args:
+            None
+
+        Returns:
+            bool: True if a capture was performed otherwise False.
+        """
+        if time.time() - self._time < self.period:
+            return False
+        self.capture()
+        return True
+
+    def start(self):
+        """Start profiling.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        assert self._time is None, "already started"
+        if self.mode == "cpu":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.TRACE_DEPTH)
+            self._snapshot = tracemalloc.take_snapshot()
+        self._time = time.time()
+        LOG.debug("started %s profiling, period %ds", self.mode, self.period)
+
+    def stop(self):
+        """Stop profiling. Existing captures are not removed.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self._time is None:
+            return
+        if self.mode == "cpu":
+            self._profile.disable()
+            self._profile = None
+        else:
+            tracemalloc.stop()
+            self._snapshot = None
+        self._time = None
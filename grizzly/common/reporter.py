@@ -4,15 +4,12 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import abc
-import json
 import logging
+import mmap
 import os
-import re
 import shutil
-import tarfile
 import tempfile
 import time
-import zipfile
 
 import fasteners
 import psutil
@@ -23,6 +20,7 @@ try:
     from Collector.Collector import Collector
     from FTB.ProgramConfiguration import ProgramConfiguration
     from FTB.Signatures.CrashInfo import CrashInfo
+    from FTB.Signatures.CrashSignature import CrashSignature
     _fm_import_error = None  # pylint: disable=invalid-name
 except ImportError as err:
     _fm_import_error = err  # pylint: disable=invalid-name
@@ -30,6 +28,7 @@ except ImportError as err:
 # check if boto is available for S3FuzzManager reporter
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
     import botocore
     _boto_import_error = None  # pylint: disable=invalid-name
     logging.getLogger("botocore").setLevel(logging.WARNING)
@@ -38,7 +37,11 @@ try:
 except ImportError as err:
     _boto_import_error = err  # pylint: disable=invalid-name
 
-from .stack_hasher import Stack
+from .archive import tar_bz2, zip_path
+from .log_select import read_log, select_logs
+from .signature_db import SignatureDB
+from .stack_hasher import NO_STACK_MAJOR, NO_STACK_MINOR, Stack, StackIndex
+from .storage import TestCase
 
 __all__ = ("FilesystemReporter", "FuzzManagerReporter", "S3FuzzManagerReporter")
 __author__ = "Tyson Smith"
@@ -48,11 +51,14 @@ log = logging.getLogger("grizzly")  # pylint: disable=invalid-name
 
 
 class Report(object):
-    DEFAULT_MAJOR = "NO_STACK"
-    DEFAULT_MINOR = "0"
+    DEFAULT_MAJOR = NO_STACK_MAJOR
+    DEFAULT_MINOR = NO_STACK_MINOR
     MAX_LOG_SIZE = 1048576  # 1MB
 
-    def __init__(self, log_path, log_map, size_limit=MAX_LOG_SIZE):
+    def __init__(self, log_path, log_map, size_limit=MAX_LOG_SIZE, log_cache=None):
+        # log file name -> content (mmap or bytes), each log is only read once
+        # and the content is shared by log selection, tailing and parsing
+        self._logs = dict() if log_cache is None else log_cache
         self.log_aux = log_map.get("aux") if log_map is not None else None
         self.log_err = log_map.get("stderr") if log_map is not None else None
         self.log_out = log_map.get("stdout") if log_map is not None else None
@@ -65,15 +71,26 @@ class Report(object):
             for fname in os.listdir(log_path):
                 log_file_path = os.path.join(log_path, fname)
                 if os.path.isfile(log_file_path):
-                    Report.tail(log_file_path, size_limit)
+                    data = self._logs.get(fname)
+                    if data is not None:
+                        if len(data) <= size_limit:
+                            continue
+                        # release the mapping before the file is modified
+                        del self._logs[fname]
+                        end = data[-size_limit:]
+                        if isinstance(data, mmap.mmap):
+                            data.close()
+                        data = end
+                    tailed = Report.tail(log_file_path, size_limit, data=data)
+                    if tailed is not None:
+                        self._logs[fname] = tailed
 
         # look through logs one by one until we find a stack
         # NOTE: order matters aux->stderr->stdout
         for scan_log in (self.log_aux, self.log_err, self.log_out):
             if scan_log is None:
                 continue
-            with open(os.path.join(log_path, scan_log), "rb") as log_fp:
-                stack = Stack.from_text(log_fp.read().decode("utf-8", errors="ignore"))
+            stack = Stack.from_data(self.log_data(scan_log))
             if stack.frames:
                 self.prefix = "%s_%s" % (stack.minor[:8], time.strftime("%Y-%m-%d_%H-%M-%S"))
                 self.stack = stack
@@ -83,12 +100,43 @@ class Report(object):
             self.prefix = "%s_%s" % (self.DEFAULT_MINOR, time.strftime("%Y-%m-%d_%H-%M-%S"))
 
     def cleanup(self):
+        self.close()
         if os.path.isdir(self.path):
             shutil.rmtree(self.path)
 
+    def close(self):
+        """Release log content. Logs will be read again if needed.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        for data in self._logs.values():
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._logs.clear()
+
     @classmethod
     def from_path(cls, path, size_limit=MAX_LOG_SIZE):
-        return cls(path, Report.select_logs(path), size_limit=size_limit)
+        log_cache = dict()
+        return cls(
+            path,
+            Report.select_logs(path, log_cache=log_cache),
+            size_limit=size_limit,
+            log_cache=log_cache)
+
+    def log_data(self, log_file):
+        """Content of a log file. The file is only read once.
+
+        Args:
+            log_file (str): Name of log file in report path.
+
+        Returns:
+            mmap: Content of log (can be bytes).
+        """
+        return read_log(self.path, log_file, self._logs)
 
     @property
     def major(self):
@@ -112,110 +160,35 @@ class Report(object):
     def preferred(self):
         return self.log_aux if self.log_aux is not None else self.log_err
 
-    @staticmethod
-    def select_logs(log_path):
-        if not os.path.isdir(log_path):
-            raise IOError("log_path does not exist %r" % log_path)
-        log_files = os.listdir(log_path)
-        if not log_files:
-            raise IOError("No logs found in %r" % log_path)
-        logs = {"aux": None, "stderr": None, "stdout": None}
-
-        # order by creation date because the oldest log is likely the cause of the issue
-        log_files.sort(key=lambda x: os.stat(os.path.join(log_path, x)).st_mtime)
-
-        # pattern to identify the ASan crash triggered when the parent process goes away
-        re_e10s_forced = re.compile(r"""
-            ==\d+==ERROR:.+?SEGV\son.+?0x[0]+\s\(.+?T2\).+?
-            #0\s+0x[0-9a-f]+\sin\s+mozilla::ipc::MessageChannel::OnChannelErrorFromLink
-            """, re.DOTALL | re.VERBOSE)
-
-        # this is a list of *San error reports to prioritize
-        # ASan reports not included below (deprioritized):
-        # stack-overflow, BUS, failed to allocate, detected memory leaks
-        interesting_sanitizer_tokens = (
-            "use-after-", "-buffer-overflow on", ": SEGV on ", "access-violation on ",
-            "negative-size-param", "attempting free on ", "-param-overlap")
-
-        # look for sanitizer (ASan, UBSan, etc...) logs
-        for fname in (log_file for log_file in log_files if "asan" in log_file):
-            # grab first chunk of log to help triage
-            with open(os.path.join(log_path, fname), "r") as log_fp:
-                log_data = log_fp.read(4096)
-
-            # look for interesting crash info in the log
-            if "==ERROR:" in log_data:
-                # check for e10s forced crash
-                if re_e10s_forced.search(log_data) is not None:
-                    continue
-                # make sure there is something that looks like a stack frame in the log
-                if "#0 " in log_data:
-                    logs["aux"] = fname
-                    if any(x in log_data for x in interesting_sanitizer_tokens):
-                        break  # this is the likely cause of the crash
-                    continue  # probably the most interesting but lets keep looking
-
-            # UBSan error (non-ASan builds)
-            if ": runtime error: " in log_data:
-                logs["aux"] = fname
-
-            # catch all (choose the one with info for now)
-            if logs["aux"] is None and os.stat(os.path.join(log_path, fname)).st_size:
-                logs["aux"] = fname
-
-        # look for Valgrind logs
-        if logs["aux"] is None:
-            for fname in (log_file for log_file in log_files if "valgrind" in log_file):
-                if os.stat(os.path.join(log_path, fname)).st_size:
-                    logs["aux"] = fname
-                    break
-
-        # prefer ASan logs over minidump logs
-        if logs["aux"] is None:
-            re_dump_req = re.compile(r"\d+\|0\|.+?\|google_breakpad::ExceptionHandler::WriteMinidump")
-            for fname in (log_file for log_file in log_files if "minidump" in log_file):
-                with open(os.path.join(log_path, fname), "r") as log_fp:
-                    log_data = log_fp.read(4096)
-                    # this will select log that contains "Crash|SIGSEGV|" or
-                    # the desired "DUMP_REQUESTED" log
-                    # TODO: review this it may be too strict
-                    # see https://searchfox.org/mozilla-central/source/accessible/ipc/DocAccessibleParent.cpp#452
-                    if "Crash|DUMP_REQUESTED|" not in log_data or re_dump_req.search(log_data):
-                        logs["aux"] = fname
-                        break
-
-        # look for ffpuppet worker logs, worker logs should be used if nothing else is available
-        if logs["aux"] is None:
-            for fname in (log_file for log_file in log_files if "ffp_worker" in log_file):
-                if logs["aux"] is not None:
-                    # we only expect one log here...
-                    log.warning("aux log previously selected: %s, overwriting!", logs["aux"])
-                logs["aux"] = fname
-
-        for fname in log_files:
-            if "stderr" in fname:
-                logs["stderr"] = fname
-            elif "stdout" in fname:
-                logs["stdout"] = fname
-
-        return logs
+    select_logs = staticmethod(select_logs)
 
     @staticmethod
-    def tail(in_file, size_limit):
+    def tail(in_file, size_limit, data=None):
+        """Remove data from the start of a file (in place) so it is not larger
+        than size_limit. Only the end of the file is read, the remaining content is
+        written to the start of the file and the file is truncated.
+
+        Args:
+            in_file (str): File to tail.
+            size_limit (int): Maximum number of bytes of original content to keep.
+            data (bytes): Content of in_file (at least the last size_limit bytes)
+                          if it has already been read.
+
+        Returns:
+            bytes: New content of in_file or None if it was not modified.
+        """
         assert size_limit > 0
         if os.stat(in_file).st_size <= size_limit:
-            return
-        with open(in_file, "rb") as in_fp:
-            in_fp.seek(0, os.SEEK_END)
-            dump_pos = max((in_fp.tell() - size_limit), 0)
-            in_fp.seek(dump_pos)
-            out_fd, out_file = tempfile.mkstemp()
-            os.close(out_fd)
-            with open(out_file, "wb") as out_fp:
-                out_fp.write(b"[LOG TAILED]\n")
-                shutil.copyfileobj(in_fp, out_fp, 0x10000)  # 64KB chunks
-        os.remove(in_file)
-        shutil.move(out_file, in_file)
+            return None
+        with open(in_file, "r+b") as log_fp:
+            if data is None:
+                log_fp.seek(-size_limit, os.SEEK_END)
+                data = log_fp.read()
+            tailed = b"".join((b"[LOG TAILED]\n", data[-size_limit:]))
+            log_fp.seek(0)
+            log_fp.write(tailed)
+            log_fp.truncate()
+        return tailed
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -232,6 +205,27 @@ class Reporter(object):
     def _submit(self, report, test_cases):
         pass
 
+    @staticmethod
+    def _dump_test_cases(test_cases, out_path, prefix):
+        """Write test cases to numbered directories in out_path. Files with
+        identical data are written once and hard linked in all of the test cases.
+
+        Args:
+            test_cases (list): TestCases to write.
+            out_path (str): Directory to create test case directories in.
+            prefix (str): Prefix of test case directory names.
+
+        Returns:
+            None
+        """
+        dumps = list()
+        for test_number, test_case in enumerate(test_cases):
+            dump_path = os.path.join(out_path, "%s-%d" % (prefix, test_number))
+            if not os.path.isdir(dump_path):
+                os.mkdir(dump_path)
+            dumps.append((test_case, dump_path))
+        TestCase.dump_all(dumps, include_details=True, link=True)
+
     def submit(self, log_path, test_cases):
         """
         Submit report containing results.
@@ -260,18 +254,43 @@ class Reporter(object):
 class FilesystemReporter(Reporter):
     DISK_SPACE_ABORT = 512 * 1024 * 1024  # 512 MB
 
-    def __init__(self, report_path=None):
+    def __init__(self, report_path=None, similar=None):
+        assert similar is None or 0 < similar <= 1
         self.report_path = os.path.join(os.getcwd(), "results") if report_path is None else report_path
+        # reports with a new major hash that have a stack similar (>= similar) to a bucket
+        # created by this reporter are stored in that bucket (see StackIndex)
+        self.similar = similar
+        self._index = StackIndex() if similar is not None else None
+
+    def _bucket(self, report):
+        """Select the bucket (directory name) for a report.
+
+        Args:
+            report (Report): Report to store.
+
+        Returns:
+            str: Name of the bucket.
+        """
+        major = report.major
+        if self._index is None or report.stack is None or major in self._index:
+            return major
+        if not os.path.isdir(os.path.join(self.report_path, major)):
+            found = self._index.query(report.stack, threshold=self.similar)
+            if found:
+                log.info("Stack is similar (%0.2f) to bucket %s", found[0][0], found[0][1])
+                return found[0][1]
+        self._index.add(major, report.stack)
+        return major
 
     @staticmethod
-    def compress_rr_trace(src, dest):
+    def compress_rr_trace(src, dest, level=9, workers=None):
         # resolve symlink to latest trace available
         latest_trace = os.path.realpath(os.path.join(src, "latest-trace"))
         assert os.path.isdir(latest_trace), "missing latest-trace directory"
         rr_arc = os.path.join(dest, "rr.tar.bz2")
         log.debug("creating %r from %r", rr_arc, latest_trace)
-        with tarfile.open(rr_arc, "w:bz2") as arc_fp:
-            arc_fp.add(latest_trace, arcname=os.path.basename(latest_trace))
+        # traces can be very large, compress using multiple threads
+        tar_bz2(latest_trace, rr_arc, level=level, workers=workers)
         # remove path containing uncompressed traces
         shutil.rmtree(src)
         return rr_arc
@@ -286,18 +305,15 @@ class FilesystemReporter(Reporter):
 
     def _submit(self, report, test_cases):
         # create major bucket directory in working directory if needed
-        major_dir = os.path.join(self.report_path, report.major)
+        major_dir = os.path.join(self.report_path, self._bucket(report))
         if not os.path.isdir(major_dir):
             os.makedirs(major_dir)
 
         # dump test cases and the contained files to working directory
-        for test_number, test_case in enumerate(test_cases):
-            dump_path = os.path.join(major_dir, "%s-%d" % (report.prefix, test_number))
-            if not os.path.isdir(dump_path):
-                os.mkdir(dump_path)
-            test_case.dump(dump_path, include_details=True)
+        self._dump_test_cases(test_cases, major_dir, report.prefix)
 
         # move logs into bucket directory
+        report.close()
         target_dir = os.path.join(major_dir, "%s_%s" % (report.prefix, "logs"))
         if os.path.isdir(target_dir):
             log.warning("Report log path exists %r", target_dir)
@@ -314,6 +330,12 @@ class FuzzManagerReporter(Reporter):
     FM_CONFIG = os.path.join(os.path.expanduser("~"), ".fuzzmanagerconf")
     # max number of times to report a non-frequent signature to FuzzManager
     MAX_REPORTS = 10
+    # local signature database (see SignatureDB)
+    SIG_DB = SignatureDB.PATH
+    # serializes signature cache searches and new signature database entries between processes
+    SIG_LOCK = os.path.join(tempfile.gettempdir(), "fm_sigcache.lock")
+    # compression level used for the archive submitted to FuzzManager
+    COMPRESS_LEVEL = 6
 
     # testcase quality values
     QUAL_REDUCED_RESULT = 0  # the final reduced testcase
@@ -327,6 +349,7 @@ class FuzzManagerReporter(Reporter):
     QUAL_NOT_REPRODUCIBLE = 10  # could not reproduce the testcase
 
     def __init__(self, target_binary, tool=None):
+        self._collector = None  # created when first needed (see _get_collector())
         self._extra_metadata = {}
         self.force_report = False
         self.quality = self.QUAL_UNREDUCED
@@ -335,19 +358,28 @@ class FuzzManagerReporter(Reporter):
 
     @staticmethod
     def create_crash_info(report, target_binary):
-        # read in the log files and create a CrashInfo object
+        # create a CrashInfo object from the log files
+        def _lines(log_file):
+            # decode one line at a time to avoid copying the entire log
+            data = report.log_data(log_file)
+            lines = list()
+            start = 0
+            end = len(data)
+            while start < end:
+                eol = data.find(b"\n", start)
+                if eol < 0:
+                    eol = end
+                lines.extend(data[start:eol].decode("utf-8", errors="ignore").splitlines() or [""])
+                start = eol + 1
+            return lines
         aux_data = None
         if report.log_aux is not None:
-            with open(os.path.join(report.path, report.log_aux), "rb") as log_fp:
-                aux_data = log_fp.read().decode("utf-8", errors="ignore").splitlines()
-        stderr_file = os.path.join(report.path, report.log_err)
-        stdout_file = os.path.join(report.path, report.log_out)
-        with open(stderr_file, "rb") as err_fp, open(stdout_file, "rb") as out_fp:
-            return CrashInfo.fromRawCrashData(
-                out_fp.read().decode("utf-8", errors="ignore").splitlines(),
-                err_fp.read().decode("utf-8", errors="ignore").splitlines(),
-                ProgramConfiguration.fromBinary(target_binary),
-                auxCrashData=aux_data)
+            aux_data = _lines(report.log_aux)
+        return CrashInfo.fromRawCrashData(
+            _lines(report.log_out),
+            _lines(report.log_err),
+            ProgramConfiguration.fromBinary(target_binary),
+            auxCrashData=aux_data)
 
     def _reset(self):
         self._extra_metadata = {}
@@ -396,75 +428,138 @@ class FuzzManagerReporter(Reporter):
     def _ignored(report):
         # This is here to prevent reporting stack-less crashes
         # that were caused by system OOM or bogus other crashes
-        log_file = os.path.join(report.path, report.preferred)
-        with open(log_file, "rb") as log_fp:
-            log_data = log_fp.read().decode("utf-8", errors="ignore")
+        # search the log content in place (mmap) instead of creating a copy
+        log_data = report.log_data(report.preferred)
         mem_errs = (
-            "ERROR: Failed to mmap",
-            ": AddressSanitizer failed to allocate")
+            b"ERROR: Failed to mmap",
+            b": AddressSanitizer failed to allocate")
         for msg in mem_errs:
-            if msg in log_data and "#0 " not in log_data:
+            if log_data.find(msg) >= 0 and log_data.find(b"#0 ") < 0:
                 return True
-        if log_data.startswith("VEX temporary storage exhausted."):
+        vex_err = b"VEX temporary storage exhausted."
+        if log_data[:len(vex_err)] == vex_err:
             # ignore Valgrind crashes
             return True
         return False
 
+    def _add_signature(self, sig_db, collector, crash_info, short_sig):
+        """Add the signature matching crash_info to the signature database.
+        The FuzzManager signature cache is searched first, if there is no match
+        a new signature is created.
+
+        Args:
+            sig_db (SignatureDB): Signature database.
+            collector (Collector): FuzzManager Collector.
+            crash_info (CrashInfo): Crash to find the signature for.
+            short_sig (str): Short signature of crash_info.
+
+        Returns:
+            dict: Signature database entry or None if a signature could not be created.
+        """
+        cache_sig_file, cache_metadata = collector.search(crash_info)
+        if cache_sig_file is not None:
+            with open(cache_sig_file, "r") as sig_fp:
+                signature = sig_fp.read()
+            return sig_db.add(
+                short_sig,
+                signature,
+                bug_id=cache_metadata.get("bug__id"),
+                frequent=cache_metadata.get("frequent", False))
+        # there is no signature, create one locally so we can count
+        # the number of times we've seen it
+        signature = crash_info.createCrashSignature(maxFrames=self.signature_max_frames(crash_info))
+        if not signature:
+            return None
+        return sig_db.add(short_sig, str(signature))
+
+    def _get_collector(self):
+        """Get the FuzzManager Collector, it is created on first use.
+
+        Args:
+            None
+
+        Returns:
+            Collector: FuzzManager Collector.
+        """
+        if self._collector is None:
+            self._collector = Collector()
+        return self._collector
+
+    @staticmethod
+    def _find_signature(sig_db, crash_info, short_sig):
+        """Find the signature database entry matching crash_info.
+
+        Args:
+            sig_db (SignatureDB): Signature database.
+            crash_info (CrashInfo): Crash to find the signature for.
+            short_sig (str): Short signature of crash_info.
+
+        Returns:
+            dict: Signature database entry or None if there is no match.
+        """
+        for entry in sig_db.find(short_sig):
+            if CrashSignature(entry["signature"]).matches(crash_info):
+                return entry
+        return None
+
+    @staticmethod
+    def _sigcache_version(collector):
+        """Version of the FuzzManager signature cache. This changes each time the
+        signature cache is refreshed (the content of the directory is replaced).
+
+        Args:
+            collector (Collector): FuzzManager Collector.
+
+        Returns:
+            str: Version of the signature cache or None if it is not available.
+        """
+        sig_cache = getattr(collector, "sigCacheDir", None)
+        if sig_cache is None:
+            return None
+        try:
+            return repr(os.stat(sig_cache).st_mtime)
+        except OSError:
+            return None
+
     def _submit(self, report, test_cases):
         # prepare data for submission as CrashInfo
         crash_info = self.create_crash_info(report, self.target_binary)
 
-        # search for a cached signature match and if the signature
-        # is already in the cache and marked as frequent, don't bother submitting
-        with fasteners.process_lock.InterProcessLock(os.path.join(tempfile.gettempdir(), "fm_sigcache.lock")):
-            collector = Collector()
-            cache_sig_file, cache_metadata = collector.search(crash_info)
-            if cache_metadata is not None:
-                if cache_metadata["frequent"]:
-                    log.info("Frequent crash matched existing signature: %s",
-                             cache_metadata["shortDescription"])
-                    if not self.force_report:
-                        return
-                elif "bug__id" in cache_metadata:
-                    log.info("Crash matched existing signature (bug %s): %s",
-                             cache_metadata["bug__id"],
-                             cache_metadata["shortDescription"])
-                    # we will still report this one, but no more
-                    cache_metadata["frequent"] = True
-                # there is already a signature, initialize count
-                cache_metadata.setdefault("_grizzly_seen_count", 0)
-            else:
-                # there is no signature, create one locally so we can count
-                # the number of times we've seen it
-                max_frames = self.signature_max_frames(crash_info)
-                cache_sig_file = collector.generate(crash_info, numFrames=max_frames)
-                cache_metadata = {
-                    "_grizzly_seen_count": 0,
-                    "frequent": False,
-                    "shortDescription": crash_info.createShortSignature()}
-            if cache_sig_file is None:
+        # look up the signature in the local signature database and if the signature
+        # is already known and marked as frequent, don't bother submitting
+        short_sig = crash_info.createShortSignature()
+        collector = self._get_collector()
+        with SignatureDB(self.SIG_DB) as sig_db:
+            # discard entries and seen counts when the signature cache is refreshed
+            if sig_db.sync(self._sigcache_version(collector)):
+                log.debug("signature cache has been refreshed")
+            entry = self._find_signature(sig_db, crash_info, short_sig)
+            if entry is None:
+                # only search the signature cache and add entries in one process at a time
+                with fasteners.process_lock.InterProcessLock(self.SIG_LOCK):
+                    # the entry may have been added while waiting for the lock
+                    entry = self._find_signature(sig_db, crash_info, short_sig)
+                    if entry is None:
+                        entry = self._add_signature(sig_db, collector, crash_info, short_sig)
+            if entry is None:
                 if self._ignored(report):
                     log.info("Report is unsupported and is in ignore list")
                     return
                 log.warning("Report is unsupported by FM, saved to %r", report.path)
                 raise RuntimeError("Failed to create FM signature")
             # limit the number of times we report per cycle
-            cache_metadata["_grizzly_seen_count"] += 1
-            if cache_metadata["_grizzly_seen_count"] >= self.MAX_REPORTS:
-                # we will still report this one, but no more
-                cache_metadata["frequent"] = True
-            metadata_file = cache_sig_file.replace(".signature", ".metadata")
-            with open(metadata_file, "w") as meta_fp:
-                json.dump(cache_metadata, meta_fp)
+            seen, frequent = sig_db.hit(entry["id"], self.MAX_REPORTS)
+        if frequent:
+            log.info("Frequent crash matched existing signature: %s", short_sig)
+            if not self.force_report:
+                return
+        elif entry["bug_id"] is not None:
+            # we will still report this one, but no more
+            log.info("Crash matched existing signature (bug %s): %s", entry["bug_id"], short_sig)
 
         # dump test cases and the contained files to working directory
-        test_case_meta = []
-        for test_number, test_case in enumerate(test_cases):
-            test_case_meta.append([test_case.adapter_name, test_case.input_fname])
-            dump_path = os.path.join(report.path, "%s-%d" % (report.prefix, test_number))
-            if not os.path.isdir(dump_path):
-                os.mkdir(dump_path)
-            test_case.dump(dump_path, include_details=True)
+        test_case_meta = [[x.adapter_name, x.input_fname] for x in test_cases]
+        self._dump_test_cases(test_cases, report.path, report.prefix)
         crash_info.configuration.addMetadata({"grizzly_input": repr(test_case_meta)})
         if test_cases:
             crash_info.configuration.addMetadata(
@@ -483,22 +578,15 @@ class FuzzManagerReporter(Reporter):
 
         # add results to a zip file
         zip_name = "%s.zip" % (report.prefix,)
-        with zipfile.ZipFile(zip_name, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_fp:
-            # add test files
-            for dir_name, _, dir_files in os.walk(report.path):
-                arc_path = os.path.relpath(dir_name, report.path)
-                for file_name in dir_files:
-                    zip_fp.write(
-                        os.path.join(dir_name, file_name),
-                        arcname=os.path.join(arc_path, file_name))
+        zip_path(report.path, zip_name, level=self.COMPRESS_LEVEL)
 
         # override tool name if specified
         if self.tool is not None:
             collector.tool = self.tool
 
         # announce shortDescription if crash is not in a bucket
-        if cache_metadata["_grizzly_seen_count"] == 1 and not cache_metadata["frequent"]:
-            log.info("Submitting new crash %r", cache_metadata["shortDescription"])
+        if seen == 1 and not frequent and entry["bug_id"] is None:
+            log.info("Submitting new crash %r", short_sig)
         # submit results to the FuzzManager server
         new_entry = collector.submit(crash_info, testCase=zip_name, testCaseQuality=self.quality)
         log.info("Logged %d with quality %d", new_entry["id"], self.quality)
@@ -509,29 +597,67 @@ class FuzzManagerReporter(Reporter):
 
 
 class S3FuzzManagerReporter(FuzzManagerReporter):
+    # keys known to exist in S3 are recorded here to avoid repeated HEAD requests
+    S3_CACHE = os.path.join(tempfile.gettempdir(), "grzs3cache")
+    # seconds before a cached key is checked again (objects can be removed from S3)
+    S3_CACHE_TTL = 3600
+    # multipart upload settings
+    S3_PART_SIZE = 32 * 1024 * 1024  # 32MB
+    S3_THREADS = 8
+
     def _pre_submit(self, report):
         self._process_rr_trace(report)
 
+    @classmethod
+    def _cache_file(cls, s3_bucket, s3_key):
+        return os.path.join(cls.S3_CACHE, s3_bucket, s3_key)
+
+    @classmethod
+    def _cache_add(cls, s3_bucket, s3_key):
+        cache_file = cls._cache_file(s3_bucket, s3_key)
+        try:
+            os.makedirs(os.path.dirname(cache_file))
+        except OSError:
+            if not os.path.isdir(os.path.dirname(cache_file)):
+                raise
+        with open(cache_file, "w"):
+            pass
+        # update the timestamp of an existing entry
+        os.utime(cache_file, None)
+
+    @classmethod
+    def _cache_valid(cls, s3_bucket, s3_key):
+        try:
+            cached = os.stat(cls._cache_file(s3_bucket, s3_key)).st_mtime
+        except OSError:
+            return False
+        return time.time() - cached < cls.S3_CACHE_TTL
+
     def _process_rr_trace(self, report):
         trace_path = os.path.join(report.path, "rr-traces")
         if not os.path.isdir(trace_path):
             return None
         s3_bucket = os.getenv("GRZ_S3_BUCKET")
         assert s3_bucket is not None
-        # check for existing minor hash in S3
-        s3 = boto3.resource("s3")
         s3_key = "rr-%s.tar.bz2" % (report.minor,)
         s3_url = "http://%s.s3.amazonaws.com/%s" % (s3_bucket, s3_key)
-        try:
-            s3.Object(s3_bucket, s3_key).load()  # HEAD, doesn't fetch the whole object
-        except botocore.exceptions.ClientError as exc:
-            if exc.response["Error"]["Code"] == "404":
-                # The object does not exist.
-                pass
+        # check for existing minor hash in local cache then S3
+        exists = self._cache_valid(s3_bucket, s3_key)
+        s3 = boto3.resource("s3")
+        if not exists:
+            try:
+                s3.Object(s3_bucket, s3_key).load()  # HEAD, doesn't fetch the whole object
+            except botocore.exceptions.ClientError as exc:
+                if exc.response["Error"]["Code"] == "404":
+                    # The object does not exist (or has been removed).
+                    pass
+                else:
+                    # Something else has gone wrong.
+                    raise
             else:
-                # Something else has gone wrong.
-                raise
-        else:
+                exists = True
+                self._cache_add(s3_bucket, s3_key)
+        if exists:
             # The object already exists.
             log.info("RR trace exists at %s", s3_url)
             self._extra_metadata["rr-trace"] = s3_url
@@ -539,10 +665,16 @@ class S3FuzzManagerReporter(FuzzManagerReporter):
             shutil.rmtree(trace_path)
             return s3_url
 
-        # Upload to S3
+        # Upload to S3, large files are uploaded in parts concurrently
         rr_arc = FilesystemReporter.compress_rr_trace(trace_path, report.path)
-        s3.meta.client.upload_file(rr_arc, s3_bucket, s3_key, ExtraArgs={"ACL": "public-read"})
+        config = TransferConfig(
+            max_concurrency=self.S3_THREADS,
+            multipart_chunksize=self.S3_PART_SIZE,
+            multipart_threshold=self.S3_PART_SIZE,
+            use_threads=True)
+        s3.meta.client.upload_file(rr_arc, s3_bucket, s3_key, Config=config, ExtraArgs={"ACL": "public-read"})
         os.unlink(rr_arc)
+        self._cache_add(s3_bucket, s3_key)
         self._extra_metadata["rr-trace"] = s3_url
         return s3_url
 
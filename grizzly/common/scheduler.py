@@ -0,0 +1,173 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Select the next input file to use."""
+import random
+
+__all__ = ("InputScheduler", "WeightedScheduler", "SCHEDULERS")
+
+
+class InputScheduler(object):
+    """InputScheduler selects input files uniformly at random. This is the base class
+    for schedulers, subclasses can track and use weights set via scale() and set_weight().
+    """
+    def __init__(self):
+        self.current = None  # index of the most recently selected input
+
+    def get_weight(self, index=None):  # pylint: disable=no-self-use,unused-argument
+        """Get weight of an input.
+
+        Args:
+            index (int): Index of input. Defaults to the most recently selected input.
+
+        Returns:
+            float: Weight of the input.
+        """
+        return 1.0
+
+    def scale(self, factor, index=None):
+        """Multiply the weight of an input by factor.
+
+        Args:
+            factor (float): Value to multiply the weight by.
+            index (int): Index of input. Defaults to the most recently selected input.
+
+        Returns:
+            None
+        """
+        self.set_weight(self.get_weight(index) * factor, index=index)
+
+    def select(self, count):
+        """Select an input.
+
+        Args:
+            count (int): Number of available inputs.
+
+        Returns:
+            int: Index of selected input.
+        """
+        assert count > 0
+        self.current = random.randrange(count)
+        return self.current
+
+    def set_weight(self, weight, index=None):
+        """Set weight of an input.
+
+        Args:
+            weight (float): New weight.
+            index (int): Index of input. Defaults to the most recently selected input.
+
+        Returns:
+            None
+        """
+
+
+class WeightedScheduler(InputScheduler):
+    """WeightedScheduler selects inputs with a probability proportional to their weight.
+    Weights are stored in a Fenwick tree so selection and weight updates are O(log n).
+    Weights are clamped to [MIN_WEIGHT, MAX_WEIGHT] so inputs are never starved.
+    """
+    DEFAULT_WEIGHT = 1.0
+    MAX_WEIGHT = 100.0
+    MIN_WEIGHT = 0.01
+
+    def __init__(self):
+        super(WeightedScheduler, self).__init__()
+        self._tree = [0.0]  # Fenwick tree (1-based)
+        self._weights = list()
+
+    def __len__(self):
+        return len(self._weights)
+
+    def _add(self, index, delta):
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _find(self, value):
+        """Find the first index where the prefix sum of weights exceeds value.
+
+        Args:
+            value (float): Value to search for.
+
+        Returns:
+            int: Index of input.
+        """
+        pos = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] <= value:
+                pos = nxt
+                value -= self._tree[nxt]
+            step >>= 1
+        # guard against accumulated floating point error
+        return min(pos, len(self._weights) - 1)
+
+    def _index(self, index):
+        if index is None:
+            index = self.current
+        assert index is not None, "no input has been selected"
+        return index
+
+    def get_weight(self, index=None):
+        return self._weights[self._index(index)]
+
+    def resize(self, count):
+        """Track additional inputs using the default weight.
+
+        Args:
+            count (int): Total number of inputs.
+
+        Returns:
+            None
+        """
+        assert count >= len(self._weights), "inputs cannot be removed"
+        while len(self._weights) < count:
+            self._weights.append(self.DEFAULT_WEIGHT)
+            index = len(self._tree)
+            # node covers range (index - lowbit, index]
+            total = self.DEFAULT_WEIGHT
+            child = index - 1
+            stop = index - (index & -index)
+            while child > stop:
+                total += self._tree[child]
+                child -= child & -child
+            self._tree.append(total)
+
+    def select(self, count):
+        assert count > 0
+        if count != len(self._weights):
+            self.resize(count)
+        self.current = self._find(random.random() * self.total)
+        return self.current
+
+    def set_weight(self, weight, index=None):
+        index = self._index(index)
+        weight = max(min(weight, self.MAX_WEIGHT), self.MIN_WEIGHT)
+        self._add(index, weight - self._weights[index])
+        self._weights[index] = weight
+
+    @property
+    def total(self):
+        """Sum of all weights.
+
+        Args:
+            None
+
+        Returns:
+            float: Total weight.
+        """
+        index = len(self._tree) - 1
+        total = 0.0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+
+SCHEDULERS = {
+    "uniform": InputScheduler,
+    "weighted": WeightedScheduler}
@@ -0,0 +1,181 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Local store of crash signatures and metadata shared by multiple processes."""
+import os
+import sqlite3
+import tempfile
+
+__all__ = ("SignatureDB",)
+
+
+class SignatureDB(object):
+    """SignatureDB stores crash signatures (FuzzManager JSON format) and metadata
+    in a SQLite database. Entries are indexed by every short signature that has been
+    matched to them so lookups do not require scanning all signatures. The database
+    uses write-ahead logging so multiple processes can read concurrently and the seen
+    count is updated atomically.
+
+    Entries are only valid for a single version of the FuzzManager signature cache,
+    sync() must be called to discard entries (and seen counts) when the signature
+    cache has been refreshed.
+    """
+    PATH = os.path.join(tempfile.gettempdir(), "grzsigdb.sqlite")
+    SCHEMA = 2  # increment when the layout of the database is modified
+    TIMEOUT = 60  # seconds to wait for a lock held by another process
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file or self.PATH
+        # autocommit mode, transactions are managed explicitly
+        self._conn = sqlite3.connect(self.db_file, timeout=self.TIMEOUT, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA:
+                # created by a different version, discard content
+                for table in ("short_sigs", "signatures", "state"):
+                    self._conn.execute("DROP TABLE IF EXISTS %s" % (table,))
+                self._conn.execute("PRAGMA user_version=%d" % (self.SCHEMA,))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " id INTEGER PRIMARY KEY,"
+                " signature TEXT NOT NULL UNIQUE,"
+                " bug_id INTEGER,"
+                " frequent INTEGER NOT NULL DEFAULT 0,"
+                " seen INTEGER NOT NULL DEFAULT 0)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS short_sigs ("
+                " short_sig TEXT NOT NULL,"
+                " sig_id INTEGER NOT NULL REFERENCES signatures (id) ON DELETE CASCADE,"
+                " PRIMARY KEY (short_sig, sig_id))")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            self._conn.close()
+            raise
+        self._conn.execute("COMMIT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, short_sig, signature, bug_id=None, frequent=False):
+        """Add a signature. If the signature already exists the existing entry is
+        returned and left unmodified. In both cases short_sig is mapped to the entry.
+
+        Args:
+            short_sig (str): Short signature of the crash.
+            signature (str): Crash signature (JSON).
+            bug_id (int): Bug associated with the signature.
+            frequent (bool): Signature is marked as frequent.
+
+        Returns:
+            dict: Entry (bug_id, frequent, id, seen, signature).
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO signatures (signature, bug_id, frequent) VALUES (?, ?, ?)",
+                (signature, bug_id, int(frequent)))
+            row = self._conn.execute(
+                "SELECT * FROM signatures WHERE signature = ?", (signature,)).fetchone()
+            self._conn.execute(
+                "INSERT OR IGNORE INTO short_sigs (short_sig, sig_id) VALUES (?, ?)", (short_sig, row["id"]))
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return self._entry(row)
+
+    def close(self):
+        """Close the database connection.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._conn.close()
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(zip(row.keys(), row))
+        entry["frequent"] = bool(entry["frequent"])
+        return entry
+
+    def find(self, short_sig):
+        """Look up signatures by short signature.
+
+        Args:
+            short_sig (str): Short signature of the crash.
+
+        Returns:
+            list: Matching entries (see add()).
+        """
+        rows = self._conn.execute(
+            "SELECT signatures.* FROM signatures"
+            " JOIN short_sigs ON short_sigs.sig_id = signatures.id"
+            " WHERE short_sigs.short_sig = ? ORDER BY signatures.id", (short_sig,)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def hit(self, sig_id, limit):
+        """Increment the seen count of a signature. The signature is marked as
+        frequent once the seen count reaches limit or if it has an associated bug.
+
+        Args:
+            sig_id (int): Id of signature entry.
+            limit (int): Seen count at which the signature becomes frequent.
+
+        Returns:
+            tuple: Updated seen count (int) and if the signature was already frequent (bool).
+        """
+        # take the write lock before reading so the update is atomic
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT frequent FROM signatures WHERE id = ?", (sig_id,)).fetchone()
+            assert row is not None, "unknown signature id %r" % (sig_id,)
+            self._conn.execute(
+                "UPDATE signatures SET seen = seen + 1,"
+                " frequent = (frequent OR bug_id IS NOT NULL OR seen + 1 >= ?) WHERE id = ?",
+                (limit, sig_id))
+            seen = self._conn.execute("SELECT seen FROM signatures WHERE id = ?", (sig_id,)).fetchone()[0]
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return seen, bool(row[0])
+
+    def sync(self, version):
+        """Discard all entries (including seen counts) if version does not match
+        the version of the previous call. This should be called with a value that
+        changes each time the FuzzManager signature cache is refreshed so metadata
+        from FuzzManager (bug, frequent, removed signatures) is updated and the
+        number of reports is limited per signature cache cycle.
+
+        Args:
+            version (str): Version of the signature cache.
+
+        Returns:
+            bool: True if the version changed (entries were discarded) otherwise False.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'version'").fetchone()
+            if row is not None and row[0] == version:
+                self._conn.execute("ROLLBACK")
+                return False
+            self._conn.execute("DELETE FROM short_sigs")
+            self._conn.execute("DELETE FROM signatures")
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('version', ?)", (version,))
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return True
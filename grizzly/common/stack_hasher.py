@@ -13,22 +13,51 @@ crash id (1st hash) and a bug id (2nd hash). This is not perfect but works very
 well in most cases.
 """
 
-__all__ = ("Stack", "StackFrame")
+__all__ = ("Stack", "StackFrame", "StackIndex", "bulk_hash", "write_buckets")
 __author__ = "Tyson Smith"
 __credits__ = ["Tyson Smith"]
 
 import argparse
+import csv
 import hashlib
+import json
 import logging
+import mmap
+from multiprocessing import Pool
 import os
+import random
 import re
+from struct import unpack
+import sys
+
+from six.moves import intern
+
+from .log_select import select_logs
 
 log = logging.getLogger("stack_hasher")  # pylint: disable=invalid-name
 
 MAJOR_DEPTH = 5
 MAJOR_DEPTH_RUST = 10
+NO_STACK_MAJOR = "NO_STACK"  # hashes used when no stack is found
+NO_STACK_MINOR = "0"
+
+def _intern(value):
+    """
+    intern strings so frames with the same function/location share a single copy.
+    """
+
+    if value is None:
+        return None
+    try:
+        return intern(value)
+    except TypeError:
+        # python 2 cannot intern unicode
+        return value
+
 
 class StackFrame(object):
+    __slots__ = ("_hash_data", "function", "location", "mode", "offset", "stack_line")
+
     MODE_ASAN = 0
     MODE_GDB = 1
     MODE_MINIDUMP = 2
@@ -37,6 +66,10 @@ class StackFrame(object):
     MODE_VALGRIND = 5
 
     _re_func_name = re.compile(r"(?P<func>.+?)[\(|\s|\<]{1}")
+    # classify lines using the prefix required by each supported format
+    # the alternatives are mutually exclusive so at most one group matches
+    _re_dispatch = re.compile(
+        r"(?P<hash>\s*#\d)|(?P<rr>rr\()|(?P<valgrind>==\d+==\s)|(?P<rust>\s+\d+:)")
     # regexs for supported stack trace lines
     _re_asan_w_syms = re.compile(r"^\s*#(?P<num>\d+)\s0x[0-9a-f]+\sin\s(?P<line>.+)")
     _re_asan_wo_syms = re.compile(r"^\s*#(?P<num>\d+)\s0x[0-9a-f]+\s+\((?P<line>.+?)(\+(?P<off>0x[0-9a-f]+))?\)")
@@ -50,8 +83,9 @@ class StackFrame(object):
     #_re_windbg = re.compile(r"^(\(Inline\)|[a-f0-9]+)\s([a-f0-9]+|-+)\s+(?P<line>.+)\+(?P<off>0x[a-f0-9]+)")
 
     def __init__(self, function=None, location=None, mode=None, offset=None, stack_line=None):
-        self.function = function
-        self.location = location
+        self._hash_data = None
+        self.function = _intern(function)
+        self.location = _intern(location)
         self.offset = offset
         self.stack_line = stack_line
         self.mode = mode
@@ -71,39 +105,62 @@ class StackFrame(object):
         return " - ".join(out)
 
 
+    def hash_data(self):
+        """
+        data added to the stack hash by this frame (encoded once and cached).
+        returns a tuple of location+function and offset (bytes).
+        """
+
+        if self._hash_data is None:
+            base = b""
+            if self.location is not None:
+                base += self.location.encode("utf-8", errors="ignore")
+            if self.function is not None:
+                base += self.function.encode("utf-8", errors="ignore")
+            offset = b""
+            if self.offset is not None:
+                offset = self.offset.encode("utf-8", errors="ignore")
+            self._hash_data = (base, offset)
+        return self._hash_data
+
+
     @classmethod
     def from_line(cls, input_line, parse_mode=None):
         assert "\n" not in input_line, "Input contains unexpected new line(s)"
-        # try to match symbolized ASan output line
-        if parse_mode is None or parse_mode == StackFrame.MODE_ASAN:
-            frame_info = cls._parse_asan_with_syms(input_line)
-            if frame_info is not None:
-                return StackFrame(**frame_info)
-            frame_info = cls._parse_asan_wo_syms(input_line)
-            if frame_info is not None:
-                return StackFrame(**frame_info)
-
-        if parse_mode is None or parse_mode == StackFrame.MODE_GDB:
-            frame_info = cls._parse_gdb(input_line)
-            if frame_info is not None:
-                return StackFrame(**frame_info)
-
-        if parse_mode is None or parse_mode == StackFrame.MODE_MINIDUMP:
+        # only the parsers that can possibly match the line are called
+        # (in the same order as they would otherwise be tried)
+        m = cls._re_dispatch.match(input_line)
+        kind = m.lastgroup if m is not None else None
+        if kind == "hash":
+            # try to match symbolized ASan output line
+            if parse_mode is None or parse_mode == StackFrame.MODE_ASAN:
+                frame_info = cls._parse_asan_with_syms(input_line)
+                if frame_info is not None:
+                    return StackFrame(**frame_info)
+                frame_info = cls._parse_asan_wo_syms(input_line)
+                if frame_info is not None:
+                    return StackFrame(**frame_info)
+            if parse_mode is None or parse_mode == StackFrame.MODE_GDB:
+                frame_info = cls._parse_gdb(input_line)
+                if frame_info is not None:
+                    return StackFrame(**frame_info)
+
+        if input_line.count("|") == 6 and (parse_mode is None or parse_mode == StackFrame.MODE_MINIDUMP):
             frame_info = cls._parse_minidump(input_line)
             if frame_info is not None:
                 return StackFrame(**frame_info)
 
-        if parse_mode is None or parse_mode == StackFrame.MODE_RR:
+        if kind == "rr" and (parse_mode is None or parse_mode == StackFrame.MODE_RR):
             frame_info = cls._parse_rr(input_line)
             if frame_info is not None:
                 return StackFrame(**frame_info)
 
-        if parse_mode is None or parse_mode == StackFrame.MODE_RUST:
+        if kind == "rust" and (parse_mode is None or parse_mode == StackFrame.MODE_RUST):
             frame_info = cls._parse_rust(input_line)
             if frame_info is not None:
                 return StackFrame(**frame_info)
 
-        if parse_mode is None or parse_mode == StackFrame.MODE_VALGRIND:
+        if kind == "valgrind" and (parse_mode is None or parse_mode == StackFrame.MODE_VALGRIND):
             frame_info = cls._parse_valgrind(input_line)
             if frame_info is not None:
                 return StackFrame(**frame_info)
@@ -171,7 +228,6 @@ class StackFrame(object):
         frame["stack_line"] = m.group("num")
         #frame["offset"] = m.group("off")  # ignore binary offset for now
         input_line = m.group("line").strip()
-        print(input_line)
         if not input_line:
             return
 
@@ -301,31 +357,46 @@ class Stack(object):
         if not self.frames or (major and self._major_depth < 1):
             return None
 
-        current_depth = 0
-        for frame in self.frames:
-            current_depth += 1
-            if major and current_depth > self._major_depth:
-                break
-
-            if frame.location is not None:
-                h.update(frame.location.encode("utf-8", errors="ignore"))
-
-            if frame.function is not None:
-                h.update(frame.function.encode("utf-8", errors="ignore"))
-
+        frames = self.frames[:self._major_depth] if major else self.frames
+        for current_depth, frame in enumerate(frames, 1):
+            base, offset = frame.hash_data()
+            h.update(base)
             if major and current_depth > 1:
                 # only add the offset from the top frame when calculating
                 # the major hash and skip the rest
                 continue
-
-            if frame.offset is not None:
-                h.update(frame.offset.encode("utf-8", errors="ignore"))
+            h.update(offset)
 
         return h.hexdigest()
 
 
-    def from_file(self, file_name):
-        raise NotImplementedError()  # TODO
+    @classmethod
+    def from_file(cls, file_name, major_depth=MAJOR_DEPTH, parse_mode=None):
+        """
+        parse a stack trace from a file.
+        the file is scanned from the end and reading stops once the stack is found.
+        """
+
+        with open(file_name, "rb") as in_fp:
+            try:
+                in_map = mmap.mmap(in_fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                return cls(major_depth=major_depth)
+            try:
+                return cls.from_data(in_map, major_depth=major_depth, parse_mode=parse_mode)
+            finally:
+                in_map.close()
+
+
+    @classmethod
+    def from_data(cls, data, major_depth=MAJOR_DEPTH, parse_mode=None):
+        """
+        parse a stack trace from raw (utf-8 encoded) data.
+        data can be a bytes like object or mmap and is scanned from the end.
+        """
+
+        return cls._from_lines(_reverse_lines(data), major_depth, parse_mode)
 
 
     @classmethod
@@ -335,11 +406,20 @@ class Stack(object):
         input_txt is the data to parse the trace from.
         """
 
+        return cls._from_lines(reversed(input_text.split("\n")), major_depth, parse_mode)
+
+
+    @classmethod
+    def _from_lines(cls, lines, major_depth, parse_mode):
+        """
+        parse a stack trace from lines of text.
+        lines must be provided in reverse order (last line first).
+        """
+
         frames = list()
         prev_line = None
-        parse_mode = parse_mode
 
-        for line in reversed(input_text.split("\n")):
+        for line in lines:
             if not line:
                 continue  # skip empty lines
             try:
@@ -362,12 +442,15 @@ class Stack(object):
                 # check if we've found a different stack in the data
                 if prev_line is not None and prev_line <= stack_line:
                     break
-                frames.insert(0, frame)
+                frames.append(frame)
                 if stack_line < 1:
                     break
                 prev_line = stack_line
             else:
-                frames.insert(0, frame)
+                frames.append(frame)
+
+        # frames were found in reverse order
+        frames.reverse()
 
         if frames and prev_line is not None:  # sanity check
             # assuming the first frame is 0
@@ -396,11 +479,317 @@ class Stack(object):
         return self._minor
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("input", help="")
+class StackIndex(object):
+    """
+    StackIndex finds similar stacks without comparing every pair of stacks.
+    A MinHash signature is created from the top frames of each stack (shingles of
+    consecutive frame functions and locations, offsets are ignored) and split into
+    bands. Stacks that share a band are candidates and are compared using their
+    signatures which estimate the Jaccard similarity of the shingle sets.
+    """
+    DEPTH = 10  # number of frames (from the top of the stack) used
+    PRIME = (1 << 61) - 1
+    SEED = 0x5EED  # keep signatures stable between processes and runs
+
+    def __init__(self, bands=16, rows=3, shingle=2):
+        assert bands > 0 and rows > 0 and shingle > 0
+        self.bands = bands
+        self.rows = rows
+        self.shingle = shingle
+        rng = random.Random(self.SEED)
+        self._coeffs = [
+            (rng.randint(1, self.PRIME - 1), rng.randint(0, self.PRIME - 1)) for _ in range(bands * rows)]
+        self._buckets = [dict() for _ in range(bands)]  # band -> band values (tuple) -> keys (set)
+        self._signatures = dict()  # key -> signature
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, key, stack=None, signature=None):
+        """
+        add a stack (or a signature created by signature()) to the index.
+        stacks without frames are ignored. existing entries are replaced.
+        """
+
+        if signature is None:
+            signature = self.signature(stack)
+        if signature is None:
+            return
+        assert len(signature) == self.bands * self.rows
+        if key in self._signatures:
+            self.remove(key)
+        self._signatures[key] = signature
+        for band, values in self._bands(signature):
+            self._buckets[band].setdefault(values, set()).add(key)
+
+    @classmethod
+    def load(cls, in_fp):
+        """
+        create an index from data written by save().
+        """
+
+        data = json.load(in_fp)
+        index = cls(bands=data["bands"], rows=data["rows"], shingle=data["shingle"])
+        for key, signature in data["signatures"].items():
+            index.add(key, signature=signature)
+        return index
+
+    def query(self, stack=None, threshold=0.5, signature=None):
+        """
+        find entries with an estimated similarity >= threshold.
+        returns a list of (similarity, key) tuples, most similar first.
+        """
+
+        if signature is None:
+            if stack is None:
+                return list()
+            signature = self.signature(stack)
+        if signature is None:
+            return list()
+        candidates = set()
+        for band, values in self._bands(signature):
+            candidates.update(self._buckets[band].get(values, ()))
+        found = list()
+        for key in candidates:
+            similarity = self.similarity(signature, self._signatures[key])
+            if similarity >= threshold:
+                found.append((similarity, key))
+        found.sort(key=lambda x: (-x[0], x[1]))
+        return found
+
+    def remove(self, key):
+        """
+        remove an entry from the index.
+        """
+
+        signature = self._signatures.pop(key)
+        for band, values in self._bands(signature):
+            keys = self._buckets[band][values]
+            keys.discard(key)
+            if not keys:
+                del self._buckets[band][values]
+
+    def save(self, out_fp):
+        """
+        write the index to out_fp (JSON).
+        """
+
+        json.dump({
+            "bands": self.bands,
+            "rows": self.rows,
+            "shingle": self.shingle,
+            "signatures": self._signatures}, out_fp)
+
+    def signature(self, stack):
+        """
+        create the MinHash signature (list of ints) of a stack or None if the stack has no frames.
+        """
+
+        tokens = list()
+        for frame in stack.frames[:self.DEPTH]:
+            tokens.append("%s\x00%s" % (frame.function or "", frame.location or ""))
+        if not tokens:
+            return None
+        count = max(len(tokens) - self.shingle + 1, 1)
+        values = list()
+        for start in range(count):
+            shingle = "\x01".join(tokens[start:start + self.shingle]).encode("utf-8", errors="ignore")
+            values.append(unpack("<Q", hashlib.sha1(shingle).digest()[:8])[0])
+        prime = self.PRIME
+        return [min((a * x + b) % prime for x in values) for a, b in self._coeffs]
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """
+        estimate the Jaccard similarity of two signatures.
+        """
+
+        assert len(sig_a) == len(sig_b)
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / float(len(sig_a))
+
+
+def _reverse_lines(data):
+    """
+    yield lines (decoded as utf-8) from data in reverse order.
+    data can be a bytes like object or mmap.
+    """
+
+    end = len(data)
+    while end >= 0:
+        start = data.rfind(b"\n", 0, end)
+        yield data[start + 1:end].decode("utf-8", errors="ignore")
+        end = start
+
+
+def _log_signature(log_path):
+    """
+    create a signature (name, size and modification time of each file)
+    used to detect changes to the logs of a result.
+    """
+
+    signature = list()
+    for fname in sorted(os.listdir(log_path)):
+        f_stat = os.stat(os.path.join(log_path, fname))
+        signature.append([fname, f_stat.st_size, f_stat.st_mtime])
+    return signature
+
+
+def _hash_result(log_path):
+    """
+    find the stack in the logs of a result and return the hashes and StackIndex signature.
+    logs are scanned in the same order as Report (aux->stderr->stdout).
+    """
+
+    try:
+        log_map = select_logs(log_path)
+    except (IOError, OSError):
+        log.debug("no logs found in %r", log_path)
+        return log_path, NO_STACK_MAJOR, NO_STACK_MINOR, None
+    for log_type in ("aux", "stderr", "stdout"):
+        if log_map[log_type] is None:
+            continue
+        stack = Stack.from_file(os.path.join(log_path, log_map[log_type]))
+        if stack.frames:
+            return log_path, stack.major, stack.minor, StackIndex().signature(stack)
+    return log_path, NO_STACK_MAJOR, NO_STACK_MINOR, None
+
+
+def _find_results(root):
+    """
+    find result log directories (created by FilesystemReporter) under root.
+    """
+
+    for dir_path, dir_names, _ in os.walk(root):
+        for dir_name in list(dir_names):
+            if dir_name.endswith("_logs"):
+                dir_names.remove(dir_name)  # don't descend into log directories
+                yield os.path.join(dir_path, dir_name)
+
+
+def bulk_hash(root, cache_file=None, jobs=None, similarity=None):
+    """
+    hash the logs of all results found under root and group them into buckets.
+    results with unchanged logs found in cache_file are not parsed again.
+    jobs is the number of worker processes (defaults to the number of CPUs).
+    if similarity is set, buckets with an estimated stack similarity >= similarity
+    are listed in "similar" (minor hashes) of each bucket.
+    returns a list of buckets (dicts: count, example, major, minor) ordered by count.
+    """
+
+    cached = dict()
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, "r") as in_fp:
+                cached = json.load(in_fp)
+        except ValueError:
+            log.warning("Ignoring invalid cache file %r", cache_file)
+
+    hashes = dict()  # result log path -> [signature, major, minor, stack signature]
+    pending = list()
+    for log_path in _find_results(root):
+        rel_path = os.path.relpath(log_path, root)
+        try:
+            signature = _log_signature(log_path)
+        except OSError:
+            log.debug("failed to scan %r", log_path)
+            continue
+        entry = cached.get(rel_path)
+        if entry is not None and len(entry) == 4 and entry[0] == signature:
+            hashes[rel_path] = entry
+        else:
+            hashes[rel_path] = [signature, None, None, None]
+            pending.append(log_path)
+    log.debug("found %d results, %d cached", len(hashes), len(hashes) - len(pending))
+
+    if len(pending) > 1 and jobs != 1:
+        pool = Pool(jobs)
+        try:
+            results = list(pool.imap_unordered(_hash_result, pending, chunksize=16))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_hash_result(x) for x in pending]
+    for log_path, major, minor, stack_sig in results:
+        hashes[os.path.relpath(log_path, root)][1:] = [major, minor, stack_sig]
+
+    if cache_file is not None:
+        with open(cache_file, "w") as out_fp:
+            json.dump(hashes, out_fp)
+
+    buckets = dict()
+    index = StackIndex() if similarity is not None else None
+    for rel_path in sorted(hashes):
+        _, major, minor, stack_sig = hashes[rel_path]
+        bucket = buckets.get((major, minor))
+        if bucket is None:
+            buckets[(major, minor)] = {
+                "count": 1,
+                "example": os.path.join(root, rel_path),
+                "major": major,
+                "minor": minor}
+            if index is not None:
+                buckets[(major, minor)]["signature"] = stack_sig
+                if stack_sig is not None:
+                    index.add(minor, signature=stack_sig)
+        else:
+            bucket["count"] += 1
+    if index is not None:
+        for bucket in buckets.values():
+            found = index.query(signature=bucket.pop("signature"), threshold=similarity)
+            bucket["similar"] = [key for _, key in found if key != bucket["minor"]]
+    return sorted(buckets.values(), key=lambda x: (-x["count"], x["major"], x["minor"]))
+
+
+def write_buckets(buckets, out_fp, out_format="json"):
+    """
+    write buckets created by bulk_hash() to out_fp as "csv" or "json".
+    """
+
+    fields = ["major", "minor", "count", "example"]
+    if buckets and "similar" in buckets[0]:
+        fields.append("similar")
+    if out_format == "csv":
+        writer = csv.writer(out_fp)
+        writer.writerow(fields)
+        for bucket in buckets:
+            row = [bucket[x] for x in fields]
+            if "similar" in bucket:
+                row[-1] = " ".join(bucket["similar"])
+            writer.writerow(row)
+    else:
+        json.dump(buckets, out_fp, indent=2, sort_keys=True)
+        out_fp.write("\n")
 
-    args = parser.parse_args()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "input",
+        help="Log file or directory containing results created by FilesystemReporter")
+    parser.add_argument(
+        "--cache",
+        help="File used to store hashes of results, unchanged results are skipped when reused" \
+             " (directory mode only)")
+    parser.add_argument(
+        "--format", choices=("csv", "json"), default="json",
+        help="Output format (directory mode only) (default: %(default)s)")
+    parser.add_argument(
+        "--similar", type=float, metavar="THRESHOLD",
+        help="List buckets with an estimated stack similarity >= THRESHOLD (0.0-1.0)" \
+             " (directory mode only)")
+    parser.add_argument(
+        "-j", "--jobs", type=int,
+        help="Number of worker processes (directory mode only) (default: number of CPUs)")
+
+    args = parser.parse_args(argv)
 
     # set output verbosity
     if os.getenv("DEBUG"):
@@ -411,11 +800,20 @@ if __name__ == "__main__":
         log_fmt = "%(message)s"
     logging.basicConfig(format=log_fmt, datefmt="%Y-%m-%d %H:%M:%S", level=log_level)
 
-    with open(args.input, "rb") as fp:
-        stack = Stack.from_text(fp.read().decode("utf-8", errors="ignore"))
+    if os.path.isdir(args.input):
+        buckets = bulk_hash(args.input, cache_file=args.cache, jobs=args.jobs, similarity=args.similar)
+        write_buckets(buckets, sys.stdout, args.format)
+        return 0
+
+    stack = Stack.from_file(args.input)
 
     for frame in stack.frames:
         log.info(frame)
     log.info("Minor: %s", stack.minor)
     log.info("Major: %s", stack.major)
     log.info("Frames: %d", len(stack.frames))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
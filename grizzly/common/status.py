@@ -30,6 +30,7 @@ class Status(object):
         assert isinstance(data_file, str) and os.path.isfile(data_file)
         assert isinstance(start_time, float)
         self._lock = fasteners.process_lock.InterProcessLock("%s.lock" % (data_file,))
+        self.coverage_time = 0.0
         self.data_file = data_file
         self.ignored = 0
         self.iteration = 0
@@ -37,6 +38,7 @@ class Status(object):
         self.results = 0
         self.start_time = start_time
         self.test_name = None
+        self.tests_evicted = 0
         self.timestamp = start_time
 
     def cleanup(self):
@@ -135,12 +137,14 @@ class Status(object):
     @property
     def _data(self):
         return {
+            "coverage_time": self.coverage_time,
             "ignored": self.ignored,
             "iteration": self.iteration,
             "log_size": self.log_size,
             "results": self.results,
             "start_time": self.start_time,
             "test_name": self.test_name,
+            "tests_evicted": self.tests_evicted,
             "timestamp": self.timestamp}
 
     def report(self, force=False, report_freq=REPORT_FREQ):
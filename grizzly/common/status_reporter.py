@@ -122,6 +122,10 @@ class StatusReporter(object):
             if not self._reducer:
                 txt.append(" - Ignored: %02d" % report.ignored)
                 txt.append(" - Results: %d" % report.results)
+                if report.coverage_time:
+                    txt.append(" - Coverage: %0.1fs" % report.coverage_time)
+                if report.tests_evicted:
+                    txt.append(" - Evicted: %d" % report.tests_evicted)
             txt.append("\n")
         return "".join(txt)
 
@@ -3,17 +3,26 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from hashlib import sha1
+from io import BytesIO
 import json
+import mmap
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
+from struct import Struct
 import tempfile
 
-__all__ = ("InputFile", "TestCase", "TestFile", "TestFileExists")
+__all__ = ("BlobStore", "InputFile", "PackError", "TestCase", "TestFile", "TestFileExists")
 __author__ = "Tyson Smith"
 __credits__ = ["Tyson Smith"]
 
 
+class PackError(Exception):
+    """Raised when a packed test case is invalid"""
+
+
 class TestFileExists(RuntimeError):
     """Raised when adding a TestFile to a TestCase that has an existing TestFile with the same name"""
 
@@ -21,10 +30,13 @@ class TestFileExists(RuntimeError):
 class InputFile(object):
     CACHE_LIMIT = 0x100000  # 1MB
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, use_mmap=False):
         self.extension = None
         self.file_name = file_name
+        self.mtime = None  # modification time of the file when the data was cached
+        self.use_mmap = use_mmap  # map file into memory instead of copying it
         self._fp = None
+        self._size = 0  # size of cached data
         if not os.path.isfile(file_name):
             raise IOError("File %r does not exist" % (self.file_name,))
         # TODO: add kwarg to set self.extension?
@@ -32,7 +44,8 @@ class InputFile(object):
             self.extension = os.path.splitext(self.file_name)[-1].lstrip(".")
 
     def _cache_data(self):
-        """Cache file data.
+        """Cache file data. When using mmap the file is mapped read-only and no
+        copy is made. Note: modifying the file while it is mapped is not supported.
 
         Args:
             None
@@ -40,9 +53,33 @@ class InputFile(object):
         Returns:
             None
         """
-        self._fp = tempfile.SpooledTemporaryFile(max_size=self.CACHE_LIMIT)
         with open(self.file_name, "rb") as src_fp:
-            shutil.copyfileobj(src_fp, self._fp, 0x10000)  # 64KB
+            self.mtime = os.fstat(src_fp.fileno()).st_mtime
+            if self.use_mmap:
+                try:
+                    self._fp = mmap.mmap(src_fp.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # empty files cannot be mapped
+                    self._fp = BytesIO()
+            else:
+                self._fp = tempfile.SpooledTemporaryFile(max_size=self.CACHE_LIMIT)
+                shutil.copyfileobj(src_fp, self._fp, 0x10000)  # 64KB
+                self._size = self._fp.tell()
+
+    @property
+    def cached_size(self):
+        """Size of the file data held in memory. Data that is mapped (mmap) or
+        has been spooled to disk (larger than CACHE_LIMIT) is not included.
+
+        Args:
+            None
+
+        Returns:
+            int: Size in bytes.
+        """
+        if self._fp is None or self.use_mmap or self._size > self.CACHE_LIMIT:
+            return 0
+        return self._size
 
     def close(self):
         """Close file handles.
@@ -54,9 +91,34 @@ class InputFile(object):
             None
         """
         if self._fp is not None:
-            self._fp.close()
+            try:
+                self._fp.close()
+            except BufferError:
+                # buffers from get_buffer() are still in use, the mapping
+                # is released once the remaining buffers are released
+                pass
         self._fp = None
 
+    def get_buffer(self):
+        """Get a read-only buffer containing the file data. When using mmap
+        no copy of the data is made. Buffers should be released before calling close().
+
+        Args:
+            None
+
+        Returns:
+            memoryview: Data from input file
+        """
+        if self._fp is None:
+            self._cache_data()
+        if isinstance(self._fp, mmap.mmap):
+            try:
+                return memoryview(self._fp)
+            except TypeError:  # pragma: no cover
+                # python 2 mmap does not support memoryview
+                pass
+        return memoryview(self.get_data())
+
     def get_data(self):
         """Read file data.
 
@@ -73,7 +135,8 @@ class InputFile(object):
         return self._fp.read()
 
     def get_fp(self):
-        """Get input file File object.
+        """Get input file File object. When using mmap a read-only mmap object
+        is returned.
 
         Args:
             None
@@ -90,19 +153,37 @@ class InputFile(object):
 TestFileMap = namedtuple("TestFileMap", "meta optional required")
 
 class TestCase(object):
+    """TestCase is a collection of TestFiles and the details needed to replay them.
+
+    A TestCase can be written to the filesystem as a directory (dump()) or as a single
+    packed file (pack()). The packed format is:
+    - PACK_MAGIC
+    - test file data (concatenated)
+    - index (UTF-8 JSON): {"files": [[name, group, offset, size], ...], "info": {...}}
+    - footer: index offset (uint64 LE), index size (uint64 LE), PACK_MAGIC
+    """
+    DUMP_THREADS = 4  # maximum number of threads used by dump()
+    DUMP_THREADED_MIN = 32  # minimum number of test files required to dump using threads
+    PACK_FOOTER = Struct("<QQ")
+    PACK_MAGIC = b"GRZPACK1"
+
     def __init__(self, landing_page, redirect_page, adapter_name, input_fname=None):
         self.adapter_name = adapter_name
         self.duration = None
         self.input_fname = input_fname  # file that was used to create the test case
         self.landing_page = landing_page
         self.redirect_page = redirect_page
+        self._data_size = 0  # total size of test files
         self._env_vars = dict()  # environment variables
-        self._existing_paths = list()  # file paths in use
+        self._existing_paths = dict()  # file paths in use -> (TestFile, group (list) containing the TestFile)
         self._files = TestFileMap(
             meta=list(),  # environment files such as prefs.js, etc...
             optional=list(),
             required=list())
 
+    def __contains__(self, file_name):
+        return file_name in self._existing_paths
+
     def _add(self, target, test_file):
         """Add a test file to test case and perform sanity checks.
 
@@ -113,11 +194,15 @@ class TestCase(object):
         Returns:
             None
         """
+        # pylint: disable=protected-access
         assert isinstance(test_file, TestFile), "only accepts TestFiles"
+        assert test_file._owner is None, "TestFile belongs to another TestCase"
         if test_file.file_name in self._existing_paths:
             raise TestFileExists("%r exists in test" % (test_file.file_name,))
-        self._existing_paths.append(test_file.file_name)
+        self._existing_paths[test_file.file_name] = (test_file, target)
         target.append(test_file)
+        test_file._owner = self
+        self._data_size += test_file.size
 
     def add_meta(self, meta_file):
         """Add a test file to test case as a meta file.
@@ -217,24 +302,84 @@ class TestCase(object):
         Returns:
             int: Total size of the test case in byte.
         """
-        total = 0
-        for group in self._files:
-            total += sum(x.size for x in group)
-        return total
+        return self._data_size
+
+    def deduplicate(self, store):
+        """Add all test files to a BlobStore. Test files with data that is
+        already in the store will share the existing data.
+
+        Args:
+            store (BlobStore): Store to add test files to.
+
+        Returns:
+            None
+        """
+        for file_group in self._files:
+            for test_file in file_group:
+                store.add(test_file)
 
-    def dump(self, out_path, include_details=False):
+    def dump(self, out_path, include_details=False, link=False):
         """Write all the test case data to the filesystem.
 
         Args:
             out_path (str): Path to directory to output data
             include_details (bool): Output "test_info.json" file
+            link (bool): Hard link files with identical data instead of writing
+                         the data again. Links are only created between files
+                         written by this call.
+
+        Returns:
+            None
+        """
+        self.dump_all(((self, out_path),), include_details=include_details, link=link)
+
+    @classmethod
+    def dump_all(cls, dumps, include_details=False, link=False):
+        """Write multiple test cases to the filesystem. When linking, files with
+        identical data are written once and hard linked in all of the test cases.
+
+        Args:
+            dumps (iterable): TestCases and the path to output each to
+                              (TestCase, str).
+            include_details (bool): Output "test_info.json" files.
+            link (bool): Hard link files with identical data instead of writing
+                         the data again. Links are only created between files
+                         written by this call.
+
+        Returns:
+            None
+        """
+        dumps = tuple(dumps)
+        test_files = list()
+        for test_case, _ in dumps:
+            for file_group in test_case._files:  # pylint: disable=protected-access
+                test_files.extend(file_group)
+        # never link to files written by a previous call
+        for test_file in test_files:
+            test_file._blob.dumped = None  # pylint: disable=protected-access
+        try:
+            for test_case, out_path in dumps:
+                test_case._dump(out_path, include_details, link)  # pylint: disable=protected-access
+        finally:
+            for test_file in test_files:
+                test_file._blob.dumped = None  # pylint: disable=protected-access
+
+    def _dump(self, out_path, include_details, link):
+        """Write all the test case data to the filesystem (see dump()).
+
+        Args:
+            out_path (str): Path to directory to output data.
+            include_details (bool): Output "test_info.json" file.
+            link (bool): See TestFile.dump().
 
         Returns:
             None
         """
         # save test files to out_path
-        for test_file in self._files.required + self._files.optional:
-            test_file.dump(out_path)
+        test_files = self._files.required + self._files.optional
+        if include_details:
+            test_files += self._files.meta
+        self._dump_files(test_files, out_path, link)
         # save test case files and meta data including:
         # adapter used, input file, environment info and files
         if include_details:
@@ -247,9 +392,53 @@ class TestCase(object):
                 "target": self.landing_page}
             with open(os.path.join(out_path, "test_info.json"), "w") as out_fp:
                 json.dump(info, out_fp, indent=2, sort_keys=True)
-            # save meta files
-            for meta_file in self._files.meta:
-                meta_file.dump(out_path)
+
+    @classmethod
+    def _dump_files(cls, test_files, out_path, link):
+        """Write test files to the filesystem. Directories are created once up
+        front and files are written using a thread pool when there are many.
+        Test files that share data are written by the same thread, the first copy is
+        written from memory and the remaining copies are copied or linked from it.
+
+        Args:
+            test_files (list): TestFiles to write.
+            out_path (str): Path to directory to output data.
+            link (bool): See TestFile.dump().
+
+        Returns:
+            None
+        """
+        # create directories
+        for directory in sorted(set(os.path.dirname(x.file_name) for x in test_files)):
+            directory = os.path.join(out_path, directory)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        # group test files by data
+        groups = OrderedDict()
+        for test_file in test_files:
+            groups.setdefault(id(test_file._blob), []).append(test_file)  # pylint: disable=protected-access
+
+        def _dump_group(group):
+            # pylint: disable=protected-access
+            first = os.path.join(out_path, group[0].file_name)
+            group[0]._write(first, link)
+            for test_file in group[1:]:
+                if link:
+                    test_file._write(os.path.join(out_path, test_file.file_name), link)
+                else:
+                    # uses a zero-copy method where available (python 3.8+)
+                    shutil.copyfile(first, os.path.join(out_path, test_file.file_name))
+
+        if len(test_files) < cls.DUMP_THREADED_MIN or len(groups) < 2:
+            for group in groups.values():
+                _dump_group(group)
+        else:
+            pool = ThreadPool(min(cls.DUMP_THREADS, len(groups)))
+            try:
+                pool.map(_dump_group, groups.values())
+            finally:
+                pool.close()
+                pool.join()
 
     @property
     def env_vars(self):
@@ -265,6 +454,47 @@ class TestCase(object):
             if value is not None:
                 yield "=".join((name, value))
 
+    @classmethod
+    def from_pack(cls, src):
+        """Create a TestCase from a packed test case (see pack()).
+
+        Args:
+            src (str): Path to packed test case.
+
+        Returns:
+            TestCase: A TestCase populated with the content of the packed test case.
+        """
+        with open(src, "rb") as in_fp:
+            entries, info = cls.read_pack_index(in_fp)
+            test = cls(info["target"], info.get("redirect"), info["adapter"], input_fname=info.get("input"))
+            test.duration = info.get("duration")
+            for name, value in info.get("env", dict()).items():
+                test.add_environ_var(name, value)
+            t_file = None
+            try:
+                for name, group, offset, size in entries:
+                    in_fp.seek(offset)
+                    t_file = TestFile(name)
+                    remaining = size
+                    while remaining > 0:
+                        chunk = in_fp.read(min(remaining, TestFile.XFER_BUF))
+                        if not chunk:
+                            raise PackError("Unexpected end of data for %r" % (name,))
+                        t_file.write(chunk)
+                        remaining -= len(chunk)
+                    if group == "meta":
+                        test.add_meta(t_file)
+                    else:
+                        test.add_file(t_file, required=group == "required")
+                    t_file = None
+            except (PackError, TestFileExists):
+                # the current entry is not owned by test yet
+                if t_file is not None:
+                    t_file.close()
+                test.cleanup()
+                raise
+        return test
+
     @property
     def optional(self):
         """Get file names of optional TestFiles
@@ -278,6 +508,103 @@ class TestCase(object):
         for test in self._files.optional:
             yield test.file_name
 
+    def is_optional(self, file_name):
+        """Check if a TestFile is optional.
+
+        Args:
+            file_name (str): Name of TestFile.
+
+        Returns:
+            bool: True if the file exists and is optional otherwise False.
+        """
+        entry = self._existing_paths.get(file_name)
+        return entry is not None and entry[1] is self._files.optional
+
+    def get_file(self, file_name):
+        """Look up a TestFile by name.
+
+        Args:
+            file_name (str): Name of TestFile.
+
+        Returns:
+            TestFile: TestFile with matching name or None.
+        """
+        entry = self._existing_paths.get(file_name)
+        return entry[0] if entry is not None else None
+
+    def pack(self, out_fp, include_details=False):
+        """Write the test case to a single file object. The data is streamed and
+        the file object does not need to support seeking.
+
+        Args:
+            out_fp (file): Writable binary file object.
+            include_details (bool): Include meta files.
+
+        Returns:
+            dict: Offset and size (tuple) of each test file in out_fp, keyed by file name.
+        """
+        groups = [("required", self._files.required), ("optional", self._files.optional)]
+        if include_details:
+            groups.append(("meta", self._files.meta))
+        out_fp.write(self.PACK_MAGIC)
+        offset = len(self.PACK_MAGIC)
+        entries = list()
+        for group, test_files in groups:
+            for test_file in test_files:
+                # pylint: disable=protected-access
+                test_file._fp.seek(0)
+                shutil.copyfileobj(test_file._fp, out_fp, TestFile.XFER_BUF)
+                entries.append([test_file.file_name, group, offset, test_file.size])
+                offset += test_file.size
+        index = json.dumps({
+            "files": entries,
+            "info": {
+                "adapter": self.adapter_name,
+                "duration": self.duration,
+                "env": self._env_vars,
+                "input": self.input_fname,
+                "redirect": self.redirect_page,
+                "target": self.landing_page}}, sort_keys=True).encode("utf-8")
+        out_fp.write(index)
+        out_fp.write(self.PACK_FOOTER.pack(offset, len(index)))
+        out_fp.write(self.PACK_MAGIC)
+        return {name: (start, size) for name, _, start, size in entries}
+
+    @classmethod
+    def read_pack_index(cls, in_fp):
+        """Read the index of a packed test case.
+
+        Args:
+            in_fp (file): Seekable binary file object containing a packed test case.
+
+        Returns:
+            tuple: File entries ([name, group, offset, size]) and test case details (dict).
+        """
+        footer_size = cls.PACK_FOOTER.size + len(cls.PACK_MAGIC)
+        in_fp.seek(0, os.SEEK_END)
+        end = in_fp.tell()
+        if end < footer_size + len(cls.PACK_MAGIC):
+            raise PackError("Packed test case is too small")
+        in_fp.seek(0)
+        if in_fp.read(len(cls.PACK_MAGIC)) != cls.PACK_MAGIC:
+            raise PackError("Invalid packed test case header")
+        in_fp.seek(end - footer_size)
+        footer = in_fp.read(footer_size)
+        if footer[cls.PACK_FOOTER.size:] != cls.PACK_MAGIC:
+            raise PackError("Invalid packed test case footer")
+        offset, size = cls.PACK_FOOTER.unpack(footer[:cls.PACK_FOOTER.size])
+        if offset + size + footer_size != end:
+            raise PackError("Invalid packed test case index location")
+        in_fp.seek(offset)
+        try:
+            index = json.loads(in_fp.read(size).decode("utf-8"))
+        except ValueError:
+            raise PackError("Invalid packed test case index")
+        for _, _, start, length in index["files"]:
+            if start + length > offset:
+                raise PackError("Invalid packed test case file entry")
+        return index["files"], index["info"]
+
     def purge_optional(self, keep):
         """Remove optional files (by name) that are not in keep.
 
@@ -288,22 +615,164 @@ class TestCase(object):
             None
         """
         keep = set(keep)
-        to_remove = []
-        for idx, tfile in enumerate(self._files.optional):
-            if tfile.file_name not in keep:
-                to_remove.append(idx)
-        for idx in reversed(to_remove):
-            self._files.optional.pop(idx).close()
+        remaining = list()
+        for tfile in self._files.optional:
+            if tfile.file_name in keep:
+                remaining.append(tfile)
+                continue
+            del self._existing_paths[tfile.file_name]
+            self._data_size -= tfile.size
+            tfile._owner = None  # pylint: disable=protected-access
+            tfile.close()
+        self._files.optional[:] = remaining
+
+
+class _Blob(object):
+    """Reference counted data buffer used by TestFiles. The size is updated as
+    data is written, the hash of the content is only calculated when requested.
+    """
+    __slots__ = ("_digest", "dumped", "fp", "key", "refs", "size", "store")
+
+    def __init__(self):
+        self._digest = None
+        self.dumped = None  # last location the data was dumped to (used for linking)
+        self.fp = tempfile.SpooledTemporaryFile(max_size=TestFile.CACHE_LIMIT, prefix="grz_tf_")
+        self.key = None  # key used by BlobStore
+        self.refs = 1  # number of TestFiles using this blob
+        self.size = 0
+        self.store = None  # BlobStore containing this blob
+
+    def copy(self):
+        """Create a new blob containing a copy of the data.
+
+        Args:
+            None
+
+        Returns:
+            _Blob: A copy of the blob.
+        """
+        blob = _Blob()
+        self.fp.seek(0)
+        shutil.copyfileobj(self.fp, blob.fp, TestFile.XFER_BUF)
+        blob._digest = self._digest  # pylint: disable=protected-access
+        blob.size = self.size
+        return blob
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            hasher = sha1()
+            self.fp.seek(0)
+            for chunk in iter(lambda: self.fp.read(TestFile.XFER_BUF), b""):
+                hasher.update(chunk)
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+    def release(self):
+        """Remove a reference. The data buffer is closed once it is unused.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.refs -= 1
+        if self.refs < 1:
+            self.fp.close()
+            if self.store is not None:
+                self.store.discard(self)
+
+    def write(self, data):
+        # readers share fp and can leave the position anywhere, always append
+        self.fp.seek(0, os.SEEK_END)
+        self.fp.write(data)
+        self._digest = None
+        self.size += len(data)
+
+
+class BlobStore(object):
+    """BlobStore is a content addressed collection of TestFile data. When a TestFile
+    is added and matching data is already in the store, the existing data is shared
+    with the TestFile and its own copy is released. Data in the store is immutable,
+    TestFiles that are modified after being added receive a private copy.
+    """
+    def __init__(self):
+        self._blobs = dict()  # (digest, size) -> _Blob
+
+    def __contains__(self, test_file):
+        return test_file._blob.store is self  # pylint: disable=protected-access
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def add(self, test_file):
+        """Add TestFile data to the store.
+
+        Args:
+            test_file (TestFile): TestFile to add.
+
+        Returns:
+            None
+        """
+        assert not test_file.closed, "add() called with closed TestFile"
+        blob = test_file._blob  # pylint: disable=protected-access
+        if blob.store is self:
+            return
+        assert blob.store is None, "TestFile belongs to another BlobStore"
+        # the data is hashed once here, interned data is immutable
+        key = (blob.digest, blob.size)
+        existing = self._blobs.get(key)
+        if existing is None:
+            blob.key = key
+            blob.store = self
+            self._blobs[key] = blob
+        else:
+            existing.refs += 1
+            blob.release()
+            test_file._blob = existing  # pylint: disable=protected-access
+
+    def discard(self, blob):
+        """Remove unused data from the store.
+
+        Args:
+            blob (_Blob): Data to remove.
+
+        Returns:
+            None
+        """
+        if self._blobs.get(blob.key) is blob:
+            del self._blobs[blob.key]
+
+    @property
+    def size(self):
+        """Total size of the data in the store.
+
+        Args:
+            None
+
+        Returns:
+            int: Size in bytes.
+        """
+        return sum(x.size for x in self._blobs.values())
 
 
 class TestFile(object):
+    """TestFile holds the data of a single file in a TestCase. Clones share the
+    data buffer with the original (copy-on-write). The buffer is copied the first time
+    a TestFile that shares it is written to and is closed when the last TestFile
+    referencing it is closed. BlobStore can be used to share data between TestFiles
+    that were created separately.
+    """
     CACHE_LIMIT = 0x40000  # data cache limit per file: 256KB
     XFER_BUF = 0x10000  # transfer buffer size: 64KB
 
-    __slots__ = ("_fp", "file_name")
+    __slots__ = ("_blob", "_closed", "_owner", "file_name")
 
     def __init__(self, file_name):
-        self._fp = tempfile.SpooledTemporaryFile(max_size=self.CACHE_LIMIT, prefix="grz_tf_")
+        self._blob = _Blob()
+        self._closed = False
+        self._owner = None  # TestCase containing this TestFile
         # XXX: This is a naive fix for a larger path issue
         if "\\" in file_name:
             file_name = file_name.replace("\\", "/")
@@ -311,8 +780,13 @@ class TestFile(object):
             file_name = file_name.lstrip("/")
         self.file_name = os.path.normpath(file_name)  # name including path relative to wwwroot
 
+    @property
+    def _fp(self):
+        return self._blob.fp
+
     def clone(self):
-        """Make a copy of the TestFile.
+        """Make a copy of the TestFile. The data is not copied until either
+        TestFile is modified.
 
         Args:
             None
@@ -320,13 +794,18 @@ class TestFile(object):
         Returns:
             TestFile: A copy of the TestFile instance
         """
-        cloned = TestFile(self.file_name)
-        self._fp.seek(0)
-        shutil.copyfileobj(self._fp, cloned._fp, self.XFER_BUF)  # pylint: disable=protected-access
+        assert not self._closed, "clone() called on closed TestFile"
+        cloned = TestFile.__new__(TestFile)
+        cloned._blob = self._blob  # pylint: disable=protected-access
+        cloned._closed = False  # pylint: disable=protected-access
+        cloned._owner = None  # pylint: disable=protected-access
+        cloned.file_name = self.file_name
+        self._blob.refs += 1
         return cloned
 
     def close(self):
-        """Close the TestFile.
+        """Close the TestFile. The data buffer is closed once it is no longer
+        in use by any clones.
 
         Args:
             None
@@ -334,7 +813,21 @@ class TestFile(object):
         Returns:
             None TestFile instance
         """
-        self._fp.close()
+        if not self._closed:
+            self._closed = True
+            self._blob.release()
+
+    @property
+    def closed(self):
+        """Check if the TestFile is closed.
+
+        Args:
+            None
+
+        Returns:
+            bool: True if closed otherwise False.
+        """
+        return self._closed
 
     @property
     def data(self):
@@ -346,18 +839,30 @@ class TestFile(object):
         Returns:
             bytes: Data from the TestFile
         """
-        pos = self._fp.tell()
-        self._fp.flush()
+        # data is always appended (see _Blob.write()) so the position does not need to be restored
         self._fp.seek(0)
-        data = self._fp.read()
-        self._fp.seek(pos)
-        return data
+        return self._fp.read()
 
-    def dump(self, path):
+    @property
+    def digest(self):
+        """SHA1 hash of the data.
+
+        Args:
+            None
+
+        Returns:
+            str: Hex digest.
+        """
+        return self._blob.digest
+
+    def dump(self, path, link=False):
         """Write test file data to the filesystem.
 
         Args:
             path (str): Path to output data
+            link (bool): Create a hard link to the previous linked dump of identical
+                         data (if available) instead of writing the data again.
+                         Files created this way should not be modified.
 
         Returns:
             None
@@ -365,9 +870,35 @@ class TestFile(object):
         target_path = os.path.join(path, os.path.dirname(self.file_name))
         if not os.path.isdir(target_path):
             os.makedirs(target_path)
+        self._write(os.path.join(path, self.file_name), link)
+
+    def _write(self, dst, link):
+        """Write test file data to dst. The parent directory must exist.
+
+        Args:
+            dst (str): Path of file to create.
+            link (bool): See dump().
+
+        Returns:
+            None
+        """
+        if link:
+            if os.path.isfile(dst):
+                # avoid modifying data shared via an existing link
+                os.unlink(dst)
+            if self._blob.dumped is not None:
+                try:
+                    if os.stat(self._blob.dumped).st_size == self._blob.size:
+                        os.link(self._blob.dumped, dst)
+                        return
+                except (AttributeError, OSError):
+                    # links not supported or previous dump is not available
+                    pass
         self._fp.seek(0)
-        with open(os.path.join(path, self.file_name), "wb") as dst_fp:
+        with open(dst, "wb") as dst_fp:
             shutil.copyfileobj(self._fp, dst_fp, self.XFER_BUF)
+        if link:
+            self._blob.dumped = dst
 
     @classmethod
     def from_data(cls, data, file_name, encoding="UTF-8"):
@@ -402,7 +933,11 @@ class TestFile(object):
         """
         t_file = cls(file_name=file_name)
         with open(input_file, "rb") as src_fp:
-            shutil.copyfileobj(src_fp, t_file._fp, cls.XFER_BUF)  # pylint: disable=protected-access
+            while True:
+                chunk = src_fp.read(cls.XFER_BUF)
+                if not chunk:
+                    break
+                t_file._blob.write(chunk)  # pylint: disable=protected-access
         return t_file
 
     @property
@@ -415,16 +950,11 @@ class TestFile(object):
         Returns:
             int: Size in bytes.
         """
-        pos = self._fp.tell()
-        self._fp.flush()
-        self._fp.seek(0, os.SEEK_END)
-        size = self._fp.tell()
-        self._fp.seek(pos)
-        return size
-
+        return self._blob.size
 
     def write(self, data):
-        """Add data to the TestFile.
+        """Add data to the TestFile. If the data buffer is shared a private
+        copy is made first.
 
         Args:
             data (bytes): Data to add to the TestFile
@@ -432,4 +962,12 @@ class TestFile(object):
         Returns:
             None
         """
-        self._fp.write(data)
+        if self._closed:
+            raise ValueError("I/O operation on closed TestFile")
+        if self._blob.refs > 1 or self._blob.store is not None:
+            blob = self._blob.copy()
+            self._blob.release()
+            self._blob = blob
+        self._blob.write(data)
+        if self._owner is not None:
+            self._owner._data_size += len(data)  # pylint: disable=protected-access
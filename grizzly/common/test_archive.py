@@ -0,0 +1,92 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""test archive creation"""
+import bz2
+import io
+import os
+import tarfile
+import zipfile
+
+from .archive import ArchiveStats, ParallelBZ2Writer, tar_bz2, zip_path
+
+
+def test_archive_stats_01():
+    """test ArchiveStats"""
+    stats = ArchiveStats("/a/b.zip", 100, 40, 1.5)
+    assert stats.saved == 60
+    assert str(stats) == "b.zip: 100 -> 40 bytes (saved 60) in 1.50s"
+
+def test_parallel_bz2_writer_01():
+    """test ParallelBZ2Writer"""
+    data = b"".join(os.urandom(16) * (idx % 7 + 1) for idx in range(2000))
+    for workers in (1, 3):
+        out_fp = io.BytesIO()
+        writer = ParallelBZ2Writer(out_fp, level=1, workers=workers, chunk_size=1024)
+        for idx in range(0, len(data), 100):
+            writer.write(data[idx:idx + 100])
+        writer.close()
+        assert writer.written == len(data)
+        compressed = out_fp.getvalue()
+        # one stream per chunk
+        assert compressed.count(b"BZh1") >= len(data) // 2048
+        assert bz2.decompress(compressed) == data
+    # nothing written
+    out_fp = io.BytesIO()
+    writer = ParallelBZ2Writer(out_fp, workers=2)
+    writer.close()
+    assert not out_fp.getvalue()
+
+def test_parallel_bz2_writer_02(mocker):
+    """test ParallelBZ2Writer single stream and default workers"""
+    writer = ParallelBZ2Writer(io.BytesIO())
+    assert writer._workers == ParallelBZ2Writer.WORKERS  # pylint: disable=protected-access
+    writer.close()
+    # multi-stream not supported
+    mocker.patch.object(ParallelBZ2Writer, "MULTI_STREAM", False)
+    data = os.urandom(4096)
+    out_fp = io.BytesIO()
+    writer = ParallelBZ2Writer(out_fp, level=1, workers=3, chunk_size=1024)
+    for idx in range(0, len(data), 100):
+        writer.write(data[idx:idx + 100])
+    writer.close()
+    compressed = out_fp.getvalue()
+    assert compressed.count(b"BZh1") == 1
+    # a single decompressor (as used by Python 2) reads all of the data
+    decompressor = bz2.BZ2Decompressor()
+    assert decompressor.decompress(compressed) == data
+    assert not decompressor.unused_data
+
+def test_tar_bz2_01(tmp_path):
+    """test tar_bz2()"""
+    src = tmp_path / "trace"
+    (src / "sub").mkdir(parents=True)
+    (src / "data").write_bytes(b"A" * 0x10000)
+    (src / "sub" / "events").write_bytes(b"events")
+    dst = tmp_path / "trace.tar.bz2"
+    stats = tar_bz2(str(src), str(dst), workers=2)
+    assert stats.archive == str(dst)
+    assert stats.compressed == dst.stat().st_size
+    assert stats.original > 0x10000
+    assert stats.saved > 0
+    with tarfile.open(str(dst), "r:bz2") as tar_fp:
+        assert set(tar_fp.getnames()) == {"trace", "trace/data", "trace/sub", "trace/sub/events"}
+        assert tar_fp.extractfile("trace/sub/events").read() == b"events"
+
+def test_zip_path_01(tmp_path):
+    """test zip_path()"""
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "log.txt").write_bytes(b"A" * 1000)
+    (src / "sub" / "image.PNG").write_bytes(b"B" * 1000)
+    dst = tmp_path / "out.zip"
+    stats = zip_path(str(src), str(dst), level=9)
+    assert stats.original == 2000
+    assert stats.compressed == dst.stat().st_size
+    with zipfile.ZipFile(str(dst)) as zip_fp:
+        info = {x.filename: x for x in zip_fp.infolist()}
+        assert set(info) == {"log.txt", "sub/image.PNG"}
+        assert info["log.txt"].compress_type == zipfile.ZIP_DEFLATED
+        assert info["sub/image.PNG"].compress_type == zipfile.ZIP_STORED
+        assert zip_fp.read("sub/image.PNG") == b"B" * 1000
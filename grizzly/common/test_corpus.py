@@ -0,0 +1,132 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=protected-access
+"""test corpus tracking"""
+import json
+import os
+
+import pytest
+
+from .corpus import CorpusIndex, InputPaths
+
+
+def _age(path, seconds=60):
+    """move modification time of path into the past"""
+    mtime = os.stat(path).st_mtime - seconds
+    os.utime(path, (mtime, mtime))
+
+def test_input_paths_01():
+    """test InputPaths"""
+    paths = InputPaths()
+    assert not paths
+    assert not list(paths)
+    with pytest.raises(IndexError):
+        paths.pop()
+    with pytest.raises(IndexError):
+        paths[0]  # pylint: disable=pointless-statement
+    paths.append(os.path.join("a", "b", "file1.txt"))
+    paths.append(os.path.join("a", "file2.txt"))
+    paths.add(os.path.join("a", "b"), "file3.txt")
+    assert len(paths) == 3
+    assert len(paths._dirs) == 2
+    assert paths[0] == os.path.join("a", "b", "file1.txt")
+    assert paths[-1] == os.path.join("a", "b", "file3.txt")
+    with pytest.raises(IndexError):
+        paths[3]  # pylint: disable=pointless-statement
+    expected = sorted([
+        os.path.join("a", "b", "file1.txt"),
+        os.path.join("a", "file2.txt"),
+        os.path.join("a", "b", "file3.txt")])
+    paths.sort()
+    assert list(paths) == expected
+    paths.sort(reverse=True)
+    assert list(paths) == list(reversed(expected))
+    assert paths.pop() == expected[0]
+    assert len(paths) == 2
+    assert paths.pop() == expected[1]
+    assert paths.pop() == expected[2]
+    assert not paths
+    assert not paths._names
+
+def test_input_paths_02():
+    """test InputPaths with non-ascii file names"""
+    paths = InputPaths([os.path.join("d", u"été.html"), os.path.join("d", "x.html")])
+    assert paths[0] == os.path.join("d", u"été.html")
+    assert paths[1] == os.path.join("d", "x.html")
+    assert paths.pop() == os.path.join("d", "x.html")
+    assert paths.pop() == os.path.join("d", u"été.html")
+
+def test_corpus_index_01(tmp_path):
+    """test CorpusIndex without saving"""
+    CorpusIndex.PATH = str(tmp_path / "index")
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "a.bin").write_bytes(b"a")
+    nested = corpus / "nested"
+    nested.mkdir()
+    (nested / "b.bin").write_bytes(b"bb")
+    index = CorpusIndex(str(corpus), persist=False).refresh()
+    assert index.rescanned == 2
+    assert sorted(index.files()) == sorted([
+        (str(corpus), "a.bin", 1),
+        (str(nested), "b.bin", 2)])
+    assert not os.path.isdir(CorpusIndex.PATH)
+
+def test_corpus_index_02(tmp_path):
+    """test CorpusIndex incremental refresh"""
+    CorpusIndex.PATH = str(tmp_path / "index")
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "a.bin").write_bytes(b"a")
+    nested = corpus / "nested"
+    nested.mkdir()
+    (nested / "b.bin").write_bytes(b"bb")
+    _age(str(corpus))
+    _age(str(nested))
+    index = CorpusIndex(str(corpus)).refresh()
+    assert index.rescanned == 2
+    assert os.path.isfile(index.index_file)
+    # nothing modified (index shared with new instance)
+    index = CorpusIndex(str(corpus)).refresh()
+    assert index.rescanned == 0
+    assert len(list(index.files())) == 2
+    # add a file
+    (nested / "c.bin").write_bytes(b"ccc")
+    index.refresh()
+    assert index.rescanned == 1
+    assert (str(nested), "c.bin", 3) in set(index.files())
+    # recently modified directories are always rescanned
+    index.refresh()
+    assert index.rescanned == 1
+    # remove a directory
+    (nested / "b.bin").unlink()
+    (nested / "c.bin").unlink()
+    nested.rmdir()
+    _age(str(corpus))
+    index.refresh()
+    assert index.rescanned == 1
+    assert list(index.files()) == [(str(corpus), "a.bin", 1)]
+
+def test_corpus_index_03(tmp_path):
+    """test CorpusIndex with invalid saved index"""
+    CorpusIndex.PATH = str(tmp_path / "index")
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "a.bin").write_bytes(b"a")
+    _age(str(corpus))
+    index = CorpusIndex(str(corpus)).refresh()
+    assert index.rescanned == 1
+    # corrupt index
+    with open(index.index_file, "w") as out_fp:
+        out_fp.write("{bad")
+    assert CorpusIndex(str(corpus)).refresh().rescanned == 1
+    # version mismatch
+    with open(index.index_file, "r") as in_fp:
+        data = json.load(in_fp)
+    data["version"] = 0
+    with open(index.index_file, "w") as out_fp:
+        json.dump(data, out_fp)
+    assert CorpusIndex(str(corpus)).refresh().rescanned == 1
+    assert CorpusIndex(str(corpus)).refresh().rescanned == 0
@@ -8,7 +8,9 @@ import os
 
 import pytest
 
-from .iomanager import IOManager, ServerMap
+from .corpus import CorpusIndex
+from .iomanager import InputCache, IOManager, ServerMap
+from .scheduler import WeightedScheduler
 from .storage import InputFile, TestFile
 
 
@@ -58,6 +60,22 @@ def test_iomanager_02(tmp_path):
     finally:
         iom.cleanup()
 
+def test_iomanager_09(tmp_path):
+    """test IOManager.scan_input() with saved index"""
+    CorpusIndex.PATH = str(tmp_path / "index")
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "input_01.bin").write_bytes(b"foo")
+    (corpus / "input_02.txt").write_bytes(b"bar")
+    (corpus / "empty.bin").touch()
+    iom = IOManager()
+    try:
+        iom.scan_input(str(corpus), sort=True, use_index=True)
+        assert list(iom.input_files) == [str(corpus / "input_02.txt"), str(corpus / "input_01.bin")]
+        assert len(os.listdir(CorpusIndex.PATH)) == 2
+    finally:
+        iom.cleanup()
+
 def test_iomanager_03(tmp_path, mocker):
     """test IOManager._rotation_required()"""
     iom = IOManager()
@@ -207,6 +225,166 @@ def test_iomanager_08():
         os.environ.pop("TEST_GOOD", None)
         os.environ.pop("TEST_BAD", None)
 
+def test_iomanager_10(tmp_path):
+    """test IOManager.adjust_input_weight() with WeightedScheduler"""
+    for name in ("a.bin", "b.bin", "c.bin"):
+        (tmp_path / name).write_bytes(b"test")
+    iom = IOManager(scheduler=WeightedScheduler(), input_mmap=True)
+    try:
+        iom.scan_input(str(tmp_path))
+        # no input selected
+        iom.adjust_input_weight(iom.INPUT_BOOST)
+        assert iom.scheduler.current is None
+        iom.create_testcase("test-adapter", rotation_period=1)
+        assert iom.active_input is not None
+        assert iom.active_input.use_mmap
+        current = iom.scheduler.current
+        iom.adjust_input_weight(iom.INPUT_BOOST)
+        assert iom.scheduler.get_weight(current) == WeightedScheduler.DEFAULT_WEIGHT * iom.INPUT_BOOST
+        iom.adjust_input_weight(iom.INPUT_DEMOTE)
+        iom.adjust_input_weight(iom.INPUT_DEMOTE)
+        assert iom.scheduler.get_weight(current) == WeightedScheduler.DEFAULT_WEIGHT * iom.INPUT_DEMOTE
+    finally:
+        iom.cleanup()
+
+def test_iomanager_11(tmp_path):
+    """test IOManager with InputCache"""
+    (tmp_path / "a.bin").write_bytes(b"a")
+    (tmp_path / "b.bin").write_bytes(b"b")
+    iom = IOManager(input_cache=10)
+    try:
+        iom.scan_input(str(tmp_path), sort=True)
+        iom.scheduler.select = lambda count: iom._generated % count
+        iom.create_testcase("test-adapter", rotation_period=1)
+        first = iom.active_input
+        assert iom.active_input.get_data() == b"b"
+        iom.create_testcase("test-adapter", rotation_period=1)
+        assert iom.active_input.get_data() == b"a"
+        assert iom.input_cache.misses == 2
+        assert len(iom.input_cache) == 1
+        iom.create_testcase("test-adapter", rotation_period=1)
+        assert iom.active_input is first
+        assert iom.input_cache.hits == 1
+    finally:
+        iom.cleanup()
+    assert not iom.input_cache
+
+def test_iomanager_12():
+    """test IOManager test case deduplication"""
+    iom = IOManager(report_size=3)
+    try:
+        iom.harness = TestFile.from_data(b"harness", "h.htm")
+        for _ in range(4):
+            test = iom.create_testcase("test-adapter")
+            test.add_from_data(b"data", test.landing_page)
+        assert len(iom.tests) == 3
+        # the most recent test case is not added until the next is created
+        assert len(iom.blob_store) == 2
+        assert iom.harness in iom.blob_store
+        assert iom.tests[0]._files.required[0]._fp is iom.tests[1]._files.required[0]._fp
+        iom.purge_tests()
+        assert len(iom.blob_store) == 1
+    finally:
+        iom.cleanup()
+    assert not iom.blob_store
+
+def test_iomanager_13():
+    """test IOManager test case history size limit"""
+    iom = IOManager(report_size=10, report_limit=25)
+    try:
+        for size in (10, 10, 10, 30, 5):
+            test = iom.create_testcase("test-adapter")
+            test.add_from_data(b"x" * size, test.landing_page)
+        # 10, 10 and 10 then 30 (over limit alone but most recent complete test is kept)
+        assert iom.tests_evicted == 3
+        assert [x.data_size for x in iom.tests] == [30, 5]
+        test = iom.create_testcase("test-adapter")
+        assert iom.tests_evicted == 4
+        assert [x.data_size for x in iom.tests] == [5, 0]
+    finally:
+        iom.cleanup()
+
+def test_inputcache_01(tmp_path):
+    """test InputCache"""
+    for name in ("a.bin", "b.bin", "c.bin"):
+        (tmp_path / name).write_bytes(b"1234")
+    (tmp_path / "big.bin").write_bytes(b"1234567890")
+    cache = InputCache(8)
+    assert cache.hit_rate == 0
+    # miss
+    in_a = cache.get(str(tmp_path / "a.bin"))
+    assert in_a.get_data() == b"1234"
+    cache.put(in_a)
+    assert str(tmp_path / "a.bin") in cache
+    assert cache.size == 4
+    # hit
+    assert cache.get(str(tmp_path / "a.bin")) is in_a
+    assert cache.size == 0
+    assert cache.hit_rate == 0.5
+    cache.put(in_a)
+    in_b = cache.get(str(tmp_path / "b.bin"))
+    in_b.get_data()
+    cache.put(in_b)
+    assert cache.size == 8
+    # evict least recently used
+    in_c = cache.get(str(tmp_path / "c.bin"))
+    in_c.get_data()
+    cache.put(in_c)
+    assert str(tmp_path / "a.bin") not in cache
+    assert in_a._fp is None
+    assert len(cache) == 2
+    # too large to cache
+    in_big = cache.get(str(tmp_path / "big.bin"))
+    in_big.get_data()
+    cache.put(in_big)
+    assert in_big._fp is None
+    assert len(cache) == 2
+    cache.clear()
+    assert not cache
+    assert cache.size == 0
+
+def test_inputcache_02(tmp_path, mocker):
+    """test InputCache with data that is not held in memory and modified files"""
+    mocker.patch.object(InputFile, "CACHE_LIMIT", 4)
+    (tmp_path / "a.bin").write_bytes(b"1234")
+    (tmp_path / "b.bin").write_bytes(b"12345")
+    cache = InputCache(100)
+    # not read
+    in_a = cache.get(str(tmp_path / "a.bin"))
+    cache.put(in_a)
+    assert not cache
+    # mmap
+    in_a = cache.get(str(tmp_path / "a.bin"), use_mmap=True)
+    in_a.get_data()
+    cache.put(in_a)
+    assert in_a._fp is None
+    assert not cache
+    # spooled to disk
+    in_b = cache.get(str(tmp_path / "b.bin"))
+    in_b.get_data()
+    cache.put(in_b)
+    assert in_b._fp is None
+    assert not cache
+    # modified file
+    in_a = cache.get(str(tmp_path / "a.bin"))
+    in_a.get_data()
+    cache.put(in_a)
+    assert cache.size == 4
+    (tmp_path / "a.bin").write_bytes(b"4321")
+    os.utime(str(tmp_path / "a.bin"), (in_a.mtime + 10, in_a.mtime + 10))
+    modified = cache.get(str(tmp_path / "a.bin"))
+    assert modified is not in_a
+    assert in_a._fp is None
+    assert modified.get_data() == b"4321"
+    assert cache.size == 0
+    cache.put(modified)
+    # removed file
+    (tmp_path / "a.bin").unlink()
+    with pytest.raises(IOError):
+        cache.get(str(tmp_path / "a.bin"))
+    assert not cache
+    assert cache.hits == 0
+
 def test_servermap_01():
     """test empty ServerMap"""
     srv_map = ServerMap()
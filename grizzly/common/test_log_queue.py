@@ -0,0 +1,115 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=protected-access
+"""test LogQueue"""
+import logging
+
+from .log_queue import init_logging, LogQueue
+
+
+def test_log_queue_01(tmp_path):
+    """test LogQueue"""
+    log_file = tmp_path / "log.txt"
+    target = logging.FileHandler(str(log_file))
+    target.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    target.setLevel(logging.INFO)
+    log_queue = LogQueue(target)
+    assert log_queue.handler.level == logging.INFO
+    logger = logging.getLogger("test_log_queue_01")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(log_queue.handler)
+    try:
+        log_queue.start()
+        log_queue.start()
+        logger.info("test %d", 1)
+        logger.debug("suppressed %d", 2)
+        log_queue.stop()
+        log_queue.stop()
+        assert log_file.read_text() == "INFO test 1\n"
+        # restart
+        log_queue.start()
+        logger.warning("test %s", "again")
+    finally:
+        logger.removeHandler(log_queue.handler)
+        log_queue.close()
+    assert log_file.read_text() == "INFO test 1\nWARNING test again\n"
+
+def test_log_queue_02(mocker):
+    """test LogQueue does not format suppressed records"""
+    target = logging.NullHandler()
+    target.setLevel(logging.INFO)
+    fake_format = mocker.patch.object(target, "format", autospec=True)
+    log_queue = LogQueue(target)
+    logger = logging.getLogger("test_log_queue_02")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(log_queue.handler)
+    try:
+        log_queue.start()
+        logger.debug("suppressed")
+        log_queue.stop()
+    finally:
+        logger.removeHandler(log_queue.handler)
+        log_queue.close()
+    assert fake_format.call_count == 0
+
+def test_log_queue_03(mocker):
+    """test init_logging()"""
+    fake_atexit = mocker.patch("grizzly.common.log_queue.atexit", autospec=True)
+    root = logging.getLogger()
+    orig_handlers = list(root.handlers)
+    orig_level = root.level
+    try:
+        # already configured
+        root.addHandler(logging.NullHandler())
+        assert init_logging(logging.INFO, "%(message)s") is None
+        # configure
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        log_queue = init_logging(logging.WARNING, "%(message)s")
+        assert log_queue is not None
+        assert root.handlers == [log_queue.handler]
+        assert root.level == logging.WARNING
+        assert fake_atexit.register.call_count == 1
+        log_queue.stop()
+    finally:
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in orig_handlers:
+            root.addHandler(handler)
+        root.setLevel(orig_level)
+
+def test_log_queue_04(tmp_path):
+    """test LogQueue merges arguments and traceback before queuing"""
+    log_file = tmp_path / "log.txt"
+    target = logging.FileHandler(str(log_file))
+    target.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    log_queue = LogQueue(target)
+    logger = logging.getLogger("test_log_queue_04")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(log_queue.handler)
+    try:
+        # listener is not running, records remain queued
+        data = ["a"]
+        logger.info("data %r", data)
+        data.append("b")
+        try:
+            raise RuntimeError("test")
+        except RuntimeError:
+            logger.exception("failed")
+        queued = list(log_queue._listener.queue.queue)
+        assert len(queued) == 2
+        assert all(record.args is None for record in queued)
+        assert all(record.exc_info is None for record in queued)
+        log_queue.start()
+        log_queue.stop()
+    finally:
+        logger.removeHandler(log_queue.handler)
+        log_queue.close()
+    output = log_file.read_text()
+    assert output.startswith("INFO data ['a']\nERROR failed\nTraceback")
+    assert output.count("RuntimeError: test") == 1
@@ -0,0 +1,54 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# pylint: disable=protected-access
+"""test Grizzly profiler"""
+import os
+
+from .profiler import Profiler
+
+
+def _busy():
+    return sum(x * x for x in range(10000))
+
+def test_profiler_01(tmp_path):
+    """test cpu Profiler"""
+    prof = Profiler("cpu", 10, working_path=str(tmp_path), keep=2, top=5)
+    prof.stop()
+    prof.start()
+    # period has not elapsed
+    assert not prof.check()
+    _busy()
+    # period has elapsed
+    prof._time -= 10
+    assert prof.check()
+    assert len(prof.captures) == 1
+    assert os.path.isfile(prof.captures[0])
+    # rotate captures
+    first = prof.captures[0]
+    prof.capture()
+    prof.capture()
+    assert len(prof.captures) == 2
+    assert not os.path.isfile(first)
+    assert len(os.listdir(str(tmp_path))) == 2
+    prof.stop()
+    assert prof._profile is None
+    assert len(os.listdir(str(tmp_path))) == 2
+
+def test_profiler_02(tmp_path):
+    """test alloc Profiler"""
+    prof = Profiler("alloc", 10, working_path=str(tmp_path), keep=1)
+    prof.start()
+    try:
+        data = [bytearray(1024) for _ in range(100)]
+        dst = prof.capture()
+        assert dst.endswith(".snapshot")
+        assert os.path.isfile(dst)
+        assert data
+        prof.capture()
+        assert len(prof.captures) == 1
+        assert not os.path.isfile(dst)
+    finally:
+        prof.stop()
+    assert prof._snapshot is None
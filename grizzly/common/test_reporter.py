@@ -12,7 +12,7 @@ import tarfile
 import pytest
 
 from .reporter import FilesystemReporter, FuzzManagerReporter, Report, Reporter, S3FuzzManagerReporter
-from .storage import TestCase
+from .storage import TestCase, TestFile
 
 
 def test_report_01():
@@ -71,11 +71,16 @@ def test_report_04(tmp_path):
     with pytest.raises(AssertionError):
         Report.tail(str(tmp_file), 0)
     assert tmp_file.stat().st_size == length
-    Report.tail(str(tmp_file), 3)
+    inode = tmp_file.stat().st_ino
+    assert Report.tail(str(tmp_file), 3) == b"[LOG TAILED]\nFOO"
     with tmp_file.open("rb") as test_fp:
         log_data = test_fp.read()
     assert log_data.startswith(b"[LOG TAILED]\n")
     assert log_data[13:] == b"FOO"
+    # file is modified in place
+    assert tmp_file.stat().st_ino == inode
+    # file is small enough
+    assert Report.tail(str(tmp_file), 100) is None
 
 def test_report_05(tmp_path):
     """test Report.select_logs()"""
@@ -211,6 +216,47 @@ def test_report_10(tmp_path):
     report.cleanup()
     assert not tmp_path.is_dir()
 
+def test_report_11(tmp_path, mocker):
+    """test Report reads each log once"""
+    (tmp_path / "log_stderr.txt").write_bytes(b"STDERR log\n")
+    (tmp_path / "log_stdout.txt").write_bytes(b"")
+    with (tmp_path / "log_ffp_asan_1.txt").open("wb") as log_fp:
+        log_fp.write(b"==1==ERROR: AddressSanitizer: SEGV on unknown address 0x000000000000\n")
+        log_fp.write(b"x" * 100 + b"\n")
+        log_fp.write(b"    #0 0xbad000 in foo /file1.c:123:234\n")
+        log_fp.write(b"    #1 0x1337dd in bar /file2.c:1806:19\n")
+    fake_tail = mocker.patch.object(Report, "tail", side_effect=Report.tail)
+    report = Report.from_path(str(tmp_path), size_limit=100)
+    try:
+        assert report.log_aux == "log_ffp_asan_1.txt"
+        assert report.stack is not None
+        assert len(report.stack.frames) == 2
+        # tailed content is used
+        tailed = (tmp_path / "log_ffp_asan_1.txt").read_bytes()
+        assert tailed.startswith(b"[LOG TAILED]\n")
+        assert report.log_data(report.log_aux) == tailed
+        # content read during selection is passed to tail()
+        data_args = [x[1]["data"] for x in fake_tail.call_args_list]
+        assert len(data_args) == 3
+        assert sum(1 for x in data_args if x is not None) == 1
+        # content is cached
+        assert report.log_data(report.log_err) is report.log_data(report.log_err)
+        assert report.log_data(report.log_err)[:] == b"STDERR log\n"
+        assert report.log_data(report.log_out) == b""
+    finally:
+        report.close()
+        assert not report._logs
+        report.cleanup()
+    assert not tmp_path.is_dir()
+
+def test_report_12(tmp_path):
+    """test Report.tail() with data"""
+    tmp_file = tmp_path / "file.txt"
+    tmp_file.write_bytes(b"123456789")
+    assert Report.tail(str(tmp_file), 9, data=b"123456789") is None
+    assert Report.tail(str(tmp_file), 3, data=b"123456789") == b"[LOG TAILED]\n789"
+    assert tmp_file.read_bytes() == b"[LOG TAILED]\n789"
+
 def test_reporter_01(tmp_path):
     """test creating a simple Reporter"""
     class SimpleReporter(Reporter):
@@ -251,6 +297,7 @@ def test_filesystem_reporter_02(tmp_path, mocker):
     with (log_path / "log_asan_blah.txt").open("wb") as log_fp:
         log_fp.write(b"    #0 0xbad000 in foo /file1.c:123:234\n")
         log_fp.write(b"    #1 0x1337dd in bar /file2.c:1806:19")
+    fake_dump = mocker.patch.object(TestCase, "dump_all", autospec=True)
     testcases = list()
     for _ in range(10):
         testcases.append(mocker.Mock(spec=TestCase))
@@ -261,8 +308,8 @@ def test_filesystem_reporter_02(tmp_path, mocker):
     assert not log_path.exists()
     assert report_path.exists()
     assert len(os.listdir(str(report_path))) == 1
-    for tstc in testcases:
-        assert tstc.dump.call_count == 1
+    assert fake_dump.call_count == 1
+    assert [x for x, _ in fake_dump.call_args[0][0]] == testcases
     # call report a 2nd time
     log_path.mkdir()
     (log_path / "log_stderr.txt").write_bytes(b"STDERR log")
@@ -271,8 +318,8 @@ def test_filesystem_reporter_02(tmp_path, mocker):
     for _ in range(2):
         testcases.append(mocker.Mock(spec=TestCase))
     reporter.submit(str(log_path), testcases)
-    for tstc in testcases:
-        assert tstc.dump.call_count == 1
+    assert fake_dump.call_count == 2
+    assert [x for x, _ in fake_dump.call_args[0][0]] == testcases
     results = os.listdir(str(report_path))
     assert len(results) == 2
     assert "NO_STACK" in results
@@ -336,6 +383,67 @@ def test_filesystem_reporter_04(tmp_path):
     assert "echo-0" not in entries
     assert "latest-trace" not in entries
 
+def test_filesystem_reporter_05(tmp_path):
+    """test FilesystemReporter merging similar stacks"""
+    def _make_logs(functions):
+        log_path = tmp_path / "logs"
+        log_path.mkdir()
+        (log_path / "log_stderr.txt").write_bytes(b"STDERR log")
+        (log_path / "log_stdout.txt").write_bytes(b"STDOUT log")
+        with (log_path / "log_asan_blah.txt").open("w") as log_fp:
+            for num, func in enumerate(functions):
+                log_fp.write("    #%d 0xbad000 in %s /%s.c:%d:1\n" % (num, func, func, num))
+        return str(log_path)
+    functions = ["func_%d" % (x,) for x in range(10)]
+    report_path = tmp_path / "reports"
+    reporter = FilesystemReporter(report_path=str(report_path), similar=0.4)
+    reporter.submit(_make_logs(functions), [])
+    buckets = os.listdir(str(report_path))
+    assert len(buckets) == 1
+    # an additional (inlined) frame changes the major hash
+    reporter.submit(_make_logs(functions[:4] + ["inlined"] + functions[4:]), [])
+    assert os.listdir(str(report_path)) == buckets
+    assert len(list(report_path.glob("*/*_logs"))) == 2
+    # unrelated stack
+    reporter.submit(_make_logs(["other_%d" % (x,) for x in range(10)]), [])
+    assert len(os.listdir(str(report_path))) == 2
+    # no stack
+    reporter.submit(_make_logs([]), [])
+    assert "NO_STACK" in os.listdir(str(report_path))
+    # disabled
+    reporter = FilesystemReporter(report_path=str(report_path))
+    reporter.submit(_make_logs(functions[:4] + ["inlined"] + functions[4:]), [])
+    assert len(os.listdir(str(report_path))) == 4
+
+def test_filesystem_reporter_06(tmp_path):
+    """test FilesystemReporter links files with identical data across test cases"""
+    log_path = tmp_path / "logs"
+    log_path.mkdir()
+    (log_path / "log_stderr.txt").write_bytes(b"STDERR log")
+    (log_path / "log_stdout.txt").write_bytes(b"STDOUT log")
+    harness = TestFile.from_data("harness", "harness.html")
+    testcases = list()
+    try:
+        for idx in range(3):
+            tcase = TestCase("land.html", "redirect.html", "test-adapter")
+            tcase.add_file(harness.clone(), required=False)
+            tcase.add_from_data("test_%d" % (idx,), "land.html")
+            testcases.append(tcase)
+        report_path = tmp_path / "reports"
+        FilesystemReporter(report_path=str(report_path)).submit(str(log_path), testcases)
+        dumps = sorted(x for x in (report_path / "NO_STACK").iterdir() if not x.name.endswith("_logs"))
+        assert len(dumps) == 3
+        harness_ino = (dumps[0] / "harness.html").stat().st_ino
+        for dump in dumps:
+            assert (dump / "harness.html").stat().st_ino == harness_ino
+            assert (dump / "harness.html").stat().st_nlink == 3
+            assert (dump / "land.html").stat().st_nlink == 1
+        assert harness._blob.dumped is None
+    finally:
+        harness.close()
+        for tcase in testcases:
+            tcase.cleanup()
+
 def test_fuzzmanager_reporter_01(tmp_path, mocker):
     """test FuzzManagerReporter.sanity_check()"""
     mocker.patch("grizzly.common.reporter.ProgramConfiguration")
@@ -364,66 +472,88 @@ def test_fuzzmanager_reporter_02(tmp_path):
         reporter.submit(str(report_path), [])
     assert "No logs found in" in str(exc.value)
 
-def test_fuzzmanager_reporter_03(tmp_path, mocker):
-    """test FuzzManagerReporter.submit()"""
+def _fake_fm(tmp_path, mocker, search=(None, None)):
+    """setup FuzzManager mocks and return (fake_crashinfo, fake_collector)"""
+    mocker.patch.object(FuzzManagerReporter, "SIG_DB", str(tmp_path / "sigdb.sqlite"))
+    mocker.patch.object(FuzzManagerReporter, "SIG_LOCK", str(tmp_path / "sigcache.lock"))
     fake_crashinfo = mocker.patch("grizzly.common.reporter.CrashInfo", autospec=True)
-    fake_crashinfo.fromRawCrashData.return_value.createShortSignature.return_value = "test [@ test]"
+    crash_info = fake_crashinfo.fromRawCrashData.return_value
+    crash_info.createShortSignature.return_value = "test [@ test]"
+    crash_info.createCrashSignature.return_value = '{"symptoms": []}'
     fake_collector = mocker.patch("grizzly.common.reporter.Collector", autospec=True)
-    fake_collector.return_value.search.return_value = (None, None)
-    fake_collector.return_value.generate.return_value = str(tmp_path / "fake_sig_file")
-    reporter = FuzzManagerReporter(str("fake_bin"))
+    fake_collector.return_value.search.return_value = search
+    return fake_crashinfo, fake_collector
+
+def _fake_logs(tmp_path):
     log_path = tmp_path / "log_path"
     log_path.mkdir()
     (log_path / "log_stderr.txt").touch()
     (log_path / "log_stdout.txt").touch()
+    return log_path
+
+def test_fuzzmanager_reporter_03(tmp_path, mocker):
+    """test FuzzManagerReporter.submit()"""
+    _, fake_collector = _fake_fm(tmp_path, mocker)
+    fake_collector.return_value.submit.return_value = {"id": 1}
+    fake_dump = mocker.patch.object(TestCase, "dump_all", autospec=True)
+    reporter = FuzzManagerReporter(str("fake_bin"))
+    log_path = _fake_logs(tmp_path)
     fake_test = mocker.Mock(spec=TestCase)
     fake_test.adapter_name = "adapter"
     fake_test.input_fname = "input"
     fake_test.env_vars = ("TEST=1",)
     reporter.submit(str(log_path), [fake_test])
     assert not log_path.is_dir()
-    assert fake_test.dump.call_count == 1
+    assert fake_dump.call_count == 1
     assert fake_collector.return_value.submit.call_count == 1
+    assert fake_collector.return_value.search.call_count == 1
+    # known signature is found in the signature database
+    fake_sig = mocker.patch("grizzly.common.reporter.CrashSignature", autospec=True)
+    fake_sig.return_value.matches.return_value = True
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 2
+    assert fake_collector.return_value.search.call_count == 1
+    fake_sig.assert_called_once_with('{"symptoms": []}')
 
 def test_fuzzmanager_reporter_04(tmp_path, mocker):
     """test FuzzManagerReporter.submit() hit frequent crash"""
-    mocker.patch("grizzly.common.reporter.CrashInfo", autospec=True)
-    fake_collector = mocker.patch("grizzly.common.reporter.Collector", autospec=True)
-    fake_collector.return_value.search.return_value = (None, {"frequent": True, "shortDescription": "[@ test]"})
+    sig_file = tmp_path / "test.signature"
+    sig_file.write_text(u'{"symptoms": []}')
+    _, fake_collector = _fake_fm(
+        tmp_path, mocker, search=(str(sig_file), {"frequent": True, "shortDescription": "[@ test]"}))
+    fake_sig = mocker.patch("grizzly.common.reporter.CrashSignature", autospec=True)
+    fake_sig.return_value.matches.return_value = True
     reporter = FuzzManagerReporter("fake_bin")
-    log_path = tmp_path / "log_path"
-    log_path.mkdir()
-    (log_path / "log_stderr.txt").touch()
-    (log_path / "log_stdout.txt").touch()
-    reporter.submit(str(log_path), [])
+    reporter.submit(str(_fake_logs(tmp_path)), [])
     fake_collector.return_value.submit.assert_not_called()
+    # force report
+    fake_collector.return_value.submit.return_value = {"id": 1}
+    reporter.force_report = True
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 1
 
 def test_fuzzmanager_reporter_05(tmp_path, mocker):
     """test FuzzManagerReporter.submit() hit existing crash"""
-    mocker.patch("grizzly.common.reporter.CrashInfo", autospec=True)
-    fake_collector = mocker.patch("grizzly.common.reporter.Collector", autospec=True)
-    fake_collector.return_value.search.return_value = (
-        None, {"bug__id":1, "frequent": False, "shortDescription": "[@ test]"})
+    sig_file = tmp_path / "test.signature"
+    sig_file.write_text(u'{"symptoms": []}')
+    metadata = {"bug__id": 1, "frequent": False, "shortDescription": "[@ test]"}
+    _, fake_collector = _fake_fm(tmp_path, mocker, search=(str(sig_file), metadata))
+    fake_collector.return_value.submit.return_value = {"id": 1}
+    fake_sig = mocker.patch("grizzly.common.reporter.CrashSignature", autospec=True)
+    fake_sig.return_value.matches.return_value = True
     reporter = FuzzManagerReporter("fake_bin")
-    log_path = tmp_path / "log_path"
-    log_path.mkdir()
-    (log_path / "log_stderr.txt").touch()
-    (log_path / "log_stdout.txt").touch()
-    reporter._ignored = lambda x: True
-    reporter.submit(str(log_path), [])
-    fake_collector.return_value.submit.assert_not_called()
+    # crashes with a bug are reported once
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 1
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 1
 
 def test_fuzzmanager_reporter_06(tmp_path, mocker):
     """test FuzzManagerReporter.submit() no signature"""
-    mocker.patch("grizzly.common.reporter.CrashInfo", autospec=True)
-    fake_collector = mocker.patch("grizzly.common.reporter.Collector", autospec=True)
-    fake_collector.return_value.search.return_value = (None, None)
-    fake_collector.return_value.generate.return_value = None
+    fake_crashinfo, fake_collector = _fake_fm(tmp_path, mocker)
+    fake_crashinfo.fromRawCrashData.return_value.createCrashSignature.return_value = None
     reporter = FuzzManagerReporter("fake_bin")
-    log_path = tmp_path / "log_path"
-    log_path.mkdir()
-    (log_path / "log_stderr.txt").touch()
-    (log_path / "log_stdout.txt").touch()
+    log_path = _fake_logs(tmp_path)
     with pytest.raises(RuntimeError) as exc:
         reporter.submit(str(log_path), [])
     assert "Failed to create FM signature" in str(exc.value)
@@ -433,6 +563,96 @@ def test_fuzzmanager_reporter_06(tmp_path, mocker):
     reporter.submit(str(log_path), [])
     fake_collector.return_value.submit.assert_not_called()
 
+def test_fuzzmanager_reporter_07(tmp_path, mocker):
+    """test FuzzManagerReporter.submit() limit reports"""
+    _, fake_collector = _fake_fm(tmp_path, mocker)
+    fake_collector.return_value.submit.return_value = {"id": 1}
+    fake_sig = mocker.patch("grizzly.common.reporter.CrashSignature", autospec=True)
+    fake_sig.return_value.matches.return_value = True
+    mocker.patch.object(FuzzManagerReporter, "MAX_REPORTS", 2)
+    fake_lock = mocker.patch("grizzly.common.reporter.fasteners.process_lock.InterProcessLock")
+    reporter = FuzzManagerReporter("fake_bin")
+    for _ in range(4):
+        reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 2
+    # Collector is reused and the lock is only needed to add the signature
+    assert fake_collector.call_count == 1
+    assert fake_lock.call_count == 1
+
+def test_fuzzmanager_reporter_08(tmp_path, mocker):
+    """test FuzzManagerReporter.create_crash_info() and FuzzManagerReporter._ignored()"""
+    fake_crashinfo = mocker.patch("grizzly.common.reporter.CrashInfo", autospec=True)
+    mocker.patch("grizzly.common.reporter.ProgramConfiguration", autospec=True)
+    log_path = tmp_path / "log_path"
+    log_path.mkdir()
+    (log_path / "log_stderr.txt").write_bytes(b"a\r\n\nb\xff\nc")
+    (log_path / "log_stdout.txt").touch()
+    report = Report.from_path(str(log_path))
+    try:
+        FuzzManagerReporter.create_crash_info(report, "fake_bin")
+        assert fake_crashinfo.fromRawCrashData.call_count == 1
+        stdout, stderr = fake_crashinfo.fromRawCrashData.call_args[0][:2]
+        assert stdout == []
+        assert stderr == ["a", "", "b", "c"]
+        assert not FuzzManagerReporter._ignored(report)
+    finally:
+        report.cleanup()
+    # out of memory
+    log_path.mkdir()
+    (log_path / "log_stderr.txt").write_bytes(b"foo\n==1==ERROR: Failed to mmap\n")
+    (log_path / "log_stdout.txt").touch()
+    report = Report.from_path(str(log_path))
+    try:
+        assert FuzzManagerReporter._ignored(report)
+    finally:
+        report.cleanup()
+    # valgrind
+    log_path.mkdir()
+    (log_path / "log_stderr.txt").write_bytes(b"VEX temporary storage exhausted.\nfoo")
+    (log_path / "log_stdout.txt").touch()
+    report = Report.from_path(str(log_path))
+    try:
+        assert FuzzManagerReporter._ignored(report)
+    finally:
+        report.cleanup()
+
+def test_fuzzmanager_reporter_09(tmp_path, mocker):
+    """test FuzzManagerReporter.submit() signature cache refresh"""
+    sig_cache = tmp_path / "sigcache"
+    sig_cache.mkdir()
+    sig_file = sig_cache / "test.signature"
+    sig_file.write_text(u'{"symptoms": []}')
+    fake_crashinfo, fake_collector = _fake_fm(tmp_path, mocker)
+    fake_collector.return_value.sigCacheDir = str(sig_cache)
+    fake_collector.return_value.submit.return_value = {"id": 1}
+    fake_sig = mocker.patch("grizzly.common.reporter.CrashSignature", autospec=True)
+    fake_sig.return_value.matches.return_value = True
+    mocker.patch.object(FuzzManagerReporter, "MAX_REPORTS", 2)
+    reporter = FuzzManagerReporter("fake_bin")
+    for _ in range(3):
+        reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 2
+    assert fake_collector.return_value.search.call_count == 1
+    # other short signatures that match are added to the existing entry
+    fake_collector.return_value.search.return_value = (
+        str(sig_file), {"frequent": False, "shortDescription": "[@ test]"})
+    fake_crashinfo.fromRawCrashData.return_value.createShortSignature.return_value = "other [@ test]"
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.search.call_count == 2
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.search.call_count == 2
+    assert fake_collector.return_value.submit.call_count == 2
+    # signature cache refreshed, a bug has been filed
+    fake_collector.return_value.search.return_value = (
+        str(sig_file), {"bug__id": 1, "frequent": False, "shortDescription": "[@ test]"})
+    mtime = os.stat(str(sig_cache)).st_mtime
+    os.utime(str(sig_cache), (mtime + 10, mtime + 10))
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.search.call_count == 3
+    assert fake_collector.return_value.submit.call_count == 3
+    reporter.submit(str(_fake_logs(tmp_path)), [])
+    assert fake_collector.return_value.submit.call_count == 3
+
 def test_s3fuzzmanager_reporter_01(tmp_path, mocker):
     """test S3FuzzManagerReporter.sanity_check()"""
     mocker.patch("grizzly.common.reporter.FuzzManagerReporter", autospec=True)
@@ -446,9 +666,10 @@ def test_s3fuzzmanager_reporter_01(tmp_path, mocker):
     finally:
         os.environ.pop("GRZ_S3_BUCKET", None)
 
-def test_s3fuzzmanager_reporter_02(tmp_path, mocker):
+def test_s3fuzzmanager_reporter_02(tmp_path, tmp_path_factory, mocker):
     """test S3FuzzManagerReporter._process_rr_trace()"""
     fake_boto3 = mocker.patch("grizzly.common.reporter.boto3", autospec=True)
+    mocker.patch.object(S3FuzzManagerReporter, "S3_CACHE", str(tmp_path_factory.mktemp("s3cache")))
 
     fake_report = mocker.Mock(spec=Report)
     fake_report.path = "no-path"
@@ -458,6 +679,7 @@ def test_s3fuzzmanager_reporter_02(tmp_path, mocker):
     assert not reporter._extra_metadata
 
     # test will exiting rr-trace
+    assert not S3FuzzManagerReporter._cache_valid("test", "rr-1234abcd.tar.bz2")
     trace_dir = tmp_path / "rr-traces" / "latest-trace"
     trace_dir.mkdir(parents=True)
     fake_report.minor = "1234abcd"
@@ -474,6 +696,7 @@ def test_s3fuzzmanager_reporter_02(tmp_path, mocker):
 
     # test with new rr-trace
     reporter._extra_metadata.clear()
+    fake_report.minor = "5678efab"
     trace_dir.mkdir(parents=True)
     (trace_dir / "trace-file").touch()
     class FakeClientError(Exception):
@@ -492,5 +715,64 @@ def test_s3fuzzmanager_reporter_02(tmp_path, mocker):
     assert "rr-trace" in reporter._extra_metadata
     assert fake_report.minor in reporter._extra_metadata["rr-trace"]
     assert fake_boto3.resource.return_value.meta.client.upload_file.call_count == 1
+    assert S3FuzzManagerReporter._cache_valid("test", "rr-5678efab.tar.bz2")
+    # expired cache entry
+    mocker.patch.object(S3FuzzManagerReporter, "S3_CACHE_TTL", 0)
+    assert not S3FuzzManagerReporter._cache_valid("test", "rr-5678efab.tar.bz2")
+    trace_dir.mkdir(parents=True)
+    os.environ["GRZ_S3_BUCKET"] = "test"
+    try:
+        reporter._process_rr_trace(fake_report)
+    finally:
+        os.environ.pop("GRZ_S3_BUCKET", None)
+    assert fake_boto3.resource.return_value.Object.call_count == 3
+    assert fake_boto3.resource.return_value.meta.client.upload_file.call_count == 2
+
+def test_s3fuzzmanager_reporter_03(tmp_path, tmp_path_factory, mocker, monkeypatch):
+    """test S3FuzzManagerReporter._process_rr_trace() multipart upload and cache (moto)"""
+    boto3 = pytest.importorskip("boto3")
+    botocore = pytest.importorskip("botocore")
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("GRZ_S3_BUCKET", "test-bucket")
+    mocker.patch.object(S3FuzzManagerReporter, "S3_CACHE", str(tmp_path_factory.mktemp("s3cache")))
+    mocker.patch.object(S3FuzzManagerReporter, "S3_PART_SIZE", 5 * 1024 * 1024)
+    fake_report = mocker.Mock(spec=Report)
+    fake_report.minor = "1234abcd"
+    fake_report.path = str(tmp_path)
+
+    def _create_trace():
+        trace_dir = tmp_path / "rr-traces" / "echo-0"
+        trace_dir.mkdir(parents=True)
+        (trace_dir / "data").write_bytes(os.urandom(11 * 1024 * 1024))
+        (tmp_path / "rr-traces" / "latest-trace").symlink_to(str(trace_dir), target_is_directory=True)
+
+    with moto.mock_aws():
+        s3 = boto3.resource("s3")
+        s3.create_bucket(Bucket="test-bucket")
+        reporter = S3FuzzManagerReporter("fake_bin")
+        _create_trace()
+        url = reporter._process_rr_trace(fake_report)
+        assert url == "http://test-bucket.s3.amazonaws.com/rr-1234abcd.tar.bz2"
+        assert reporter._extra_metadata["rr-trace"] == url
+        assert not os.listdir(str(tmp_path))
+        # uploaded in 3 parts
+        assert s3.Object("test-bucket", "rr-1234abcd.tar.bz2").e_tag.strip('"').endswith("-3")
+        assert os.path.isfile(S3FuzzManagerReporter._cache_file("test-bucket", "rr-1234abcd.tar.bz2"))
+        # cached keys are not checked again
+        spy = mocker.spy(botocore.client.BaseClient, "_make_api_call")
+        _create_trace()
+        assert reporter._process_rr_trace(fake_report) == url
+        assert not os.listdir(str(tmp_path))
+        assert spy.call_count == 0
+        # expired cache entry, object has been removed from S3
+        mocker.patch.object(S3FuzzManagerReporter, "S3_CACHE_TTL", 0)
+        s3.Object("test-bucket", "rr-1234abcd.tar.bz2").delete()
+        _create_trace()
+        assert reporter._process_rr_trace(fake_report) == url
+        assert not os.listdir(str(tmp_path))
+        s3.Object("test-bucket", "rr-1234abcd.tar.bz2").load()
 
 # TODO: fill out tests for FuzzManagerReporter and S3FuzzManagerReporter
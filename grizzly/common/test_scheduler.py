@@ -0,0 +1,89 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""test Grizzly input schedulers"""
+# pylint: disable=protected-access
+
+import pytest
+
+from .scheduler import InputScheduler, WeightedScheduler
+
+
+def test_input_scheduler_01():
+    """test InputScheduler"""
+    sched = InputScheduler()
+    assert sched.current is None
+    for _ in range(10):
+        assert 0 <= sched.select(5) < 5
+        assert sched.current < 5
+    assert sched.select(1) == 0
+    assert sched.get_weight() == 1.0
+    # weights are ignored
+    sched.scale(10)
+    assert sched.get_weight() == 1.0
+
+
+def test_weighted_scheduler_01():
+    """test WeightedScheduler resize() and total"""
+    sched = WeightedScheduler()
+    assert not sched
+    assert sched.total == 0
+    for count in (1, 2, 3, 7, 8, 9, 100):
+        sched.resize(count)
+        assert len(sched) == count
+        assert sched.total == pytest.approx(count * WeightedScheduler.DEFAULT_WEIGHT)
+    with pytest.raises(AssertionError, match="inputs cannot be removed"):
+        sched.resize(1)
+
+
+def test_weighted_scheduler_02():
+    """test WeightedScheduler set_weight(), scale() and _find()"""
+    sched = WeightedScheduler()
+    sched.resize(13)
+    weights = [0.5, 2, 0.25, 4, 1, 3, 0.5, 1.5, 2, 0.75, 1, 5, 0.25]
+    for idx, weight in enumerate(weights):
+        sched.set_weight(weight, index=idx)
+    assert sched.total == pytest.approx(sum(weights))
+    # _find() maps each prefix sum range to the matching index
+    start = 0.0
+    for idx, weight in enumerate(weights):
+        assert sched._find(start) == idx
+        assert sched._find(start + weight * 0.99) == idx
+        start += weight
+    assert sched._find(start) == len(weights) - 1
+    # scale()
+    sched.scale(2, index=3)
+    assert sched.get_weight(3) == 8
+    assert sched.total == pytest.approx(sum(weights) + 4)
+    # clamping
+    sched.set_weight(1000, index=0)
+    assert sched.get_weight(0) == WeightedScheduler.MAX_WEIGHT
+    sched.set_weight(0, index=0)
+    assert sched.get_weight(0) == WeightedScheduler.MIN_WEIGHT
+    # nothing selected
+    with pytest.raises(AssertionError, match="no input has been selected"):
+        sched.scale(2)
+
+
+def test_weighted_scheduler_03(mocker):
+    """test WeightedScheduler select()"""
+    fake_random = mocker.patch("grizzly.common.scheduler.random", autospec=True)
+    sched = WeightedScheduler()
+    fake_random.random.return_value = 0.0
+    assert sched.select(4) == 0
+    assert len(sched) == 4
+    fake_random.random.return_value = 0.99
+    assert sched.select(4) == 3
+    assert sched.current == 3
+    # demote current input
+    sched.scale(0.01)
+    assert sched.select(4) == 2
+    # grow
+    assert sched.select(6) == 5
+    assert len(sched) == 6
+    # heavily weighted input is selected most of the time
+    mocker.stopall()
+    sched.set_weight(WeightedScheduler.MAX_WEIGHT, index=1)
+    selected = [sched.select(6) for _ in range(200)]
+    assert selected.count(1) > 150
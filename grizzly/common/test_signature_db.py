@@ -0,0 +1,102 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""test SignatureDB"""
+import threading
+
+from .signature_db import SignatureDB
+
+
+def test_signature_db_01(tmp_path):
+    """test SignatureDB add() and find()"""
+    db_file = str(tmp_path / "sigs.sqlite")
+    with SignatureDB(db_file) as sig_db:
+        # pylint: disable=protected-access
+        assert sig_db._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert not sig_db.find("[@ foo]")
+        entry = sig_db.add("[@ foo]", "sig_a")
+        assert entry["signature"] == "sig_a"
+        assert entry["bug_id"] is None
+        assert not entry["frequent"]
+        assert entry["seen"] == 0
+        # existing signature is not modified
+        assert sig_db.add("[@ foo]", "sig_a", bug_id=1, frequent=True) == entry
+        sig_db.add("[@ foo]", "sig_b", bug_id=123, frequent=True)
+        sig_db.add("[@ bar]", "sig_c")
+        found = sig_db.find("[@ foo]")
+        assert [x["signature"] for x in found] == ["sig_a", "sig_b"]
+        assert found[1]["bug_id"] == 123
+        assert found[1]["frequent"]
+        # additional short signature for an existing signature
+        assert sig_db.add("other [@ foo]", "sig_a") == entry
+        assert sig_db.find("other [@ foo]") == [entry]
+    # entries are persistent
+    with SignatureDB(db_file) as sig_db:
+        assert len(sig_db.find("[@ foo]")) == 2
+        assert len(sig_db.find("[@ bar]")) == 1
+        assert len(sig_db.find("other [@ foo]")) == 1
+
+def test_signature_db_02(tmp_path):
+    """test SignatureDB hit()"""
+    with SignatureDB(str(tmp_path / "sigs.sqlite")) as sig_db:
+        entry = sig_db.add("[@ foo]", "sig_a")
+        assert sig_db.hit(entry["id"], 3) == (1, False)
+        assert sig_db.hit(entry["id"], 3) == (2, False)
+        assert sig_db.hit(entry["id"], 3) == (3, False)
+        assert sig_db.hit(entry["id"], 3) == (4, True)
+        # signatures with a bug are frequent after the first hit
+        entry = sig_db.add("[@ bar]", "sig_b", bug_id=1)
+        assert sig_db.hit(entry["id"], 3) == (1, False)
+        assert sig_db.hit(entry["id"], 3) == (2, True)
+
+def test_signature_db_03(tmp_path):
+    """test SignatureDB hit() from multiple connections"""
+    db_file = str(tmp_path / "sigs.sqlite")
+    with SignatureDB(db_file) as sig_db:
+        sig_id = sig_db.add("[@ foo]", "sig_a")["id"]
+    results = list()
+
+    def _worker():
+        with SignatureDB(db_file) as worker_db:
+            for _ in range(25):
+                results.append(worker_db.hit(sig_id, 1000)[0])
+
+    workers = [threading.Thread(target=_worker) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # each increment is atomic
+    assert sorted(results) == list(range(1, 101))
+    with SignatureDB(db_file) as sig_db:
+        assert sig_db.find("[@ foo]")[0]["seen"] == 100
+
+def test_signature_db_04(tmp_path):
+    """test SignatureDB sync()"""
+    db_file = str(tmp_path / "sigs.sqlite")
+    with SignatureDB(db_file) as sig_db:
+        assert sig_db.sync("1")
+        entry = sig_db.add("[@ foo]", "sig_a")
+        sig_db.hit(entry["id"], 10)
+        # same version
+        assert not sig_db.sync("1")
+        assert sig_db.find("[@ foo]")[0]["seen"] == 1
+    with SignatureDB(db_file) as sig_db:
+        assert not sig_db.sync("1")
+        # new version
+        assert sig_db.sync("2")
+        assert not sig_db.find("[@ foo]")
+        assert sig_db.add("[@ foo]", "sig_a")["seen"] == 0
+
+def test_signature_db_05(tmp_path):
+    """test SignatureDB discards databases created by a different version"""
+    db_file = str(tmp_path / "sigs.sqlite")
+    with SignatureDB(db_file) as sig_db:
+        sig_db.add("[@ foo]", "sig_a")
+        sig_db._conn.execute("PRAGMA user_version=1")  # pylint: disable=protected-access
+    with SignatureDB(db_file) as sig_db:
+        assert not sig_db.find("[@ foo]")
+        sig_db.add("[@ foo]", "sig_a")
+    with SignatureDB(db_file) as sig_db:
+        assert sig_db.find("[@ foo]")
@@ -3,10 +3,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
+import json
+import random
+
 import pytest
 
-from .stack_hasher import Stack, StackFrame
+from .stack_hasher import _reverse_lines, bulk_hash, main, Stack, StackFrame, StackIndex
+
 
+def _frame_fields(frame):
+    """public attributes of a StackFrame"""
+    return (frame.function, frame.location, frame.mode, frame.offset, frame.stack_line)
 
 def test_stack_01():
     """test creating an empty Stack"""
@@ -212,6 +220,52 @@ def test_stack_13():
     assert stack.minor != stack.major
     assert stack.frames[0].mode == StackFrame.MODE_RUST
 
+def test_stack_14(tmp_path):
+    """test Stack.from_file()"""
+    input_txt = "" \
+        "=================================================================\n" \
+        "==5854==ERROR: AddressSanitizer: heap-use-after-free on address 0x6120000d4f58\n" \
+        "    #0 0x7f1c2e2f5a09 in old_stack /src/a.cpp:5:10\n" \
+        "    #1 0x7f1c2e2f5a09 in old_main /src/main.cpp:42:2\n" \
+        "\xe2\x98\x83 WARNING: unrelated \xff output\r\n" \
+        "==5854==ERROR: AddressSanitizer: SEGV on unknown address 0x000000000000\n" \
+        "    #0 0x7f1c2e2f5a09 in foo::bar(int) /src/foo.cpp:37:5\n" \
+        "    #1 0x7f1c2e2f5a10 in baz /src/baz.cpp:1:1\n" \
+        "    #2 0x7f1c2e2f5a11 (/lib/libc.so.6+0x20830)\n" \
+        "\n" \
+        "SUMMARY: AddressSanitizer: SEGV /src/foo.cpp:37:5 in foo::bar(int)\n"
+    log_file = tmp_path / "log.txt"
+    log_file.write_bytes(input_txt.encode("latin-1"))
+    stack = Stack.from_file(str(log_file))
+    expected = Stack.from_text(log_file.read_bytes().decode("utf-8", errors="ignore"))
+    assert len(stack.frames) == 3
+    assert [_frame_fields(x) for x in stack.frames] == [_frame_fields(x) for x in expected.frames]
+    assert stack.frames[0].function == "foo::bar"
+    assert stack.frames[2].location == "libc.so.6"
+    assert stack.minor == expected.minor
+    assert stack.major == expected.major
+    # empty file
+    log_file.write_bytes(b"")
+    stack = Stack.from_file(str(log_file), major_depth=2)
+    assert not stack.frames
+    assert stack._major_depth == 2  # pylint: disable=protected-access
+
+def test_stack_15():
+    """test Stack.from_file() stops reading once the stack is found"""
+    consumed = list()
+    def _lines():
+        for line in _reverse_lines(b"#0 a () at a.c:1\n#0 b () at b.c:1\n#1 c () at c.c:1\nlast"):
+            consumed.append(line)
+            yield line
+    stack = Stack._from_lines(_lines(), 5, None)  # pylint: disable=protected-access
+    assert [x.function for x in stack.frames] == ["b", "c"]
+    assert consumed == ["last", "#1 c () at c.c:1", "#0 b () at b.c:1"]
+
+def test_reverse_lines_01():
+    """test _reverse_lines()"""
+    for data in ("", "\n", "a", "a\n", "\na", "a\nb", "ab\n\ncd\n", "\n\n\n"):
+        assert list(_reverse_lines(data.encode("utf-8"))) == list(reversed(data.split("\n")))
+
 def test_stackframe_01():
     """test creating an empty StackFrame"""
     stack = StackFrame()
@@ -234,6 +288,117 @@ def test_stackframe_02():
     assert StackFrame.from_line("==123==") is None
     assert StackFrame.from_line("==1== by 0x0: a ()") is None
 
+def _from_line_sequential(line, parse_mode=None):
+    """reference implementation of StackFrame.from_line() that calls every parser"""
+    parsers = (
+        (StackFrame.MODE_ASAN, StackFrame._parse_asan_with_syms),
+        (StackFrame.MODE_ASAN, StackFrame._parse_asan_wo_syms),
+        (StackFrame.MODE_GDB, StackFrame._parse_gdb),
+        (StackFrame.MODE_MINIDUMP, StackFrame._parse_minidump),
+        (StackFrame.MODE_RR, StackFrame._parse_rr),
+        (StackFrame.MODE_RUST, StackFrame._parse_rust),
+        (StackFrame.MODE_VALGRIND, StackFrame._parse_valgrind))
+    for mode, parser in parsers:
+        if parse_mode is None or parse_mode == mode:
+            frame_info = parser(line)
+            if frame_info is not None:
+                return StackFrame(**frame_info)
+    return None
+
+_SAMPLE_LOG = (
+    "==4321==ERROR: AddressSanitizer: heap-use-after-free on address 0x6120000d4f58",
+    "READ of size 8 at 0x6120000d4f58 thread T0",
+    "    #0 0x7f00dad60565 in Abort(char const*) /blah/base/nsDebugImpl.cpp:472",
+    "    #1 0x7f00ecc1b33f (/lib/x86_64-linux-gnu/libpthread.so.0+0x1033f)",
+    "    #2 0x7ffffffff  (<unknown module>)",
+    "    #3 0x7f30afea9148 in Call<nsBlah *> /a/b.cpp:356:50",
+    "    #4 0x7f0155526181 in start_thread (/l/libpthread.so.0+0x8181)",
+    "#0  __memmove_ssse3_back () at ../d/x86_64/a/memcpy-ssse3-back.S:1654",
+    "#2  0x0000000000400545 in main ()",
+    "#3  0x0000000000400545 in main () at test.c:5",
+    "#0      ",
+    "#a",
+    "0|2|libtest|main|hg:c.a.org/m-c:a/b/file.cpp:5bf50|114|0x3a",
+    "9|42|libpthread-2.26.so||||0x10588",
+    "a|b|c|d|e|f|g",
+    "==4754==    at 0x45C6C0: FuncName (decode.c:123)",
+    "==4754==    by 0x4C2AB80: malloc (in /usr/lib/blah-linux.so)",
+    "==4754== Invalid read of size 4",
+    "==1== by 0x0: a ()",
+    "rr(main+0x244)[0x450b74]",
+    "rr(main)",
+    "  53:    0x7ff1d7e4982f - __libc_start_main",
+    "  4:    0x10b715a5b - unwind::begin_unwind_fmt::h227376fe1e021a36n3d",
+    "  12: not a frame",
+    "SUMMARY: AddressSanitizer: heap-use-after-free /a/b.cpp:356:50 in Call",
+    "[Parent 1234, Main Thread] WARNING: NS_ENSURE_TRUE(mDocShell) failed: file nsDocShell.cpp, line 123",
+    "")
+
+def test_stackframe_03():
+    """test StackFrame.from_line() matches calling each parser in order"""
+    modes = (None, StackFrame.MODE_ASAN, StackFrame.MODE_GDB, StackFrame.MODE_MINIDUMP,
+             StackFrame.MODE_RR, StackFrame.MODE_RUST, StackFrame.MODE_VALGRIND)
+    for line in _SAMPLE_LOG:
+        for mode in modes:
+            expected = _from_line_sequential(line, parse_mode=mode)
+            frame = StackFrame.from_line(line, parse_mode=mode)
+            if expected is None:
+                assert frame is None
+            else:
+                assert frame is not None
+                assert _frame_fields(frame) == _frame_fields(expected)
+
+def _noisy_log(size):
+    """create a log of (at least) size bytes where most lines are not part of a stack"""
+    noise = [
+        "[Parent 1234, Main Thread] WARNING: NS_ENSURE_TRUE(mDocShell) failed: file nsDocShell.cpp, "
+        "line %d" % (x,) for x in range(100)]
+    noise.append("JavaScript error: resource://gre/modules/Foo.jsm, line 5: TypeError: a is null")
+    lines = list()
+    total = 0
+    while total < size:
+        for line in noise + list(_SAMPLE_LOG):
+            lines.append(line)
+            total += len(line) + 1
+    return lines
+
+def test_stackframe_04():
+    """test StackFrame.from_line() with a log containing mostly non-stack lines"""
+    lines = _noisy_log(1)
+    expected = [_from_line_sequential(x) for x in lines]
+    frames = [StackFrame.from_line(x) for x in lines]
+    assert len(frames) == len(expected)
+    for frame, exp in zip(frames, expected):
+        if exp is None:
+            assert frame is None
+        else:
+            assert _frame_fields(frame) == _frame_fields(exp)
+    assert Stack.from_text("\n".join(lines)).frames
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "parse", [_from_line_sequential, StackFrame.from_line], ids=["sequential", "dispatch"])
+def test_stackframe_benchmark_01(parse):
+    """benchmark StackFrame.from_line() with a large log (compare using --durations)"""
+    for line in _noisy_log(0x100000):
+        parse(line)
+
+def test_stackframe_05():
+    """test compact StackFrame"""
+    frame = StackFrame(function="".join(["fu", "nc"]), location="".join(["fi", "le.c"]), offset="1")
+    other = StackFrame(function="".join(["fu", "nc"]), location="".join(["fi", "le.c"]), offset="2")
+    assert not hasattr(frame, "__dict__")
+    # strings are shared
+    assert frame.function is other.function
+    assert frame.location is other.location
+    assert frame.hash_data() == (b"file.cfunc", b"1")
+    assert frame.hash_data() is frame.hash_data()
+    assert StackFrame().hash_data() == (b"", b"")
+    # hashes match the data added by each frame
+    stack = Stack(frames=[frame, other], major_depth=1)
+    assert stack.minor == hashlib.sha1(b"file.cfunc1file.cfunc2").hexdigest()
+    assert stack.major == hashlib.sha1(b"file.cfunc1").hexdigest()
+
 def test_asan_stackframe_01():
     """test creating a StackFrame from an ASan line with symbols"""
     frame = StackFrame.from_line("    #1 0x7f00dad60565 in Abort(char const*) /blah/base/nsDebugImpl.cpp:472")
@@ -407,3 +572,152 @@ def test_rust_stackframe_02():
     assert frame.function == "unwind::begin_unwind_fmt"
     assert frame.offset is None
     assert frame.mode == StackFrame.MODE_RUST
+
+def _make_result(path, top_frame, depth=2):
+    """create a result log directory like FilesystemReporter"""
+    path.mkdir(parents=True)
+    frames = ["    #0 0x7f1c2e2f5a09 in %s /src/foo.cpp:37:5" % (top_frame,)]
+    for num in range(1, depth - 1):
+        frames.append("    #%d 0x7f1c2e2f5a10 in func_%d /src/func.cpp:%d:1" % (num, num, num))
+    frames.append("    #%d 0x7f1c2e2f5a10 in main /src/main.cpp:1:1" % (depth - 1,))
+    (path / "log_stderr.txt").write_text(
+        u"==1==ERROR: AddressSanitizer: SEGV on unknown address 0x000000000000\n%s\n" % ("\n".join(frames),))
+    (path / "log_stdout.txt").write_text(u"")
+
+def test_bulk_hash_01(tmp_path, mocker):
+    """test bulk_hash()"""
+    results = tmp_path / "results"
+    for idx in range(3):
+        _make_result(results / "major_a" / ("a%d_logs" % (idx,)), "foo")
+    _make_result(results / "major_b" / "b0_logs", "bar")
+    # result without a stack
+    (results / "major_c" / "c0_logs").mkdir(parents=True)
+    (results / "major_c" / "c0_logs" / "log_stderr.txt").write_text(u"nothing")
+    # test case directories are ignored
+    (results / "major_a" / "a0-0").mkdir()
+    cache = tmp_path / "cache.json"
+    buckets = bulk_hash(str(results), cache_file=str(cache), jobs=1)
+    assert len(buckets) == 3
+    assert buckets[0]["count"] == 3
+    assert buckets[0]["example"] == str(results / "major_a" / "a0_logs")
+    assert buckets[0]["major"] != "NO_STACK"
+    assert sum(x["count"] for x in buckets) == 5
+    assert any(x["major"] == "NO_STACK" and x["minor"] == "0" for x in buckets)
+    assert len(json.loads(cache.read_text())) == 5
+    # unchanged results are not parsed again
+    fake_hash = mocker.patch("grizzly.common.stack_hasher._hash_result", autospec=True)
+    assert bulk_hash(str(results), cache_file=str(cache), jobs=1) == buckets
+    assert fake_hash.call_count == 0
+    mocker.stopall()
+    # modified result is parsed again
+    (results / "major_a" / "a2_logs" / "log_stderr.txt").write_text(u"")
+    buckets = bulk_hash(str(results), cache_file=str(cache), jobs=1)
+    assert buckets[0]["count"] == 2
+    assert sum(x["count"] for x in buckets if x["major"] == "NO_STACK") == 2
+    # invalid cache
+    cache.write_text(u"{")
+    assert bulk_hash(str(results), cache_file=str(cache), jobs=1) == buckets
+
+def test_bulk_hash_02(tmp_path):
+    """test bulk_hash() using a process pool"""
+    for idx in range(20):
+        _make_result(tmp_path / ("r%02d_logs" % (idx,)), "func_%d" % (idx % 4,))
+    buckets = bulk_hash(str(tmp_path), jobs=2)
+    assert [x["count"] for x in buckets] == [5, 5, 5, 5]
+    assert buckets == bulk_hash(str(tmp_path), jobs=1)
+
+def test_bulk_hash_03(tmp_path, capsys):
+    """test write_buckets() and main()"""
+    _make_result(tmp_path / "results" / "a_logs", "foo")
+    main([str(tmp_path / "results"), "--format", "csv", "-j", "1"])
+    out = capsys.readouterr()[0].splitlines()
+    assert out[0] == "major,minor,count,example"
+    assert len(out) == 2
+    assert out[1].endswith(",1,%s" % (tmp_path / "results" / "a_logs",))
+    main([str(tmp_path / "results"), "-j", "1"])
+    buckets = json.loads(capsys.readouterr()[0])
+    assert len(buckets) == 1
+    assert buckets[0]["count"] == 1
+    # single file mode
+    assert main([str(tmp_path / "results" / "a_logs" / "log_stderr.txt")]) == 0
+
+def _make_stack(functions, offset="1"):
+    """create a Stack from a list of function names"""
+    return Stack(frames=[
+        StackFrame(function=x, location="%s.cpp" % (x,), offset=offset, stack_line=str(i))
+        for i, x in enumerate(functions)])
+
+def test_stack_index_01(tmp_path):
+    """test StackIndex add(), query(), remove(), save() and load()"""
+    index = StackIndex()
+    base = ["func_%d" % (x,) for x in range(10)]
+    index.add("base", _make_stack(base))
+    index.add("other", _make_stack(["other_%d" % (x,) for x in range(10)]))
+    index.add("empty", Stack())
+    assert len(index) == 2
+    assert "base" in index
+    assert "empty" not in index
+    # offsets are ignored
+    found = index.query(_make_stack(base, offset="99"))
+    assert found == [(1.0, "base")]
+    # an additional (inlined) frame
+    found = index.query(_make_stack(base[:3] + ["inlined"] + base[3:]))
+    assert len(found) == 1
+    assert found[0][1] == "base"
+    assert 0.5 <= found[0][0] < 1.0
+    # only the top frames are used
+    assert index.query(_make_stack(base + ["deep"]))[0] == (1.0, "base")
+    assert not index.query(_make_stack(["unrelated"]))
+    assert not index.query(Stack())
+    # replace entry
+    index.add("other", _make_stack(base))
+    assert len(index) == 2
+    assert [x[1] for x in index.query(_make_stack(base))] == ["base", "other"]
+    # save and load
+    with (tmp_path / "index.json").open("w") as out_fp:
+        index.save(out_fp)
+    with (tmp_path / "index.json").open("r") as in_fp:
+        loaded = StackIndex.load(in_fp)
+    assert len(loaded) == 2
+    assert loaded.query(_make_stack(base)) == index.query(_make_stack(base))
+    # remove
+    index.remove("base")
+    index.remove("other")
+    assert not index
+    assert not any(index._buckets)  # pylint: disable=protected-access
+
+def test_stack_index_02():
+    """test StackIndex query() recall"""
+    rng = random.Random(1)
+    names = ["func_%d" % (x,) for x in range(500)]
+    index = StackIndex()
+    stacks = list()
+    for idx in range(500):
+        stacks.append([rng.choice(names) for _ in range(8)])
+        index.add(idx, _make_stack(stacks[-1]))
+    hits = 0
+    for idx in range(0, 500, 10):
+        # one frame removed
+        found = index.query(_make_stack(stacks[idx][:4] + stacks[idx][5:]))
+        assert len(found) < 5
+        if idx in [x[1] for x in found]:
+            hits += 1
+    assert hits >= 45
+
+def test_bulk_hash_04(tmp_path):
+    """test bulk_hash() with similarity"""
+    results = tmp_path / "results"
+    _make_result(results / "a_logs", "foo", depth=8)
+    _make_result(results / "b_logs", "foo", depth=8)
+    # different top frame
+    _make_result(results / "c_logs", "bar", depth=8)
+    (results / "d_logs").mkdir()
+    buckets = bulk_hash(str(results), jobs=1, similarity=0.5)
+    assert len(buckets) == 3
+    minors = {x["example"]: x["minor"] for x in buckets}
+    similar = {x["example"]: x["similar"] for x in buckets}
+    assert similar[str(results / "a_logs")] == [minors[str(results / "c_logs")]]
+    assert similar[str(results / "c_logs")] == [minors[str(results / "a_logs")]]
+    assert similar[str(results / "d_logs")] == []
+    assert not any("signature" in x for x in buckets)
+    assert not bulk_hash(str(results), jobs=1, similarity=1.0)[0]["similar"]
@@ -24,9 +24,11 @@ def test_status_01(tmp_path):
     assert status.start_time > 0
     assert status.timestamp >= status.start_time
     assert int(status.duration) == 0
+    assert status.coverage_time == 0
     assert status.ignored == 0
     assert status.iteration == 0
     assert status.log_size == 0
+    assert status.tests_evicted == 0
     assert status.rate == 0
     assert status.results == 0
 
@@ -154,12 +154,16 @@ def test_status_reporter_06(tmp_path):
     assert "Iteration" in output
     assert "Rate" in output
     assert "Results" in output
+    assert "Coverage" not in output
+    assert "Evicted" not in output
     assert "EXPIRED" not in output
     # multiple reports
     status = Status.start()
+    status.coverage_time = 12.5
     status.ignored = 1
     status.iteration = 432422
     status.results = 123
+    status.tests_evicted = 7
     status.report(force=True)
     rptr = StatusReporter.load()
     rptr._sys_info = _fake_sys_info
@@ -167,6 +171,8 @@ def test_status_reporter_06(tmp_path):
     output = rptr._specific()
     lines = output.split("\n")[:-1]
     assert len(lines) == 4
+    assert "Coverage: 12.5s" in output
+    assert "Evicted: 7" in output
     assert "Ignored" in output
     assert "Iteration" in output
     assert "Rate" in output
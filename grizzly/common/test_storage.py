@@ -9,7 +9,7 @@ import os
 
 import pytest
 
-from .storage import InputFile, TestCase, TestFile, TestFileExists
+from .storage import BlobStore, InputFile, PackError, TestCase, TestFile, TestFileExists
 
 
 def test_testcase_01(tmp_path):
@@ -169,6 +169,37 @@ def test_inputfile_02(tmp_path):
     finally:
         in_file.close()
 
+def test_inputfile_03(tmp_path):
+    """test InputFile using mmap"""
+    tfile = tmp_path / "testfile.bin"
+    tfile.write_bytes(b"test")
+    in_file = InputFile(str(tfile), use_mmap=True)
+    try:
+        assert in_file._fp is None
+        assert in_file.get_data() == b"test"
+        assert in_file._fp is not None
+        assert in_file.get_fp().read() == b"test"
+        buf = in_file.get_buffer()
+        assert buf.readonly
+        assert buf.tobytes() == b"test"
+        # close with buffer in use
+        in_file.close()
+        assert in_file._fp is None
+        assert buf.tobytes() == b"test"
+        buf.release()
+        # empty file
+        tfile.write_bytes(b"")
+        assert in_file.get_data() == b""
+        assert in_file.get_buffer().tobytes() == b""
+    finally:
+        in_file.close()
+    # get_buffer() without mmap
+    in_file = InputFile(str(tfile))
+    try:
+        assert in_file.get_buffer().tobytes() == b""
+    finally:
+        in_file.close()
+
 def test_testfile_01():
     """test simple TestFile"""
     tfile = TestFile("test_file.txt")
@@ -272,3 +303,424 @@ def test_testfile_07(tmp_path):
         assert tfile.data == b"foobar"
     finally:
         tfile.close()
+
+def test_testfile_08(tmp_path):
+    """test TestFile.clone() copy-on-write"""
+    tf1 = TestFile.from_data(b"foo", "a.txt")
+    tf2 = tf1.clone()
+    tf3 = tf2.clone()
+    try:
+        # data is shared until modified
+        assert tf1._fp is tf2._fp
+        assert tf1._fp is tf3._fp
+        assert tf1._blob.refs == 3
+        assert tf3.data == b"foo"
+        tf3.dump(str(tmp_path))
+        assert (tmp_path / "a.txt").read_bytes() == b"foo"
+        # modify original
+        tf1.write(b"bar")
+        assert tf1._fp is not tf2._fp
+        assert tf1.data == b"foobar"
+        assert tf2.data == b"foo"
+        assert tf2._blob.refs == 2
+        # close shared
+        tf2.close()
+        assert not tf3._fp.closed
+        assert tf3.size == 3
+        tf3.write(b"baz")
+        assert tf3.data == b"foobaz"
+        tf3.close()
+        assert tf3.closed
+        assert tf3._fp.closed
+        with pytest.raises(ValueError, match="closed TestFile"):
+            tf3.write(b"x")
+    finally:
+        tf1.close()
+        tf2.close()
+        tf3.close()
+    assert tf1._fp.closed
+
+def test_testfile_09(tmp_path):
+    """test TestFile.dump() with link"""
+    tf1 = TestFile.from_data(b"foo", "a.txt")
+    tf2 = tf1.clone()
+    try:
+        (tmp_path / "1").mkdir()
+        (tmp_path / "2").mkdir()
+        tf1.dump(str(tmp_path / "1"), link=True)
+        tf2.dump(str(tmp_path / "2"), link=True)
+        assert (tmp_path / "2" / "a.txt").read_bytes() == b"foo"
+        assert (tmp_path / "1" / "a.txt").stat().st_ino == (tmp_path / "2" / "a.txt").stat().st_ino
+        # dump again to existing link
+        tf2.dump(str(tmp_path / "2"), link=True)
+        assert (tmp_path / "2" / "a.txt").stat().st_nlink == 2
+        # modified data
+        tf2.write(b"bar")
+        tf2.dump(str(tmp_path / "2"), link=True)
+        assert (tmp_path / "1" / "a.txt").read_bytes() == b"foo"
+        assert (tmp_path / "2" / "a.txt").read_bytes() == b"foobar"
+        # previous dump removed
+        (tmp_path / "1" / "a.txt").unlink()
+        (tmp_path / "3").mkdir()
+        tf1.dump(str(tmp_path / "3"), link=True)
+        assert (tmp_path / "3" / "a.txt").read_bytes() == b"foo"
+    finally:
+        tf1.close()
+        tf2.close()
+
+def test_testfile_10():
+    """test TestFile.write() appends when the position has been moved by a reader"""
+    tfile = TestFile.from_data(b"foobar", "a.txt")
+    try:
+        tfile._fp.seek(0)
+        tfile._fp.read(3)
+        tfile.write(b"123")
+        assert tfile.data == b"foobar123"
+        assert tfile.size == 9
+        tfile._fp.seek(0)
+        tfile.write(b"4")
+        assert tfile.data == b"foobar1234"
+        assert tfile.size == len(tfile.data)
+    finally:
+        tfile.close()
+
+def test_blobstore_01(tmp_path):
+    """test BlobStore"""
+    store = BlobStore()
+    src = tmp_path / "src.txt"
+    src.write_bytes(b"foo")
+    tf1 = TestFile.from_data(b"foo", "a.txt")
+    tf2 = TestFile.from_file(str(src), "b.txt")
+    tf3 = TestFile.from_data(b"bar", "c.txt")
+    try:
+        assert tf1.digest == tf2.digest
+        assert tf1.digest != tf3.digest
+        store.add(tf1)
+        assert tf1 in store
+        assert tf2 not in store
+        assert len(store) == 1
+        # data shared with existing blob
+        fp2 = tf2._fp
+        store.add(tf2)
+        assert fp2.closed
+        assert tf1._fp is tf2._fp
+        assert len(store) == 1
+        store.add(tf2)
+        assert tf1._blob.refs == 2
+        store.add(tf3)
+        assert len(store) == 2
+        assert store.size == 6
+        # modified after being added
+        tf3.write(b"baz")
+        assert tf3 not in store
+        assert len(store) == 1
+        assert tf3.data == b"barbaz"
+        # remove unused
+        tf1.close()
+        assert len(store) == 1
+        tf2.close()
+        assert not store
+        with pytest.raises(AssertionError, match="closed TestFile"):
+            store.add(tf1)
+    finally:
+        tf1.close()
+        tf2.close()
+        tf3.close()
+
+def test_testcase_07(tmp_path):
+    """test TestCase.deduplicate(), TestCase.dump() and TestCase.dump_all() with link"""
+    store = BlobStore()
+    tcs = list()
+    try:
+        for idx in range(3):
+            tcase = TestCase("land.html", "redirect.html", "test-adapter")
+            tcase.add_from_data("harness", "harness.html", required=False)
+            tcase.add_from_data("harness", "harness_copy.html", required=False)
+            tcase.add_from_data("test_%d" % (idx,), "land.html")
+            tcase.add_meta(TestFile.from_data("prefs", "prefs.js"))
+            tcase.deduplicate(store)
+            tcs.append(tcase)
+        assert len(store) == 5
+        for idx, tcase in enumerate(tcs):
+            dst = tmp_path / str(idx)
+            dst.mkdir()
+            tcase.dump(str(dst), include_details=True, link=True)
+        # links are only created within a single dump
+        assert (tmp_path / "2" / "harness.html").stat().st_nlink == 2
+        assert (tmp_path / "2" / "harness_copy.html").read_text() == "harness"
+        harness_ino = (tmp_path / "1" / "harness.html").stat().st_ino
+        assert harness_ino != (tmp_path / "2" / "harness.html").stat().st_ino
+        assert (tmp_path / "2" / "prefs.js").stat().st_nlink == 1
+        assert (tmp_path / "2" / "land.html").stat().st_nlink == 1
+        assert (tmp_path / "2" / "land.html").read_text() == "test_2"
+        # without link data is copied
+        dst = tmp_path / "copy"
+        dst.mkdir()
+        tcs[0].dump(str(dst))
+        assert (dst / "harness.html").stat().st_nlink == 1
+        assert (dst / "harness_copy.html").read_text() == "harness"
+        # links are created across all test cases written by dump_all()
+        dumps = list()
+        for idx, tcase in enumerate(tcs):
+            dst = tmp_path / ("all_%d" % (idx,))
+            dst.mkdir()
+            dumps.append((tcase, str(dst)))
+        TestCase.dump_all(dumps, include_details=True, link=True)
+        harness_ino = (tmp_path / "all_0" / "harness.html").stat().st_ino
+        for idx in range(3):
+            assert (tmp_path / ("all_%d" % (idx,)) / "harness.html").stat().st_ino == harness_ino
+            assert (tmp_path / ("all_%d" % (idx,)) / "harness_copy.html").stat().st_ino == harness_ino
+            assert (tmp_path / ("all_%d" % (idx,)) / "land.html").stat().st_nlink == 1
+        assert (tmp_path / "all_0" / "harness.html").stat().st_nlink == 6
+        assert (tmp_path / "all_2" / "prefs.js").stat().st_nlink == 3
+        assert (tmp_path / "all_2" / "land.html").read_text() == "test_2"
+        assert all(x._blob.dumped is None for x in tcs[0]._files.optional)
+    finally:
+        for tcase in tcs:
+            tcase.cleanup()
+    assert not store
+
+def test_testcase_08():
+    """test TestCase lookups and tracked data size"""
+    tcase = TestCase("land.html", "redirect.html", "test-adapter")
+    try:
+        assert "a.js" not in tcase
+        assert tcase.get_file("a.js") is None
+        assert not tcase.is_optional("a.js")
+        tcase.add_from_data("123", "a.js", required=False)
+        tcase.add_from_data("1234", "land.html")
+        tcase.add_meta(TestFile.from_data("12345", "prefs.js"))
+        assert "a.js" in tcase
+        assert tcase.is_optional("a.js")
+        assert not tcase.is_optional("land.html")
+        assert tcase.get_file("land.html").data == b"1234"
+        assert tcase.data_size == 12
+        # size is updated when a test file is modified
+        tcase.get_file("land.html").write(b"56")
+        assert tcase.data_size == 14
+        # TestFile can only belong to one TestCase
+        other = TestCase("land.html", "redirect.html", "test-adapter")
+        with pytest.raises(AssertionError, match="belongs to another TestCase"):
+            other.add_file(tcase.get_file("land.html"))
+        other.add_file(tcase.get_file("land.html").clone())
+        assert other.data_size == 6
+        other.cleanup()
+        # purged files are removed from lookups
+        tcase.purge_optional([])
+        assert "a.js" not in tcase
+        assert tcase.data_size == 11
+        tcase.add_from_data("1", "a.js")
+        assert not tcase.is_optional("a.js")
+    finally:
+        tcase.cleanup()
+
+def test_testcase_09():
+    """test TestCase file lookups and data size tracking"""
+    tcase = TestCase("land.html", "redirect.html", "test-adapter")
+    try:
+        assert tcase.data_size == 0
+        assert "missing.js" not in tcase
+        assert tcase.get_file("missing.js") is None
+        assert not tcase.is_optional("missing.js")
+        for idx in range(10):
+            tcase.add_from_data("x" * idx, "%d/file_%d.js" % (idx % 2, idx), required=idx % 2 == 0)
+        tcase.add_meta(TestFile.from_data("meta", "prefs.js"))
+        assert tcase.data_size == sum(range(10)) + 4
+        for idx in range(10):
+            file_name = "%d/file_%d.js" % (idx % 2, idx)
+            assert file_name in tcase
+            assert tcase.get_file(file_name).file_name == file_name
+            assert tcase.get_file(file_name).data == b"x" * idx
+            assert tcase.is_optional(file_name) == bool(idx % 2)
+        assert "prefs.js" in tcase
+        assert not tcase.is_optional("prefs.js")
+        # writing to a file updates the size
+        tcase.get_file("0/file_0.js").write(b"abc")
+        assert tcase.data_size == sum(range(10)) + 7
+        # removing optional files updates the size and lookups
+        tcase.purge_optional(["1/file_1.js"])
+        assert list(tcase.optional) == ["1/file_1.js"]
+        assert tcase.data_size == sum(range(0, 10, 2)) + 1 + 7
+        assert "1/file_3.js" not in tcase
+        assert tcase.get_file("1/file_3.js") is None
+        assert not tcase.is_optional("1/file_3.js")
+        assert tcase.is_optional("1/file_1.js")
+        # a removed name can be added again
+        tcase.add_from_data("y", "1/file_3.js", required=True)
+        assert not tcase.is_optional("1/file_3.js")
+        assert tcase.data_size == sum(range(0, 10, 2)) + 1 + 7 + 1
+    finally:
+        tcase.cleanup()
+
+
+@pytest.mark.benchmark
+def test_testcase_benchmark_01(tmp_path):
+    """benchmark TestCase with 10k files (compare using --durations)"""
+    count = 10000
+    tcase = TestCase("land.html", "redirect.html", "test-adapter")
+    try:
+        for idx in range(count):
+            tcase.add_from_data(b"x", "%d/file_%05d.js" % (idx % 100, idx), required=idx % 2 == 0)
+        for idx in range(count):
+            assert "%d/file_%05d.js" % (idx % 100, idx) in tcase
+            assert tcase.is_optional("%d/file_%05d.js" % (idx % 100, idx)) == bool(idx % 2)
+            assert tcase.data_size == count
+        tcase.dump(str(tmp_path))
+        assert len(os.listdir(str(tmp_path))) == 100
+        tcase.purge_optional(x for x in tcase.optional if x.endswith("1.js"))
+        assert len(list(tcase.optional)) == count // 10
+        assert tcase.data_size == count // 2 + count // 10
+    finally:
+        tcase.cleanup()
+
+def test_testcase_10(tmp_path, mocker):
+    """test TestCase.dump() using threads and shared data"""
+    mocker.patch.object(TestCase, "DUMP_THREADED_MIN", 2)
+    store = BlobStore()
+    tcase = TestCase("land.html", "redirect.html", "test-adapter")
+    try:
+        for idx in range(10):
+            tcase.add_from_data("data_%d" % (idx % 3,), "d%d/f_%d.js" % (idx % 2, idx), required=idx % 2 == 0)
+        tcase.add_meta(TestFile.from_data("data_0", "prefs.js"))
+        tcase.deduplicate(store)
+        assert len(store) == 3
+        for link in (False, True):
+            dst = tmp_path / str(link)
+            dst.mkdir()
+            tcase.dump(str(dst), include_details=True, link=link)
+            for idx in range(10):
+                dumped = dst / ("d%d" % (idx % 2,)) / ("f_%d.js" % (idx,))
+                assert dumped.read_text() == "data_%d" % (idx % 3,)
+            assert (dst / "prefs.js").read_text() == "data_0"
+            assert (dst / "test_info.json").is_file()
+            nlink = (dst / "prefs.js").stat().st_nlink
+            assert nlink == (5 if link else 1)
+    finally:
+        tcase.cleanup()
+
+
+def test_testcase_11(tmp_path):
+    """test TestCase.pack() and TestCase.from_pack()"""
+    pack = tmp_path / "test.pack"
+    src = TestCase("land.html", "redirect.html", "test-adapter", input_fname="in.bin")
+    try:
+        src.duration = 1.5
+        src.add_environ_var("TEST_ENV", "1")
+        src.add_from_data("land", "land.html")
+        src.add_from_data("", "empty.js")
+        src.add_from_data("opt", "nested/opt.js", required=False)
+        src.add_meta(TestFile.from_data("prefs", "prefs.js"))
+        with pack.open("wb") as out_fp:
+            offsets = src.pack(out_fp, include_details=True)
+    finally:
+        src.cleanup()
+    assert set(offsets) == {"land.html", "empty.js", "nested/opt.js", "prefs.js"}
+    data = pack.read_bytes()
+    assert data.startswith(TestCase.PACK_MAGIC)
+    assert data.endswith(TestCase.PACK_MAGIC)
+    offset, size = offsets["nested/opt.js"]
+    assert data[offset:offset + size] == b"opt"
+    dst = TestCase.from_pack(str(pack))
+    try:
+        assert dst.adapter_name == "test-adapter"
+        assert dst.duration == 1.5
+        assert list(dst.env_vars) == ["TEST_ENV=1"]
+        assert dst.input_fname == "in.bin"
+        assert dst.landing_page == "land.html"
+        assert dst.redirect_page == "redirect.html"
+        assert dst.get_file("land.html").data == b"land"
+        assert dst.get_file("empty.js").data == b""
+        assert dst.is_optional("nested/opt.js")
+        assert dst.get_file("nested/opt.js").data == b"opt"
+        assert any(x.file_name == "prefs.js" for x in dst._files.meta)
+    finally:
+        dst.cleanup()
+    # meta files are excluded by default
+    src = TestCase("land.html", None, "test-adapter")
+    try:
+        src.add_meta(TestFile.from_data("prefs", "prefs.js"))
+        with pack.open("wb") as out_fp:
+            assert not src.pack(out_fp)
+    finally:
+        src.cleanup()
+    dst = TestCase.from_pack(str(pack))
+    try:
+        assert not dst._files.meta
+        assert dst.redirect_page is None
+    finally:
+        dst.cleanup()
+
+
+def test_testcase_12(tmp_path):
+    """test TestCase.read_pack_index() with invalid data"""
+    pack = tmp_path / "test.pack"
+    src = TestCase("land.html", None, "test-adapter")
+    try:
+        src.add_from_data("land", "land.html")
+        with pack.open("wb") as out_fp:
+            src.pack(out_fp)
+    finally:
+        src.cleanup()
+    good = pack.read_bytes()
+    footer_size = TestCase.PACK_FOOTER.size + len(TestCase.PACK_MAGIC)
+    index_start = len(good) - footer_size - TestCase.PACK_FOOTER.unpack(
+        good[-footer_size:-len(TestCase.PACK_MAGIC)])[1]
+    bad_entry = json.loads(good[index_start:-footer_size].decode("utf-8"))
+    bad_entry["files"][0][3] = 1000
+    bad_entry = json.dumps(bad_entry).encode("utf-8")
+    tests = (
+        (b"", "too small"),
+        (b"X" + good[1:], "header"),
+        (good[:-1] + b"X", "footer"),
+        (good[:8] + good[12:], "index location"),
+        (good[:index_start] + b"X" * (len(good) - index_start - footer_size) + good[-footer_size:],
+         "Invalid packed test case index$"),
+        (good[:index_start] + bad_entry
+         + TestCase.PACK_FOOTER.pack(index_start, len(bad_entry)) + TestCase.PACK_MAGIC,
+         "file entry"))
+    for data, msg in tests:
+        pack.write_bytes(data)
+        with pytest.raises(PackError, match=msg):
+            TestCase.from_pack(str(pack))
+
+
+def test_testcase_13(mocker, tmp_path):
+    """test TestCase.from_pack() closes all TestFiles on failure"""
+    pack = tmp_path / "test.pack"
+    src = TestCase("land.html", None, "test-adapter")
+    try:
+        src.add_from_data("land", "land.html")
+        with pack.open("wb") as out_fp:
+            src.pack(out_fp)
+    finally:
+        src.cleanup()
+    good = pack.read_bytes()
+    footer_size = TestCase.PACK_FOOTER.size + len(TestCase.PACK_MAGIC)
+    index_start = len(good) - footer_size - TestCase.PACK_FOOTER.unpack(
+        good[-footer_size:-len(TestCase.PACK_MAGIC)])[1]
+    index = json.loads(good[index_start:-footer_size].decode("utf-8"))
+    index["files"].append(index["files"][0])
+    index = json.dumps(index).encode("utf-8")
+    pack.write_bytes(good[:index_start] + index
+                     + TestCase.PACK_FOOTER.pack(index_start, len(index)) + TestCase.PACK_MAGIC)
+    close = mocker.spy(TestFile, "close")
+    # duplicate entry, the second TestFile is never added to the TestCase
+    with pytest.raises(TestFileExists):
+        TestCase.from_pack(str(pack))
+    assert close.call_count == 2
+    assert all(call[0][0].closed for call in close.call_args_list)
+    # data ends mid-entry
+    close.reset_mock()
+    mocker.patch("grizzly.common.storage.TestFile.XFER_BUF", 1)
+    real_open = open
+
+    def _truncated(*args, **kwargs):
+        in_fp = real_open(*args, **kwargs)
+        read = in_fp.read
+        mocker.patch.object(in_fp, "read", side_effect=lambda size: read(size) if size > 1 else b"")
+        return in_fp
+    mocker.patch("grizzly.common.storage.open", side_effect=_truncated, create=True)
+    with pytest.raises(PackError, match="Unexpected end of data"):
+        TestCase.from_pack(str(pack))
+    assert close.call_count == 1
+    assert close.call_args_list[0][0][0].closed
@@ -24,8 +24,9 @@ import os
 
 import grizzly.adapters
 from .args import GrizzlyArgs
-from .common import FilesystemReporter, FuzzManagerReporter, IOManager, S3FuzzManagerReporter
-from .session import Session
+from .common import FilesystemReporter, FuzzManagerReporter, init_logging, IOManager, Profiler, \
+    S3FuzzManagerReporter, SCHEDULERS
+from .session import AdaptiveRelaunch, AdaptiveTimeout, CoverageScheduler, Session
 from .target import load as load_target, TargetLaunchError, TargetLaunchTimeout
 
 
@@ -42,7 +43,8 @@ def console_init_logging():
     if bool(os.getenv("DEBUG")):
         log_level = logging.DEBUG
         log_fmt = "%(levelname).1s %(name)s [%(asctime)s] %(message)s"
-    logging.basicConfig(format=log_fmt, datefmt="%Y-%m-%d %H:%M:%S", level=log_level)
+    # formatting and output is performed on a background thread
+    init_logging(log_level, log_fmt)
 
 
 def console_main():
@@ -71,13 +73,18 @@ def main(args):
 
     adapter = None
     iomanager = None
+    profiler = None
     session = None
     target = None
     try:
         log.debug("initializing the IOManager")
         iomanager = IOManager(
             report_size=(max(args.cache, 0) + 1),
+            input_cache=args.input_cache * 1048576,
+            report_limit=args.cache_limit * 1048576,
+            input_mmap=args.input_mmap,
             mime_type=args.mime,
+            scheduler=SCHEDULERS[args.input_scheduler](),
             working_path=args.working_path)
 
         log.debug("initializing Adapter %r", args.adapter)
@@ -91,7 +98,8 @@ def main(args):
             iomanager.scan_input(
                 args.input,
                 accepted_extensions=args.accepted_extensions,
-                sort=adapter.ROTATION_PERIOD == 0)
+                sort=adapter.ROTATION_PERIOD == 0,
+                use_index=args.corpus_index)
         log.info("Found %d input files(s)", len(iomanager.input_files))
 
         if adapter.ROTATION_PERIOD == 0:
@@ -122,6 +130,7 @@ def main(args):
             valgrind=args.valgrind,
             xvfb=args.xvfb)
         adapter.monitor = target.monitor
+        adapter.scheduler = iomanager.scheduler
         if args.soft_asserts:
             target.add_abort_token("###!!! ASSERTION:")
 
@@ -138,9 +147,36 @@ def main(args):
             log.info("Results will be reported via FuzzManager w/ large attachments in S3")
             reporter = S3FuzzManagerReporter(args.binary, tool=args.tool)
         else:
-            reporter = FilesystemReporter()
+            reporter = FilesystemReporter(similar=args.merge_similar)
             log.info("Results will be stored in %r", reporter.report_path)
 
+        if args.adaptive_relaunch:
+            log.info("Using adaptive relaunch (%d-%d iterations)", min(args.relaunch_min, relaunch), relaunch)
+            # try to relaunch before the memory limit is hit
+            relaunch_policy = AdaptiveRelaunch(
+                min(args.relaunch_min, relaunch),
+                relaunch,
+                memory_limit=int(target.memory_limit * 0.9))
+        else:
+            relaunch_policy = None
+
+        if args.coverage:
+            coverage_scheduler = CoverageScheduler(
+                iterations=args.coverage_iterations,
+                interval=args.coverage_interval)
+        else:
+            coverage_scheduler = None
+
+        if args.adaptive_timeout:
+            log.info("Using adaptive iteration timeout (%d-%ds)", adapter.TEST_DURATION, args.timeout)
+            timeout_policy = AdaptiveTimeout(adapter.TEST_DURATION, args.timeout)
+        else:
+            timeout_policy = None
+
+        if args.profile:
+            log.info("Profiling (%s) every %ds", args.profile, args.profile_period)
+            profiler = Profiler(args.profile, args.profile_period, working_path=args.working_path)
+
         log.debug("initializing the Session")
         if bool(os.getenv("DEBUG")):
             display_mode = Session.DISPLAY_VERBOSE
@@ -153,11 +189,18 @@ def main(args):
             iomanager,
             reporter,
             target,
-            display_mode=display_mode)
+            display_mode=display_mode,
+            coverage_scheduler=coverage_scheduler,
+            profiler=profiler,
+            relaunch_policy=relaunch_policy,
+            serve_packed=args.serve_packed,
+            timeout_policy=timeout_policy)
 
         session.config_server(args.timeout)
         target.reverse(session.server.get_port(), session.server.get_port())
 
+        if profiler is not None:
+            profiler.start()
         session.run()
 
     except KeyboardInterrupt:
@@ -168,6 +211,8 @@ def main(args):
 
     finally:
         log.warning("Shutting down...")
+        if profiler is not None:
+            profiler.stop()
         if session is not None:
             session.close()
         if target is not None:
@@ -175,6 +220,11 @@ def main(args):
         if adapter is not None:
             adapter.cleanup()
         if iomanager is not None:
+            if iomanager.input_cache is not None:
+                log.info("Input cache hit rate: %0.1f%% (%d/%d)",
+                         iomanager.input_cache.hit_rate * 100,
+                         iomanager.input_cache.hits,
+                         iomanager.input_cache.hits + iomanager.input_cache.misses)
             iomanager.cleanup()
 
     return Session.EXIT_SUCCESS
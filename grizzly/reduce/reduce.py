@@ -28,7 +28,9 @@ from FTB.Signatures.CrashInfo import CrashSignature
 from . import strategies as strategies_module, testcase_contents
 from .exceptions import CorruptTestcaseError, NoTestcaseError, ReducerError
 from ..session import Session
-from ..common import FilesystemReporter, FuzzManagerReporter, ReducerStats, Report, Status, TestCase, TestFile
+from ..common import FilesystemReporter, FuzzManagerReporter, LogQueue, ReducerStats, Report, Status, \
+    TestCase, TestFile
+from ..common.storage import PackError
 from ..target import Target, load as load_target
 
 
@@ -245,7 +247,7 @@ class ReductionJob(object):
     __slots__ = [
         '_any_crash', '_best_testcase', '_cache_iter_harness_created', '_env_mod',
         '_fixed_timeout', '_force_no_harness', '_idle_poll', '_idle_threshold', '_idle_timeout', '_ignore',
-        '_input_fname', '_interesting_prefix', '_iter_timeout', '_landing_page', '_log_handler',
+        '_input_fname', '_interesting_prefix', '_iter_timeout', '_landing_page', '_log_capture',
         '_min_crashes', '_no_harness', '_orig_sig', '_original_relaunch', '_other_crashes',
         '_reduce_file', '_repeat', '_reporter', '_result_cache', '_result_code', '_server', '_signature',
         '_skip', '_skip_analysis', '_skipped', '_status', '_target', '_tcroot', '_testcase', '_tmpdir',
@@ -297,7 +299,7 @@ class ReductionJob(object):
         self._use_result_cache = testcase_cache
         self._tmpdir = tempfile.mkdtemp(prefix="grzreduce", dir=working_path)
         self._tcroot = os.path.join(self._tmpdir, "tc")
-        self._log_handler = self._start_log_capture()
+        self._log_capture = self._start_log_capture()
         if not self._skip_analysis:
             # see if any of the args tweaked by analysis were overridden
             # --relaunch is regarded as a maximum, so overriding the default is not a deal-breaker for this
@@ -545,33 +547,41 @@ class ReductionJob(object):
 
     def _start_log_capture(self):
         """Add a log handler for grizzly and lithium messages generated during this job.
-        The handler is removed again by close()
+        The handler is removed again by close(). Records are written to the log file by
+        a background thread.
 
         Args:
             None
 
         Returns:
-            logging.Handler: The log handler to be removed later.
+            tuple: The LogQueue used and the original levels of the watched loggers.
         """
         formatter = logging.Formatter("%(levelname).1s %(name)s [%(asctime)s] %(message)s")
         handler = logging.FileHandler(os.path.join(self._tmpdir, "reducelog.txt"))
         handler.setLevel(logging.DEBUG)
         handler.setFormatter(formatter)
-        for logname in self.LOGGERS_TO_WATCH:
-            logging.getLogger(logname).addHandler(handler)
+        log_queue = LogQueue(handler)
+        log_queue.start()
 
         # check that DEBUG messages will actually get through
-        # if the root logger level is > DEBUG, messages will not get through to our log handler
-        # set root to DEBUG, and propagate the old root level to each root handler
+        # only the watched loggers are set to DEBUG so records from other loggers
+        # are not created, the old root level is propagated to each root handler
+        # so DEBUG records are not formatted and output there
         root_logger = logging.getLogger()
         root_level = root_logger.getEffectiveLevel()
         if root_level > logging.DEBUG:
-            root_logger.setLevel(logging.DEBUG)
             for root_handler in root_logger.handlers:
                 if root_handler.level < root_level:
                     root_handler.setLevel(root_level)
+        levels = dict()
+        for logname in self.LOGGERS_TO_WATCH:
+            logger = logging.getLogger(logname)
+            levels[logname] = logger.level
+            logger.addHandler(log_queue.handler)
+            if logger.getEffectiveLevel() > logging.DEBUG:
+                logger.setLevel(logging.DEBUG)
 
-        return handler
+        return log_queue, levels
 
     def _get_location(self):
         if self._no_harness:
@@ -758,13 +768,15 @@ class ReductionJob(object):
         Returns:
             None
         """
-        if self._log_handler is None:
+        if self._log_capture is None:
             return
+        log_queue, levels = self._log_capture
         for logname in self.LOGGERS_TO_WATCH:
-            logging.getLogger(logname).removeHandler(self._log_handler)
-        self._log_handler.flush()
-        self._log_handler.close()
-        self._log_handler = None
+            logger = logging.getLogger(logname)
+            logger.removeHandler(log_queue.handler)
+            logger.setLevel(levels[logname])
+        log_queue.close()
+        self._log_capture = None
 
     def config_environ(self, environ):
         with open(environ) as in_fp:
@@ -840,12 +852,25 @@ class ReductionJob(object):
         path = os.path.relpath(path, self._tcroot)
         return '/' + '/'.join(path.split(os.sep))
 
+    @staticmethod
+    def _is_packed(testcase):
+        """Check if a file is a packed test case (see TestCase.pack()).
+
+        Args:
+            testcase (str): Path to file.
+
+        Returns:
+            bool: True if the file starts with TestCase.PACK_MAGIC otherwise False.
+        """
+        with open(testcase, "rb") as in_fp:
+            return in_fp.read(len(TestCase.PACK_MAGIC)) == TestCase.PACK_MAGIC
+
     def config_testcase(self, testcase):
         """Prepare a user provided testcase for reduction.
 
         Args:
-            testcase (str): Path to a testcase. This should be a Grizzly testcase (zip or folder) or html
-                            file.
+            testcase (str): Path to a testcase. This should be a Grizzly testcase (zip, packed test
+                            case or folder) or html file.
 
         Returns:
             None
@@ -868,8 +893,18 @@ class ReductionJob(object):
                             zip_fp.extractall(path=self._tcroot)
                     except (zlib.error, zipfile.BadZipfile):
                         raise CorruptTestcaseError("Testcase is corrupted")
+                elif self._is_packed(testcase):
+                    os.mkdir(self._tcroot)
+                    try:
+                        packed = TestCase.from_pack(testcase)
+                    except PackError:
+                        raise CorruptTestcaseError("Testcase is corrupted")
+                    try:
+                        packed.dump(self._tcroot, include_details=True)
+                    finally:
+                        packed.cleanup()
                 else:
-                    raise ReducerError("Testcase must be zip, html, or directory")
+                    raise ReducerError("Testcase must be zip, html, packed test case, or directory")
             elif os.path.isdir(testcase):
                 shutil.copytree(testcase, self._tcroot)
             else:
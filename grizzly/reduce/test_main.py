@@ -97,8 +97,10 @@ def test_parse_args(capsys, tmp_path):
         ReducerArgs().parse_args([str(exe), str(inp), arg, "10"])
 
 
-def test_main(tmp_path):  # noqa pylint: disable=redefined-outer-name
+def test_main(monkeypatch, tmp_path):  # noqa pylint: disable=redefined-outer-name
     "simple test that main functions"
+    # results are written to "results" in the current working directory
+    monkeypatch.chdir(tmp_path)
 
     (tmp_path / "binary").touch()
     exe = tmp_path / "binary"
@@ -111,8 +113,9 @@ def test_main(tmp_path):  # noqa pylint: disable=redefined-outer-name
     assert TestMainReductionJob.main(args) == 0
 
 
-def test_main_prefs(tmp_path):
+def test_main_prefs(monkeypatch, tmp_path):
     "cmd line prefs should override prefs in the testcase"
+    monkeypatch.chdir(tmp_path)
     run_called = [0]
 
     class MyReductionJob(TestMainReductionJob):
@@ -432,6 +435,7 @@ def test_crash_main_no_repro_specific(monkeypatch, tmp_path):  # noqa pylint: di
 
 def test_environ_and_suppressions(monkeypatch, tmp_path):
     ""
+    monkeypatch.chdir(tmp_path)
     run_called = [0]
 
     class MyReductionJob(TestMainReductionJob):
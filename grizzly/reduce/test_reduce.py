@@ -9,7 +9,7 @@ import os.path
 import zipfile
 import pytest
 from grizzly.reduce import exceptions, strategies
-from grizzly.common import FuzzManagerReporter
+from grizzly.common import FuzzManagerReporter, TestCase, TestFile
 from .test_common import BaseFakeReporter, TestReductionJob
 from .test_common import TestReductionJobAlt, TestReductionJobKeepHarness, TestReductionJobSemiReliable
 
@@ -30,7 +30,7 @@ def test_config_testcase_1(tmp_path):
         tmp_file.touch()
         with pytest.raises(exceptions.ReducerError) as exc:
             job.config_testcase(str(tmp_file))
-        assert "Testcase must be zip, html, or directory" in str(exc.value)
+        assert "Testcase must be zip, html, packed test case, or directory" in str(exc.value)
         tmp_file.unlink()
         assert job.result_code == FuzzManagerReporter.QUAL_REDUCER_ERROR
 
@@ -56,6 +56,16 @@ def test_config_testcase_3(tmp_path):
         assert job.result_code == FuzzManagerReporter.QUAL_REDUCER_ERROR
 
 
+def test_config_testcase_3_packed(tmp_path):
+    """bad packed test case fails config_testcase"""
+    with TestReductionJob(tmp_path, create_binary=False) as job:
+        test_pack = tmp_path / "test.bin"
+        test_pack.write_bytes(TestCase.PACK_MAGIC + b"junk")
+        with pytest.raises(exceptions.CorruptTestcaseError):
+            job.config_testcase(str(test_pack))
+        assert job.result_code == FuzzManagerReporter.QUAL_REDUCER_ERROR
+
+
 def test_config_testcase_4(tmp_path):
     """missing landing page causes failure"""
     with TestReductionJob(tmp_path, create_binary=False) as job:
@@ -123,6 +133,26 @@ def test_config_testcase_6_legacy(tmp_path):
         assert job.result_code is None
 
 
+def test_config_testcase_6_packed(tmp_path):
+    """single packed testcase is loaded ok"""
+    with TestReductionJob(tmp_path, create_binary=False) as job:
+        test = TestCase("test.html", None, "test-adapter")
+        try:
+            test.add_from_data("hello", "test.html")
+            test.add_meta(TestFile.from_data("user_pref('a.b', 1);", "prefs.js"))
+            with (tmp_path / "test.bin").open("wb") as out_fp:
+                test.pack(out_fp, include_details=True)
+        finally:
+            test.cleanup()
+        job.config_testcase(str(tmp_path / "test.bin"))
+        assert job._testcase == os.path.join(job._tcroot, "test.html")
+        with open(job._testcase) as tc_fp:
+            assert tc_fp.read() == "hello"
+        with open(job._target.prefs) as prefs_fp:
+            assert prefs_fp.read() == "user_pref('a.b', 1);"
+        assert job.result_code is None
+
+
 def test_config_testcase_7(tmp_path):
     """single testcase in numbered subdir is loaded ok"""
     with TestReductionJob(tmp_path, create_binary=False) as job:
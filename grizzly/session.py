@@ -3,7 +3,9 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+from collections import deque
 import logging
+from math import ceil, sqrt
 import os
 import shutil
 import tempfile
@@ -14,7 +16,7 @@ from .common import Status, TestFile
 from .target import TargetLaunchError, TargetLaunchTimeout
 
 
-__all__ = ("LogOutputLimiter", "Session")
+__all__ = ("AdaptiveRelaunch", "AdaptiveTimeout", "CoverageScheduler", "LogOutputLimiter", "Session")
 __author__ = "Tyson Smith"
 __credits__ = ["Tyson Smith", "Jesse Schwartzentruber"]
 
@@ -22,6 +24,243 @@ __credits__ = ["Tyson Smith", "Jesse Schwartzentruber"]
 log = logging.getLogger("grizzly")  # pylint: disable=invalid-name
 
 
+class AdaptiveRelaunch(object):
+    """Choose the number of iterations between Target relaunches that maximizes
+    the effective iteration rate. The iteration duration is modelled as
+    `a + b * i` (where `i` is the iteration since launch) and combined with the
+    measured launch cost `L`. Throughput `N / (L + a*N + b*N*N/2)` is maximized
+    when `N = sqrt(2*L/b)`. The result is clamped to [minimum, maximum] and
+    lowered further if the target exceeds memory_limit before that point. The
+    memory limited value is kept across launches and is only raised (by
+    MEMORY_GROWTH) after a full cycle completes under memory_limit.
+    """
+    DECAY = 0.5  # weight of samples from previous launches
+    MEMORY_GROWTH = 1.1  # increase of memory limited iterations after a cycle under the limit
+    MIN_SAMPLES = 10  # samples required before slowdown is estimated
+    SMOOTHING = 0.3  # weight of the most recent launch duration
+
+    def __init__(self, minimum, maximum, memory_limit=0):
+        assert 0 < minimum <= maximum
+        self.launch_duration = None  # smoothed launch duration in seconds
+        self.maximum = maximum
+        self.memory_limit = memory_limit
+        self.minimum = minimum
+        self._cycle_iters = 0  # iterations recorded since launch
+        self._exceeded = False  # memory_limit was exceeded since launch
+        self._memory_iter = None  # iteration memory_limit was exceeded
+        # weighted sums used to fit iteration duration to iteration index
+        self._n = 0.0
+        self._sx = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+        self._sy = 0.0
+
+    @property
+    def drift(self):
+        """Estimated increase in iteration duration per iteration (seconds).
+
+        Args:
+            None
+
+        Returns:
+            float: Slope of fitted iteration duration or None if not enough data.
+        """
+        if self._n < self.MIN_SAMPLES:
+            return None
+        denom = self._n * self._sxx - self._sx * self._sx
+        if denom <= 0:
+            return None
+        return (self._n * self._sxy - self._sx * self._sy) / denom
+
+    def limit(self):
+        """Calculate number of iterations to perform before the next relaunch.
+
+        Args:
+            None
+
+        Returns:
+            int: Number of iterations.
+        """
+        drift = self.drift
+        if drift is None or drift <= 0 or not self.launch_duration:
+            limit = self.maximum
+        else:
+            limit = int(round(sqrt(2.0 * self.launch_duration / drift)))
+        if self._memory_iter is not None:
+            limit = min(limit, self._memory_iter)
+        return max(min(limit, self.maximum), self.minimum)
+
+    def record_iteration(self, iteration, duration, memory=0):
+        """Record the duration of an iteration.
+
+        Args:
+            iteration (int): Number of iterations performed since launch (zero based).
+            duration (float): Time in seconds to perform iteration.
+            memory (int): Memory usage of the target in bytes.
+
+        Returns:
+            bool: True if memory_limit was exceeded and the Target should be
+                  relaunched otherwise False.
+        """
+        self._cycle_iters = max(self._cycle_iters, iteration + 1)
+        self._n += 1
+        self._sx += iteration
+        self._sxx += iteration * iteration
+        self._sxy += iteration * duration
+        self._sy += duration
+        if self.memory_limit and memory >= self.memory_limit:
+            if self._memory_iter is None or iteration < self._memory_iter:
+                log.debug("memory limit exceeded after %d iteration(s)", iteration + 1)
+                self._memory_iter = max(iteration, 1)
+            self._exceeded = True
+            return True
+        return False
+
+    def record_launch(self, duration):
+        """Record the duration of a Target launch.
+
+        Args:
+            duration (float): Time in seconds taken to launch the Target.
+
+        Returns:
+            None
+        """
+        if self.launch_duration is None:
+            self.launch_duration = duration
+        else:
+            self.launch_duration += self.SMOOTHING * (duration - self.launch_duration)
+        # prefer data from recent launches
+        self._n *= self.DECAY
+        self._sx *= self.DECAY
+        self._sxx *= self.DECAY
+        self._sxy *= self.DECAY
+        self._sy *= self.DECAY
+        # only raise the memory limited value after a full cycle under the limit
+        if self._memory_iter is not None and not self._exceeded and self._cycle_iters >= self._memory_iter:
+            self._memory_iter = int(ceil(self._memory_iter * self.MEMORY_GROWTH))
+            if self._memory_iter >= self.maximum:
+                self._memory_iter = None
+        self._cycle_iters = 0
+        self._exceeded = False
+
+
+class AdaptiveTimeout(object):
+    """Track the distribution of TestCase durations per adapter and calculate an
+    iteration timeout from a high percentile of the observed durations plus a margin.
+    The timeout is clamped to [minimum, maximum]. Until enough samples are available
+    maximum is used. Durations of iterations that timed out are not tracked (they are
+    capped by the current timeout), instead the timeout is doubled.
+    """
+    MIN_SAMPLES = 20  # samples required before the timeout is adjusted
+    UPDATE_INTERVAL = 25  # new samples required before the timeout is recalculated
+    WINDOW = 1000  # number of recent durations to track per adapter
+
+    def __init__(self, minimum, maximum, margin=5, percentile=0.99):
+        assert 0 < minimum <= maximum
+        assert 0 < percentile <= 1
+        self.margin = margin
+        self.maximum = maximum
+        self.minimum = minimum
+        self.percentile = percentile
+        self._durations = dict()  # recent durations per adapter
+        self._pending = dict()  # samples added per adapter since last calculation
+        self._timeouts = dict()  # current timeout per adapter
+
+    def _set_timeout(self, adapter_name, timeout):
+        timeout = max(min(timeout, self.maximum), self.minimum)
+        if self._timeouts.get(adapter_name) != timeout:
+            log.debug("iteration timeout for %r set to %ds", adapter_name, timeout)
+            self._timeouts[adapter_name] = timeout
+
+    def record(self, testcase, timed_out=False):
+        """Record the duration of a TestCase that has been served.
+
+        Args:
+            testcase (TestCase): TestCase that has been served.
+            timed_out (bool): Iteration hit the timeout.
+
+        Returns:
+            None
+        """
+        if timed_out:
+            if testcase.adapter_name in self._timeouts:
+                self._set_timeout(testcase.adapter_name, self._timeouts[testcase.adapter_name] * 2)
+            return
+        if testcase.duration is None:
+            return
+        if testcase.adapter_name not in self._durations:
+            self._durations[testcase.adapter_name] = deque(maxlen=self.WINDOW)
+            self._pending[testcase.adapter_name] = 0
+        durations = self._durations[testcase.adapter_name]
+        durations.append(testcase.duration)
+        self._pending[testcase.adapter_name] += 1
+        if len(durations) < self.MIN_SAMPLES:
+            return
+        if len(durations) > self.MIN_SAMPLES and self._pending[testcase.adapter_name] < self.UPDATE_INTERVAL:
+            return
+        self._pending[testcase.adapter_name] = 0
+        ordered = sorted(durations)
+        idx = min(int(ceil(len(ordered) * self.percentile)), len(ordered)) - 1
+        self._set_timeout(testcase.adapter_name, int(ceil(ordered[idx] + self.margin)))
+
+    def timeout(self, adapter_name):
+        """Get the current iteration timeout for an adapter.
+
+        Args:
+            adapter_name (str): Name of the adapter.
+
+        Returns:
+            int: Iteration timeout in seconds.
+        """
+        return self._timeouts.get(adapter_name, self.maximum)
+
+
+class CoverageScheduler(object):
+    """Batch coverage dumps. A dump is triggered once `iterations` iterations have
+    been performed or `interval` seconds have elapsed since the previous dump,
+    whichever comes first. Time spent dumping coverage is tracked.
+    """
+    def __init__(self, iterations=1, interval=0):
+        assert iterations > 0
+        assert interval >= 0
+        self.dumps = 0  # number of coverage dumps performed
+        self.duration = 0.0  # total time spent dumping coverage
+        self.interval = interval
+        self.iterations = iterations
+        self._pending = 0  # iterations performed since previous dump
+        self._time = time.time()  # time of previous dump
+
+    def dump(self, target):
+        """Trigger a coverage dump.
+
+        Args:
+            target (Target): Target to dump coverage from.
+
+        Returns:
+            None
+        """
+        start_time = time.time()
+        target.dump_coverage()
+        self._time = time.time()
+        self._pending = 0
+        self.duration += self._time - start_time
+        self.dumps += 1
+
+    def ready(self):
+        """Record an iteration and check if a coverage dump is due.
+
+        Args:
+            None
+
+        Returns:
+            bool: True if coverage should be dumped otherwise False.
+        """
+        self._pending += 1
+        if self._pending >= self.iterations:
+            return True
+        return self.interval > 0 and time.time() - self._time >= self.interval
+
+
 class LogOutputLimiter(object):
     def __init__(self, delay=300, delta_multiplier=2, verbose=False):
         self._delay = delay  # maximum time delay between output
@@ -58,16 +297,26 @@ class Session(object):
     EXIT_LAUNCH_FAILURE = 7
     TARGET_LOG_SIZE_WARN = 0x1900000  # display warning when target log files exceed limit (25MB)
 
-    def __init__(self, adapter, coverage, ignore, iomanager, reporter, target, display_mode=DISPLAY_NORMAL):
+    def __init__(self, adapter, coverage, ignore, iomanager, reporter, target, display_mode=DISPLAY_NORMAL,
+                 coverage_scheduler=None, profiler=None, relaunch_policy=None, serve_packed=False,
+                 timeout_policy=None):
         self._lol = LogOutputLimiter(verbose=display_mode == self.DISPLAY_VERBOSE)
+        self._prefs = None  # prefs.js TestFile shared by all test cases
         self.adapter = adapter
         self.coverage = coverage
+        if coverage and coverage_scheduler is None:
+            coverage_scheduler = CoverageScheduler()
+        self.coverage_scheduler = coverage_scheduler
         self.ignore = ignore
         self.iomanager = iomanager
+        self.profiler = profiler
+        self.relaunch_policy = relaunch_policy
         self.reporter = reporter
+        self.serve_packed = serve_packed  # serve test cases without unpacking them
         self.server = None
         self.status = Status.start()
         self.target = target
+        self.timeout_policy = timeout_policy
 
     def check_results(self, unserved, was_timeout):
         # attempt to detect a failure
@@ -82,9 +331,13 @@ class Session(object):
             self.status.results += 1
             log.info("Result detected")
             self.report_result()
-        elif failure_detected == self.target.RESULT_IGNORED:
-            self.status.ignored += 1
-            log.info("Ignored (%d)", self.status.ignored)
+            self.iomanager.adjust_input_weight(self.iomanager.INPUT_BOOST)
+        else:
+            if failure_detected == self.target.RESULT_IGNORED:
+                self.status.ignored += 1
+                log.info("Ignored (%d)", self.status.ignored)
+            if unserved or was_timeout:
+                self.iomanager.adjust_input_weight(self.iomanager.INPUT_DEMOTE)
 
     def config_server(self, iteration_timeout):
         assert self.server is None
@@ -109,6 +362,9 @@ class Session(object):
 
     def close(self):
         self.status.cleanup()
+        if self._prefs is not None:
+            self._prefs.close()
+            self._prefs = None
         if self.server is not None:
             self.server.close()
 
@@ -133,7 +389,9 @@ class Session(object):
         log.debug("calling self.adapter.generate()")
         self.adapter.generate(test, self.iomanager.active_input, self.iomanager.server_map)
         if self.target.prefs is not None:
-            test.add_meta(TestFile.from_file(self.target.prefs, "prefs.js"))
+            if self._prefs is None:
+                self._prefs = TestFile.from_file(self.target.prefs, "prefs.js")
+            test.add_meta(self._prefs.clone())
         # update sapphire redirects from the adapter
         for redirect in self.iomanager.server_map.redirects:
             self.server.set_redirect(redirect["url"], redirect["file_name"], redirect["required"])
@@ -142,9 +400,13 @@ class Session(object):
     def launch_target(self):
         assert self.target.closed
         launch_timeouts = 0
+        if self.relaunch_policy is not None:
+            self.target.rl_reset = self.relaunch_policy.limit()
+            log.debug("relaunch set to %d", self.target.rl_reset)
         while True:
             try:
                 log.info("Launching target")
+                start_time = time.time()
                 self.target.launch(self.location)
             except TargetLaunchError:
                 # this result likely has nothing to do with Grizzly
@@ -160,6 +422,8 @@ class Session(object):
                 if launch_timeouts < 3:
                     continue
                 raise
+            if self.relaunch_policy is not None:
+                self.relaunch_policy.record_launch(time.time() - start_time)
             break
 
     @property
@@ -188,6 +452,8 @@ class Session(object):
         while True:  # main fuzzing loop
             self.status.report()
             self.status.iteration += 1
+            if self.profiler is not None:
+                self.profiler.check()
 
             if self.target.closed:
                 self.iomanager.purge_tests()
@@ -197,17 +463,33 @@ class Session(object):
 
             # create and populate a test case
             current_test = self.generate_testcase()
+            self.status.tests_evicted = self.iomanager.tests_evicted
             if self.iomanager.active_input is not None:
                 self.status.test_name = self.iomanager.active_input.file_name
 
             # display status
             self.display_status()
 
+            if self.timeout_policy is not None:
+                self.server.timeout = self.timeout_policy.timeout(self.adapter.NAME)
+
             # use Sapphire to serve the most recent test case
+            serve_start = time.time()
             server_status, files_served = self.server.serve_testcase(
                 current_test,
                 continue_cb=self.target.monitor.is_healthy,
+                packed=self.serve_packed,
                 working_path=self.iomanager.working_path)
+            memory_exceeded = False
+            if self.relaunch_policy is not None and server_status != sapphire.SERVED_TIMEOUT:
+                memory_exceeded = self.relaunch_policy.record_iteration(
+                    self.target.rl_reset - self.target.rl_countdown - 1,
+                    time.time() - serve_start,
+                    memory=self.target.memory_usage() if self.relaunch_policy.memory_limit else 0)
+            if self.timeout_policy is not None:
+                self.timeout_policy.record(
+                    current_test,
+                    timed_out=server_status == sapphire.SERVED_TIMEOUT)
             if self.adapter.IGNORE_UNSERVED:
                 log.debug("removing unserved files from the test case")
                 current_test.purge_optional(files_served)
@@ -219,8 +501,9 @@ class Session(object):
                 log.debug("calling self.adapter.on_served()")
                 self.adapter.on_served(current_test, files_served)
 
-            if self.coverage and server_status != sapphire.SERVED_TIMEOUT:
-                self.target.dump_coverage()
+            if self.coverage and server_status != sapphire.SERVED_TIMEOUT and self.coverage_scheduler.ready():
+                self.coverage_scheduler.dump(self.target)
+                self.status.coverage_time = self.coverage_scheduler.duration
 
             # check for results and report as necessary
             self.check_results(not files_served, server_status == sapphire.SERVED_TIMEOUT)
@@ -231,7 +514,11 @@ class Session(object):
                 log.warning("Large browser logs: %dMBs", (self.status.log_size / 0x100000))
 
             # trigger relaunch by closing the browser if needed
-            self.target.check_relaunch()
+            if memory_exceeded:
+                log.debug("memory limit exceeded, relaunching target")
+                self.target.close()
+            else:
+                self.target.check_relaunch()
 
             # all test cases have been replayed
             if not self.adapter.ROTATION_PERIOD and not self.iomanager.input_files:
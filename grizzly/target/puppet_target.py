@@ -22,6 +22,8 @@ log = logging.getLogger("grizzly")  # pylint: disable=invalid-name
 
 
 class PuppetTarget(Target):
+    COVERAGE_POLL = 0.1  # delay between checks for open .gcda files
+
     def __init__(self, binary, extension, launch_timeout, log_limit, memory_limit, prefs, relaunch, **kwds):
         super(PuppetTarget, self).__init__(binary, extension, launch_timeout, log_limit,
                                            memory_limit, prefs, relaunch)
@@ -63,6 +65,24 @@ class PuppetTarget(Target):
     def closed(self):
         return self._puppet.reason is not None
 
+    def memory_usage(self):
+        # total resident set size of the browser process tree
+        pid = self._puppet.get_pid()
+        if pid is None:
+            return 0
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            return 0
+        usage = 0
+        for proc in procs:
+            try:
+                usage += proc.memory_info().rss
+            except (psutil.AccessDenied, psutil.NoSuchProcess):
+                continue
+        return usage
+
     @property
     def monitor(self):
         if self._monitor is None:
@@ -147,33 +167,41 @@ class PuppetTarget(Target):
             log.debug("Skipping coverage dump")
             return
         try:
-            for child in psutil.Process(pid).children(recursive=True):
-                log.debug("Sending SIGUSR1 to %d (child)", child.pid)
-                os.kill(child.pid, signal.SIGUSR1)
+            parent = psutil.Process(pid)
+            children = parent.children(recursive=True)
         except (psutil.AccessDenied, psutil.NoSuchProcess):
-            pass
+            parent = None
+            children = list()
+        for child in children:
+            log.debug("Sending SIGUSR1 to %d (child)", child.pid)
+            try:
+                os.kill(child.pid, signal.SIGUSR1)
+            except OSError:
+                pass
         log.debug("Sending SIGUSR1 to %d (parent)", pid)
         os.kill(pid, signal.SIGUSR1)
-        # wait for processes to write .gcno files
+        procs = list(children)
+        if parent is not None:
+            procs.append(parent)
+        # wait for processes to write .gcda files
         # this should usually take less than 1 second
+        # only the target's process tree is checked
         start_time = time.time()
         gcda_found = False
-        gcda_open = False
-        while not gcda_found or gcda_open:
-            if gcda_found and gcda_open:
-                time.sleep(0.1)
-                gcda_open = False
-            for proc in psutil.process_iter(attrs=["pid", "ppid", "open_files"]):
-                if proc.info["pid"] == pid or proc.info["ppid"] == pid:
-                    if proc.info["open_files"] is None:
-                        continue
-                    for ofile in proc.info["open_files"]:
-                        if ofile.path.endswith(".gcda"):
-                            gcda_found = True
-                            gcda_open = True
-                            break
-                    if gcda_open:
-                        break
+        while True:
+            gcda_open = False
+            for proc in procs:
+                try:
+                    open_files = proc.open_files()
+                except (psutil.AccessDenied, psutil.NoSuchProcess):
+                    continue
+                if any(ofile.path.endswith(".gcda") for ofile in open_files):
+                    gcda_found = True
+                    gcda_open = True
+                    break
+            if gcda_found and not gcda_open:
+                log.debug("gcda dump took %0.2fs", time.time() - start_time)
+                break
             if time.time() - start_time >= timeout:
                 if gcda_found:
                     log.warning("gcda files still open after %0.2fs", timeout)
@@ -183,8 +211,7 @@ class PuppetTarget(Target):
             if not self._puppet.is_healthy():
                 log.warning("Browser failure during dump_coverage()")
                 break
-        else:
-            log.debug("gcda dump took %0.2fs", time.time() - start_time)
+            time.sleep(self.COVERAGE_POLL)
 
     def launch(self, location, env_mod=None):
         if not self.prefs:
@@ -106,6 +106,10 @@ class Target(object):
         log.debug("log_size() not implemented! returning 0")
         return 0
 
+    def memory_usage(self):  # pylint: disable=no-self-use
+        log.debug("memory_usage() not implemented! returning 0")
+        return 0
+
     @abc.abstractproperty
     def monitor(self):
         pass
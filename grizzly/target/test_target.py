@@ -43,6 +43,7 @@ def test_target_01(tmp_path):
     assert target.forced_close
     assert target.launch_timeout == 321
     assert target.log_size() == 0
+    assert target.memory_usage() == 0
     assert target.log_limit == 2 * 0x100000
     assert target.memory_limit == 3 * 0x100000
     assert target.rl_countdown == 0
@@ -241,7 +242,13 @@ def test_puppet_target_04(mocker, tmp_path):
     """test PuppetTarget.dump_coverage()"""
     fake_ffp = mocker.patch("grizzly.target.puppet_target.FFPuppet", autospec=True)
     fake_psutil = mocker.patch("grizzly.target.puppet_target.psutil", autospec=True)
-    fake_psutil.Process.return_value.children.return_value = (mocker.Mock(pid=123),)
+    fake_psutil.AccessDenied = OSError
+    fake_psutil.NoSuchProcess = OSError
+    fake_child = mocker.Mock(pid=123)
+    fake_child.open_files.return_value = ()
+    fake_psutil.Process.return_value.children.return_value = [fake_child]
+    fake_psutil.Process.return_value.open_files.return_value = ()
+    mocker.patch("grizzly.target.puppet_target.time.sleep", autospec=True)
     fake_file = tmp_path / "fake"
     fake_file.touch()
     target = PuppetTarget(str(fake_file), None, 300, 25, 5000, str(fake_file), 10)
@@ -251,69 +258,41 @@ def test_puppet_target_04(mocker, tmp_path):
     target.dump_coverage()
     assert not fake_os.kill.call_count
     assert fake_ffp.return_value.get_pid.call_count == 1
-    assert fake_psutil.process_iter.call_count == 0
+    assert fake_psutil.Process.call_count == 0
     # timeout
     fake_ffp.return_value.is_healthy.return_value = True
     fake_ffp.return_value.get_pid.return_value = 1234
     target.dump_coverage(timeout=0)
     assert fake_os.kill.call_count == 2
-    assert fake_psutil.process_iter.call_count == 1
+    assert fake_child.open_files.call_count == 1
     assert fake_ffp.return_value.is_healthy.call_count == 1
     # browser crashes
     fake_os.kill.call_count = 0
+    fake_child.open_files.call_count = 0
     fake_ffp.return_value.is_healthy.call_count = 0
     fake_ffp.return_value.is_healthy.side_effect = [True, False]
-    fake_ffp.return_value.get_pid.return_value = 1234
     target.dump_coverage()
     assert fake_os.kill.call_count == 2
-    assert fake_psutil.process_iter.call_count == 2
+    assert fake_child.open_files.call_count == 1
     assert fake_ffp.return_value.is_healthy.call_count == 2
     # wait for files
     fake_os.kill.call_count = 0
-    fake_ffp.return_value.is_healthy.call_count = 0
-    fake_ffp.return_value.is_healthy.return_value = True
     fake_ffp.return_value.is_healthy.side_effect = None
-    fake_ffp.return_value.get_pid.return_value = 123
-    fpi = mocker.Mock(iters=0)
-    def fake_process_iter(*args, **kwargs):
-        fpi.iters += 1
-        if fpi.iters == 1:
-            yield mocker.Mock(info={
-                "pid": 123,
-                "ppid": 0,
-                "open_files": (mocker.Mock(path="a.bin"), mocker.Mock(path="/a/s/d"))
-            })
-            yield mocker.Mock(info={
-                "pid": 321,
-                "ppid": 0,
-                "open_files": (mocker.Mock(path="a.bin"),)
-            })
-        elif fpi.iters == 2:
-            yield mocker.Mock(info={
-                "pid": 123,
-                "ppid": 0,
-                "open_files": (mocker.Mock(path="a.gcda"),)
-            })
-            yield mocker.Mock(info={
-                "pid": 321,
-                "ppid": 0,
-                "open_files": (mocker.Mock(path="a.bin"),)
-            })
-        elif fpi.iters == 3:
-            yield mocker.Mock(info={
-                "pid": 123,
-                "ppid": 0,
-                "open_files": (mocker.Mock(path="a.bin"),)
-            })
-            yield mocker.Mock(info={
-                "pid": 321,
-                "ppid": 0,
-                "open_files": (mocker.Mock(path="ignore.gcda"),)
-            })
-    fake_psutil.process_iter = fake_process_iter
+    fake_ffp.return_value.is_healthy.return_value = True
+    fake_child.open_files.call_count = 0
+    fake_child.open_files.side_effect = (
+        (mocker.Mock(path="a.bin"), mocker.Mock(path="/a/s/d")),
+        (mocker.Mock(path="a.gcda"),),
+        (mocker.Mock(path="a.gcda"),),
+        (mocker.Mock(path="a.bin"),))
     target.dump_coverage()
-    assert fpi.iters == 3
+    assert fake_child.open_files.call_count == 4
     assert fake_os.kill.call_count == 2
+    # process exits while checking
+    fake_child.open_files.call_count = 0
+    fake_child.open_files.side_effect = OSError
+    target.dump_coverage(timeout=0)
+    assert fake_child.open_files.call_count == 1
 
 def test_puppet_target_05(mocker, tmp_path):
     """test poll_for_idle()"""
@@ -349,3 +328,28 @@ def test_puppet_target_06(mocker, tmp_path):
     assert target.monitor.log_length("stdout") == 100
     target.monitor.clone_log("somelog")
     assert fake_ffp.return_value.clone_log.call_count == 1
+
+def test_puppet_target_07(mocker, tmp_path):
+    """test PuppetTarget.memory_usage()"""
+    fake_ffp = mocker.patch("grizzly.target.puppet_target.FFPuppet", autospec=True)
+    fake_psutil = mocker.patch("grizzly.target.puppet_target.psutil", autospec=True)
+    fake_psutil.AccessDenied = OSError
+    fake_psutil.NoSuchProcess = OSError
+    fake_file = tmp_path / "fake"
+    fake_file.touch()
+    target = PuppetTarget(str(fake_file), None, 300, 25, 5000, None, 25)
+    # not running
+    fake_ffp.return_value.get_pid.return_value = None
+    assert target.memory_usage() == 0
+    # running
+    fake_ffp.return_value.get_pid.return_value = 1234
+    fake_psutil.Process.return_value.memory_info.return_value = mocker.Mock(rss=100)
+    child = mocker.Mock()
+    child.memory_info.return_value = mocker.Mock(rss=50)
+    gone = mocker.Mock()
+    gone.memory_info.side_effect = OSError
+    fake_psutil.Process.return_value.children.return_value = [child, gone]
+    assert target.memory_usage() == 150
+    # process exited
+    fake_psutil.Process.side_effect = OSError
+    assert target.memory_usage() == 0
@@ -17,22 +17,36 @@ class FakeArgs(object):
     def __init__(self, working_path):
         self.binary = None
         self.input = None
+        self.input_cache = 0
+        self.input_mmap = False
+        self.input_scheduler = "uniform"
         self.accepted_extensions = None
         self.adapter = None
+        self.adaptive_relaunch = False
+        self.adaptive_timeout = False
         self.cache = 0
+        self.cache_limit = 0
+        self.corpus_index = False
         self.coverage = False
+        self.coverage_interval = 0
+        self.coverage_iterations = 1
         self.extension = None
         self.fuzzmanager = False
         self.ignore = list()
         self.launch_timeout = 300
         self.log_limit = 0
         self.memory = 0
+        self.merge_similar = None
         self.mime = None
         self.platform = "test"
         self.prefs = None
+        self.profile = None
+        self.profile_period = 3600
         self.rr = False
         self.relaunch = 1000
+        self.relaunch_min = 10
         self.s3_fuzzmanager = False
+        self.serve_packed = False
         self.soft_asserts = False
         self.timeout = 60
         self.tool = None
@@ -67,7 +81,14 @@ def test_main_01(tmp_path, mocker):
     args.input = None
     args.fuzzmanager = True
     args.coverage = True
+    args.adaptive_relaunch = True
+    args.adaptive_timeout = True
+    args.profile = "cpu"
     assert main(args) == Session.EXIT_SUCCESS
+    assert fake_session.call_args[1]["profiler"] is not None
+    assert fake_session.call_args[1]["coverage_scheduler"] is not None
+    assert fake_session.call_args[1]["relaunch_policy"] is not None
+    assert fake_session.call_args[1]["timeout_policy"] is not None
     fake_reporter = mocker.patch("grizzly.main.S3FuzzManagerReporter", autospec=True)
     fake_reporter.sanity_check.return_value = True
     args.fuzzmanager = False
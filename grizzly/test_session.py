@@ -10,8 +10,9 @@ unit tests for grizzly.Session
 import pytest
 
 from sapphire import Sapphire, SERVED_ALL, SERVED_TIMEOUT
-from grizzly.common import Adapter, InputFile, IOManager, Reporter, ServerMap, Status, TestCase, TestFile
-from grizzly.session import LogOutputLimiter, Session
+from grizzly.common import (Adapter, InputFile, IOManager, Profiler, Reporter, ServerMap, Status, TestCase,
+                            TestFile)
+from grizzly.session import AdaptiveRelaunch, AdaptiveTimeout, CoverageScheduler, LogOutputLimiter, Session
 from grizzly.target import Target, TargetLaunchError, TargetLaunchTimeout
 
 
@@ -36,6 +37,7 @@ def test_session_00(tmp_path, mocker):
     fake_iomgr.input_files = []
     fake_iomgr.landing_page.return_value = "HOMEPAGE.HTM"
     fake_iomgr.tests = [mocker.Mock(spec=TestCase)]
+    fake_iomgr.tests_evicted = 0
     fake_iomgr.working_path = str(tmp_path)
     fake_reporter = mocker.Mock(spec=Reporter)
     fake_target = mocker.Mock(spec=Target)
@@ -94,7 +96,7 @@ def test_session_02(tmp_path, mocker):
     """test Session.generate_testcase()"""
     Status.PATH = str(tmp_path)
     fake_server = mocker.patch("sapphire.Sapphire", autospec=True)
-    mocker.patch("grizzly.session.TestFile", autospec=True)
+    fake_testfile = mocker.patch("grizzly.session.TestFile", autospec=True)
     fake_adapter = mocker.Mock(spec=Adapter)
     fake_iomgr = mocker.Mock(spec=IOManager)
     fake_iomgr.active_input = mocker.Mock(spec=InputFile)
@@ -115,6 +117,12 @@ def test_session_02(tmp_path, mocker):
     assert fake_adapter.generate.call_count == 1
     assert testcase.add_meta.call_count == 1
     assert fake_server.return_value.set_redirect.call_count == 1
+    # prefs.js is only loaded once and shared
+    session.generate_testcase()
+    assert fake_testfile.from_file.call_count == 1
+    assert fake_testfile.from_file.return_value.clone.call_count == 2
+    session.close()
+    assert fake_testfile.from_file.return_value.close.call_count == 1
 
 def test_session_03(mocker, tmp_path):
     """test Session.launch_target()"""
@@ -126,6 +134,7 @@ def test_session_03(mocker, tmp_path):
     fake_iomgr = mocker.Mock(spec=IOManager)
     fake_iomgr.harness = None
     fake_iomgr.tests = []
+    fake_iomgr.tests_evicted = 0
     fake_iomgr.working_path = str(tmp_path)
     fake_iomgr.landing_page.return_value = "x"
     class FakeTarget(object):
@@ -240,6 +249,7 @@ def test_session_06(tmp_path, mocker):
     fake_iomgr.landing_page.return_value = "HOMEPAGE.HTM"
     fake_iomgr.tests = mocker.Mock(spec=list)
     fake_iomgr.tests.pop.return_value = mocker.Mock(spec=TestCase)
+    fake_iomgr.tests_evicted = 0
     fake_iomgr.working_path = str(tmp_path)
     fake_reporter = mocker.Mock(spec=Reporter)
     fake_target = mocker.Mock(spec=Target)
@@ -272,6 +282,209 @@ def test_session_06(tmp_path, mocker):
     assert fake_target.detect_failure.call_count == 10
     assert fake_iomgr.create_testcase.return_value.purge_optional.call_count == 10
 
+def test_session_07(tmp_path, mocker):
+    """test Session with AdaptiveRelaunch"""
+    Status.PATH = str(tmp_path)
+    mocker.patch("sapphire.Sapphire", autospec=True)
+    mocker.patch("grizzly.session.TestFile", autospec=True)
+    fake_adapter = mocker.Mock(spec=Adapter)
+    fake_adapter.IGNORE_UNSERVED = False
+    fake_adapter.ROTATION_PERIOD = 1
+    fake_adapter.TEST_DURATION = 10
+    fake_iomgr = mocker.Mock(spec=IOManager)
+    fake_iomgr.server_map = mocker.Mock(spec=ServerMap)
+    fake_iomgr.server_map.includes = []
+    fake_iomgr.server_map.redirects = []
+    fake_iomgr.server_map.dynamic_responses = []
+    fake_iomgr.active_input = None
+    fake_iomgr.harness = None
+    fake_iomgr.input_files = []
+    fake_iomgr.landing_page.return_value = "HOMEPAGE.HTM"
+    fake_iomgr.tests_evicted = 0
+    fake_iomgr.working_path = str(tmp_path)
+    fake_target = mocker.Mock(spec=Target)
+    fake_target.closed = True
+    fake_target.log_size.return_value = 0
+    fake_target.memory_usage.return_value = 100
+    fake_target.prefs = None
+    fake_target.rl_countdown = 4
+    fake_target.rl_reset = 1
+    policy = AdaptiveRelaunch(1, 5, memory_limit=100)
+    session = Session(fake_adapter, False, [], fake_iomgr, None, fake_target, relaunch_policy=policy)
+    session.config_server(5)
+    session._lol = mocker.Mock(spec=LogOutputLimiter)
+    session.server.serve_testcase.return_value = (SERVED_ALL, ["a.html"])
+    session.run(1)
+    session.close()
+    assert fake_target.launch.call_count == 1
+    assert fake_target.rl_reset == 5
+    assert policy.launch_duration is not None
+    assert fake_target.memory_usage.call_count == 1
+    assert policy._n == 1
+    assert policy.limit() == 1
+    # memory limit exceeded triggers relaunch
+    assert fake_target.close.call_count == 1
+    assert fake_target.check_relaunch.call_count == 0
+
+def test_session_08(tmp_path, mocker):
+    """test Session with AdaptiveTimeout"""
+    Status.PATH = str(tmp_path)
+    mocker.patch("sapphire.Sapphire", autospec=True)
+    mocker.patch("grizzly.session.TestFile", autospec=True)
+    fake_adapter = mocker.Mock(spec=Adapter)
+    fake_adapter.IGNORE_UNSERVED = False
+    fake_adapter.NAME = "fake"
+    fake_adapter.ROTATION_PERIOD = 1
+    fake_iomgr = mocker.Mock(spec=IOManager)
+    fake_iomgr.server_map = mocker.Mock(spec=ServerMap)
+    fake_iomgr.server_map.includes = []
+    fake_iomgr.server_map.redirects = []
+    fake_iomgr.server_map.dynamic_responses = []
+    fake_iomgr.active_input = None
+    fake_iomgr.input_files = []
+    fake_iomgr.tests_evicted = 0
+    fake_iomgr.working_path = str(tmp_path)
+    fake_iomgr.create_testcase.return_value = TestCase("a.html", None, "fake")
+    fake_iomgr.create_testcase.return_value.duration = 1.0
+    fake_target = mocker.Mock(spec=Target)
+    fake_target.closed = False
+    fake_target.log_size.return_value = 0
+    fake_target.prefs = None
+    policy = AdaptiveTimeout(2, 60, margin=1)
+    policy.MIN_SAMPLES = 2
+    session = Session(fake_adapter, False, [], fake_iomgr, None, fake_target, timeout_policy=policy)
+    session.config_server(60)
+    session._lol = mocker.Mock(spec=LogOutputLimiter)
+    session.server.serve_testcase.return_value = (SERVED_ALL, ["a.html"])
+    session.run(2)
+    assert session.server.timeout == 60
+    session.run(3)
+    session.close()
+    assert session.server.timeout == 2
+
+def test_session_09(tmp_path, mocker):
+    """test Session with CoverageScheduler"""
+    Status.PATH = str(tmp_path)
+    mocker.patch("sapphire.Sapphire", autospec=True)
+    mocker.patch("grizzly.session.TestFile", autospec=True)
+    fake_adapter = mocker.Mock(spec=Adapter)
+    fake_adapter.IGNORE_UNSERVED = False
+    fake_adapter.ROTATION_PERIOD = 1
+    fake_iomgr = mocker.Mock(spec=IOManager)
+    fake_iomgr.server_map = mocker.Mock(spec=ServerMap)
+    fake_iomgr.server_map.includes = []
+    fake_iomgr.server_map.redirects = []
+    fake_iomgr.server_map.dynamic_responses = []
+    fake_iomgr.active_input = None
+    fake_iomgr.input_files = []
+    fake_iomgr.tests_evicted = 0
+    fake_iomgr.working_path = str(tmp_path)
+    fake_target = mocker.Mock(spec=Target)
+    fake_target.closed = False
+    fake_target.log_size.return_value = 0
+    fake_target.prefs = None
+    # default is to dump after every iteration
+    session = Session(fake_adapter, True, [], fake_iomgr, None, fake_target)
+    assert session.coverage_scheduler.iterations == 1
+    session.close()
+    scheduler = CoverageScheduler(iterations=3)
+    session = Session(fake_adapter, True, [], fake_iomgr, None, fake_target, coverage_scheduler=scheduler)
+    session.config_server(5)
+    session._lol = mocker.Mock(spec=LogOutputLimiter)
+    session.server.serve_testcase.return_value = (SERVED_ALL, ["a.html"])
+    session.run(7)
+    session.close()
+    assert fake_target.dump_coverage.call_count == 2
+    assert scheduler.dumps == 2
+    assert session.status.coverage_time == scheduler.duration
+
+def test_session_10(tmp_path, mocker):
+    """test Session.check_results() adjusts input weight"""
+    Status.PATH = str(tmp_path)
+    fake_adapter = mocker.Mock(spec=Adapter)
+    fake_adapter.IGNORE_UNSERVED = False
+    fake_iomgr = mocker.Mock(spec=IOManager)
+    fake_iomgr.INPUT_BOOST = IOManager.INPUT_BOOST
+    fake_iomgr.INPUT_DEMOTE = IOManager.INPUT_DEMOTE
+    fake_target = mocker.Mock(spec=Target)
+    fake_target.RESULT_FAILURE = Target.RESULT_FAILURE
+    fake_target.RESULT_IGNORED = Target.RESULT_IGNORED
+    fake_target.RESULT_NONE = Target.RESULT_NONE
+    session = Session(fake_adapter, False, [], fake_iomgr, None, fake_target)
+    mocker.patch.object(session, "report_result", autospec=True)
+    # no failure
+    fake_target.detect_failure.return_value = Target.RESULT_NONE
+    session.check_results(False, False)
+    assert fake_iomgr.adjust_input_weight.call_count == 0
+    # ignored timeout
+    fake_target.detect_failure.return_value = Target.RESULT_IGNORED
+    session.check_results(False, True)
+    fake_iomgr.adjust_input_weight.assert_called_once_with(IOManager.INPUT_DEMOTE)
+    fake_iomgr.reset_mock()
+    # unserved
+    fake_target.detect_failure.return_value = Target.RESULT_NONE
+    session.check_results(True, False)
+    fake_iomgr.adjust_input_weight.assert_called_once_with(IOManager.INPUT_DEMOTE)
+    fake_iomgr.reset_mock()
+    # result
+    fake_target.detect_failure.return_value = Target.RESULT_FAILURE
+    session.check_results(False, True)
+    fake_iomgr.adjust_input_weight.assert_called_once_with(IOManager.INPUT_BOOST)
+    session.close()
+
+def test_session_11(tmp_path, mocker):
+    """test Session with Profiler"""
+    Status.PATH = str(tmp_path)
+    mocker.patch("sapphire.Sapphire", autospec=True)
+    mocker.patch("grizzly.session.TestFile", autospec=True)
+    fake_adapter = mocker.Mock(spec=Adapter)
+    fake_adapter.IGNORE_UNSERVED = False
+    fake_adapter.ROTATION_PERIOD = 1
+    fake_iomgr = mocker.Mock(spec=IOManager)
+    fake_iomgr.server_map = mocker.Mock(spec=ServerMap)
+    fake_iomgr.server_map.includes = []
+    fake_iomgr.server_map.redirects = []
+    fake_iomgr.server_map.dynamic_responses = []
+    fake_iomgr.active_input = None
+    fake_iomgr.input_files = []
+    fake_iomgr.tests_evicted = 0
+    fake_iomgr.working_path = str(tmp_path)
+    fake_target = mocker.Mock(spec=Target)
+    fake_target.closed = False
+    fake_target.log_size.return_value = 0
+    fake_target.prefs = None
+    fake_profiler = mocker.Mock(spec=Profiler)
+    session = Session(fake_adapter, False, [], fake_iomgr, None, fake_target, profiler=fake_profiler)
+    session.config_server(5)
+    session._lol = mocker.Mock(spec=LogOutputLimiter)
+    session.server.serve_testcase.return_value = (SERVED_ALL, ["a.html"])
+    session.run(7)
+    session.close()
+    assert fake_profiler.check.call_count == 7
+
+def test_coverage_scheduler_01(mocker):
+    """test CoverageScheduler"""
+    fake_time = mocker.patch("grizzly.session.time", autospec=True)
+    fake_time.time.return_value = 1.0
+    fake_target = mocker.Mock(spec=Target)
+    # iterations
+    scheduler = CoverageScheduler(iterations=2)
+    assert not scheduler.ready()
+    assert scheduler.ready()
+    fake_time.time.side_effect = (2.0, 3.5)
+    scheduler.dump(fake_target)
+    assert fake_target.dump_coverage.call_count == 1
+    assert scheduler.dumps == 1
+    assert scheduler.duration == 1.5
+    assert scheduler._pending == 0
+    # interval
+    fake_time.time.side_effect = None
+    fake_time.time.return_value = 1.0
+    scheduler = CoverageScheduler(iterations=100, interval=10)
+    assert not scheduler.ready()
+    fake_time.time.return_value = 11.0
+    assert scheduler.ready()
+
 def test_log_output_limiter_01(mocker):
     """test LogOutputLimiter.ready() not ready"""
     fake_time = mocker.patch("grizzly.session.time", autospec=True)
@@ -325,3 +538,126 @@ def test_log_output_limiter_04(mocker):
     assert lol._iterations == 4
     assert lol._launches == 1
     assert lol._time == 2.0
+
+def test_adaptive_timeout_01():
+    """test AdaptiveTimeout"""
+    policy = AdaptiveTimeout(5, 60, margin=2, percentile=0.9)
+    test = TestCase("a.html", None, "adpt")
+    assert policy.timeout("adpt") == 60
+    # missing duration
+    policy.record(test)
+    assert not policy._durations
+    # not enough samples
+    test.duration = 1.0
+    for _ in range(policy.MIN_SAMPLES - 1):
+        policy.record(test)
+    assert policy.timeout("adpt") == 60
+    # clamp to minimum
+    policy.record(test)
+    assert policy.timeout("adpt") == 5
+    # use percentile (only recalculated every UPDATE_INTERVAL samples)
+    for duration in range(1, 101):
+        test.duration = duration / 10.0
+        policy.record(test)
+        if duration < policy.UPDATE_INTERVAL:
+            assert policy.timeout("adpt") == 5
+    assert policy.timeout("adpt") == 11
+    # clamp to maximum
+    test.duration = 100
+    for _ in range(policy.WINDOW):
+        policy.record(test)
+    assert policy.timeout("adpt") == 60
+    # other adapters are tracked separately
+    assert policy.timeout("other") == 60
+
+def test_adaptive_timeout_02():
+    """test AdaptiveTimeout with iterations that timed out"""
+    policy = AdaptiveTimeout(5, 60, margin=2)
+    test = TestCase("a.html", None, "adpt")
+    # no timeout calculated yet
+    policy.record(test, timed_out=True)
+    assert policy.timeout("adpt") == 60
+    assert not policy._durations
+    test.duration = 1.0
+    for _ in range(policy.MIN_SAMPLES):
+        policy.record(test)
+    assert policy.timeout("adpt") == 5
+    # timed out iterations are not tracked and increase the timeout
+    test.duration = 5.0
+    policy.record(test, timed_out=True)
+    assert len(policy._durations["adpt"]) == policy.MIN_SAMPLES
+    assert policy.timeout("adpt") == 10
+    policy.record(test, timed_out=True)
+    assert policy.timeout("adpt") == 20
+    for _ in range(3):
+        policy.record(test, timed_out=True)
+    assert policy.timeout("adpt") == 60
+    # longer durations are now observed
+    test.duration = 8.0
+    for _ in range(policy.UPDATE_INTERVAL):
+        policy.record(test)
+    assert policy.timeout("adpt") == 10
+
+def test_adaptive_relaunch_01():
+    """test AdaptiveRelaunch.limit()"""
+    policy = AdaptiveRelaunch(10, 1000)
+    # no data
+    assert policy.drift is None
+    assert policy.limit() == 1000
+    policy.record_launch(10.0)
+    assert policy.launch_duration == 10.0
+    # no slowdown
+    for i in range(20):
+        policy.record_iteration(i, 1.0)
+    assert policy.drift == 0
+    assert policy.limit() == 1000
+    # slowdown of 0.002s per iteration: sqrt(2 * 10 / 0.002) == 100
+    policy = AdaptiveRelaunch(10, 1000)
+    policy.record_launch(10.0)
+    for i in range(100):
+        policy.record_iteration(i, 1.0 + (i * 0.002))
+    assert abs(policy.drift - 0.002) < 0.00001
+    assert policy.limit() == 100
+    # clamp to minimum
+    policy.minimum = 500
+    assert policy.limit() == 500
+    # clamp to maximum
+    policy.minimum = 1
+    policy.maximum = 50
+    assert policy.limit() == 50
+
+def test_adaptive_relaunch_02():
+    """test AdaptiveRelaunch memory limit and launch smoothing"""
+    policy = AdaptiveRelaunch(5, 1000, memory_limit=1024)
+    policy.record_launch(10.0)
+    assert not policy.record_iteration(0, 1.0, memory=100)
+    assert policy.limit() == 1000
+    assert policy.record_iteration(19, 1.0, memory=2048)
+    assert policy.record_iteration(29, 1.0, memory=2048)
+    assert policy.limit() == 19
+    # memory limit is kept across launches
+    policy.record_launch(20.0)
+    assert policy.launch_duration == 13.0
+    assert policy.limit() == 19
+    # cycle ended early (not a full cycle)
+    policy.record_iteration(9, 1.0, memory=100)
+    policy.record_launch(13.0)
+    assert policy.limit() == 19
+    # full cycle under the limit raises the value
+    policy.record_iteration(18, 1.0, memory=100)
+    policy.record_launch(13.0)
+    assert policy.limit() == 21
+    # exceeding the limit lowers the value
+    assert policy.record_iteration(0, 1.0, memory=2048)
+    assert policy.limit() == 5
+    policy.record_launch(13.0)
+    assert policy.limit() == 5
+    # memory limit is dropped once it reaches maximum
+    policy = AdaptiveRelaunch(5, 20, memory_limit=1024)
+    policy.record_launch(1.0)
+    policy.record_iteration(19, 1.0, memory=2048)
+    policy.record_launch(1.0)
+    policy.record_iteration(18, 1.0, memory=100)
+    policy.record_launch(1.0)
+    assert policy._memory_iter is None
+    assert policy.limit() == 20
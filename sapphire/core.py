@@ -44,11 +44,12 @@ WorkerHandle = namedtuple("WorkerHandle", "conn thread")
 
 
 class Resource(object):
-    __slots__ = ("mime", "required", "target", "type")
+    __slots__ = ("mime", "required", "source", "target", "type")
 
-    def __init__(self, resource_type, target, mime=None, required=False):
+    def __init__(self, resource_type, target, mime=None, required=False, source=None):
         self.mime = mime
         self.required = required
+        self.source = source  # (path, offset, size) of data stored in another file
         self.target = target
         self.type = resource_type
 
@@ -59,10 +60,12 @@ class ServeJob(object):
     URL_INCLUDE = 2
     URL_REDIRECT = 3
 
-    def __init__(self, base_path, dynamic_map, include_map, redirect_map, forever=False, optional_files=None):
+    def __init__(self, base_path, dynamic_map, include_map, redirect_map, forever=False, optional_files=None,
+                 file_map=None):
         assert isinstance(dynamic_map, dict)
         assert isinstance(include_map, dict)
         assert isinstance(redirect_map, dict)
+        assert file_map is None or isinstance(file_map, dict)
         self._complete = threading.Event()
         self._pending = Tracker(files=set(), lock=threading.Lock())
         self._served = Tracker(files=defaultdict(int), lock=threading.Lock())
@@ -70,6 +73,12 @@ class ServeJob(object):
         self.accepting.set()
         self.base_path = os.path.abspath(base_path)  # wwwroot
         self.exceptions = Queue()
+        # files stored in other files: absolute path in wwwroot -> (path, offset, size)
+        self.file_map = None
+        if file_map is not None:
+            self.file_map = {
+                os.path.normpath(os.path.join(self.base_path, name)): source
+                for name, source in file_map.items()}
         self.forever = forever
         self.initial_queue_size = 0
         self.url_map = UrlMap(
@@ -82,7 +91,15 @@ class ServeJob(object):
     def _build_queue(self, optional_files):
         # build file list to track files that must be served
         # this is intended to only be called once by __init__()
-        for d_name, _, filenames in os.walk(self.base_path, followlinks=False):
+        if self.file_map is not None:
+            for file_path in self.file_map:
+                rel_path = os.path.relpath(file_path, self.base_path)
+                if optional_files and (rel_path in optional_files
+                                       or os.path.basename(file_path) in optional_files):
+                    LOG.debug("optional: %r", file_path)
+                    continue
+                self._pending.files.add(file_path)
+        for d_name, _, filenames in self._walk():
             for f_name in filenames:
                 # do not add optional files to queue of required files
                 if optional_files and f_name in optional_files:
@@ -106,11 +123,22 @@ class ServeJob(object):
         self.initial_queue_size = len(self._pending.files)
         LOG.debug("sapphire has %d files required to serve", self.initial_queue_size)
 
+    def _walk(self):
+        # files are not read from base_path when using a file map
+        if self.file_map is not None:
+            return ()
+        return os.walk(self.base_path, followlinks=False)
+
     def check_request(self, request):
         if "?" in request:
             request = request.split("?", 1)[0]
         to_serve = os.path.normpath(os.path.join(self.base_path, request))
-        if os.path.isfile(to_serve):
+        if self.file_map is not None and to_serve in self.file_map:
+            res = Resource(self.URL_FILE, to_serve, source=self.file_map[to_serve])
+            with self._pending.lock:
+                res.required = to_serve in self._pending.files
+            return res
+        if self.file_map is None and os.path.isfile(to_serve):
             res = Resource(self.URL_FILE, to_serve)
             with self._pending.lock:
                 res.required = to_serve in self._pending.files
@@ -208,6 +236,8 @@ class Sapphire(object):
     CLOSE_CLIENT_ERROR = None  # used to automatically close client error (4XX code) pages
     DEFAULT_REQUEST_LIMIT = 0x1000  # 4KB
     DEFAULT_TX_SIZE = 0x10000  # 64KB
+    # virtual wwwroot used by serve_packed()
+    PACKED_ROOT = os.path.abspath(os.path.join(os.sep, "sphr_packed"))
     SHUTDOWN_DELAY = 0.25  # allow extra time before closing socket if needed
     WORKER_POOL_LIMIT = 10
 
@@ -341,7 +371,9 @@ class Sapphire(object):
                 conn.sendall(Sapphire._4xx_page(404, "Not Found").encode("ascii"))
                 LOG.debug("404 %r (%d to go)", request, serv_job.pending_files())
                 return
-            if resource.type in (serv_job.URL_FILE, serv_job.URL_INCLUDE):
+            if resource.source is not None:
+                LOG.debug("target %r (%r)", resource.target, resource.source[0])
+            elif resource.type in (serv_job.URL_FILE, serv_job.URL_INCLUDE):
                 LOG.debug("target %r", resource.target)
                 if not os.path.isfile(resource.target):
                     conn.sendall(Sapphire._4xx_page(404, "Not Found").encode("ascii"))
@@ -378,14 +410,14 @@ class Sapphire(object):
             # default to "application/octet-stream"
             c_type = mimetypes.guess_type(resource.target)[0] or "application/octet-stream"
             # serve the file
-            data_size = os.stat(resource.target).st_size
+            if resource.source is not None:
+                src_path, offset, data_size = resource.source
+            else:
+                src_path, offset, data_size = resource.target, 0, os.stat(resource.target).st_size
             LOG.debug("sending file: %s bytes", format(data_size, ","))
-            with open(resource.target, "rb") as in_fp:
+            with open(src_path, "rb") as in_fp:
                 conn.sendall(Sapphire._200_header(data_size, c_type).encode("ascii"))
-                offset = 0
-                while offset < data_size:
-                    conn.sendall(in_fp.read(Sapphire.DEFAULT_TX_SIZE))
-                    offset = in_fp.tell()
+                Sapphire._send_range(conn, in_fp, offset, data_size)
             LOG.debug("200 %r (%d to go)", resource.target, serv_job.pending_files())
             serv_job.increment_served(resource.target)
 
@@ -404,6 +436,32 @@ class Sapphire(object):
                 serv_job.finish()
             serv_job.worker_complete.set()
 
+    @staticmethod
+    def _send_range(conn, in_fp, offset, size):
+        """Send size bytes of in_fp starting at offset.
+
+        Args:
+            conn (socket.socket): Connection to send data on.
+            in_fp (file): Binary file object to read data from.
+            offset (int): Position in in_fp of the data.
+            size (int): Number of bytes to send.
+
+        Returns:
+            None
+        """
+        if size and hasattr(conn, "sendfile"):
+            # zero-copy when supported
+            conn.sendfile(in_fp, offset, size)
+            return
+        in_fp.seek(offset)
+        remaining = size
+        while remaining > 0:
+            data = in_fp.read(min(remaining, Sapphire.DEFAULT_TX_SIZE))
+            if not data:
+                raise IOError("Unexpected end of file %r" % (in_fp.name,))
+            conn.sendall(data)
+            remaining -= len(data)
+
     @staticmethod
     def _client_listener(serv_sock, serv_job):
         worker_pool = list()
@@ -508,7 +566,29 @@ class Sapphire(object):
             self._redirect_map,
             forever=forever,
             optional_files=optional_files)
+        return self._serve_job(job, continue_cb)
+
+    def serve_packed(self, file_map, continue_cb=None, forever=False, optional_files=None):
+        """
+        serve_packed() -> tuple
+        Serve files that are stored in other files (for example a packed test case) without
+        extracting them. file_map is a dict that maps file names (relative to wwwroot) to a
+        tuple containing (path, offset, size) of the data. See serve_path() for more info.
+        """
+        LOG.debug("serve_packed: %d files", len(file_map))
+        if continue_cb is not None and not callable(continue_cb):
+            raise TypeError("continue_cb must be of type 'function'")
+        job = ServeJob(
+            self.PACKED_ROOT,
+            self._dr_map,
+            self._include_map,
+            self._redirect_map,
+            forever=forever,
+            optional_files=optional_files,
+            file_map=file_map)
+        return self._serve_job(job, continue_cb)
 
+    def _serve_job(self, job, continue_cb):
         if not job.pending_files():
             job.finish()
             return SERVED_NONE, list()
@@ -569,22 +649,38 @@ class Sapphire(object):
 
         # served files should be relative to the www root, since that path could be a temporary
         # path created by serve_testcase()
-        served_files = {os.path.relpath(file, path) for file in job._served.files.keys()}
+        served_files = {os.path.relpath(file, job.base_path) for file in job._served.files.keys()}
 
         return status, served_files  # pylint: disable=protected-access
 
-    def serve_testcase(self, testcase, continue_cb=None, forever=False, working_path=None):
+    def serve_testcase(self, testcase, continue_cb=None, forever=False, working_path=None, packed=False):
         """
         serve_testcase() -> tuple
         testcase is the Grizzly TestCase to serve. The callback continue_cb should
         be a function that returns True or False. If continue_cb is specified and returns False
         the server serve loop will exit. working_path is where the testcase will be unpacked
-        temporary.
+        temporary. If packed is True the testcase is written to a single file and served
+        from there instead of being unpacked to a directory.
 
         returns a tuple (server status, files served)
         see serve_path() for more info
         """
         LOG.debug("serve_testcase() called")
+        if packed:
+            fd, pack_file = tempfile.mkstemp(prefix="sphr_test_", suffix=".pack", dir=working_path)
+            try:
+                with os.fdopen(fd, "wb") as out_fp:
+                    entries = testcase.pack(out_fp)
+                serve_start = time.time()
+                result = self.serve_packed(
+                    {name: (pack_file, offset, size) for name, (offset, size) in entries.items()},
+                    continue_cb=continue_cb,
+                    forever=forever,
+                    optional_files=tuple(testcase.optional))
+                testcase.duration = time.time() - serve_start
+                return result
+            finally:
+                os.remove(pack_file)
         wwwdir = tempfile.mkdtemp(prefix="sphr_test_", dir=working_path)
         try:
             testcase.dump(wwwdir)
@@ -716,6 +716,59 @@ def test_sapphire_30(client_factory, tmp_path):
     assert test.len_srv == test.len_org
 
 
+def test_sapphire_31(client, tmp_path):
+    """test Sapphire.serve_testcase() with packed=True"""
+    serv = Sapphire(timeout=10)
+    try:
+        (tmp_path / "nested").mkdir()
+        test = TestCase("test_0.html", "none.test", "foo")
+        files_to_serve = list()
+        for name in ("test_0.html", "test_1.bin", "nested/test_2.bin", "empty.bin"):
+            data = os.urandom(0x30000) if name != "empty.bin" else b""
+            test.add_from_data(data, name, required=name != "test_1.bin")
+            files_to_serve.append(_create_test(name, tmp_path, data=data, calc_hash=True))
+        client.launch("127.0.0.1", serv.get_port(), files_to_serve, in_order=True)
+        status, files_served = serv.serve_testcase(test, packed=True, working_path=str(tmp_path))
+        assert status == SERVED_ALL
+        assert files_served == {
+            "test_0.html", "test_1.bin", os.path.join("nested", "test_2.bin"), "empty.bin"}
+        assert test.duration >= 0
+        # packed file is removed
+        assert not any(x.suffix == ".pack" for x in tmp_path.iterdir())
+    finally:
+        serv.close()
+        test.cleanup()
+    assert client.wait(timeout=10)
+    for t_file in files_to_serve:
+        assert t_file.code == 200
+        assert t_file.len_srv == t_file.len_org
+        assert t_file.md5_srv == t_file.md5_org
+
+
+def test_sapphire_32(client, tmp_path):
+    """test Sapphire.serve_packed() missing file and optional file"""
+    pack = tmp_path / "data.bin"
+    pack.write_bytes(b"aaaabbbb")
+    serv = Sapphire(timeout=10)
+    try:
+        missing = _TestFile("missing.html")
+        opt = _TestFile("opt.html")
+        req = _TestFile("req.html")
+        client.launch("127.0.0.1", serv.get_port(), [missing, req], in_order=True)
+        status, files_served = serv.serve_packed(
+            {"opt.html": (str(pack), 0, 4), "req.html": (str(pack), 4, 4)},
+            optional_files=["opt.html"])
+        assert status == SERVED_ALL
+        assert files_served == {"req.html"}
+    finally:
+        serv.close()
+    assert client.wait(timeout=10)
+    assert missing.code == 404
+    assert opt.code is None
+    assert req.code == 200
+    assert req.len_srv == 4
+
+
 def test_serve_job_01(tmp_path):
     """test creating an empty ServeJob"""
     job = ServeJob(str(tmp_path), dict(), dict(), dict())